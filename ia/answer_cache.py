@@ -0,0 +1,135 @@
+"""Caché persistente (SQLite) de respuestas del chat experto (sin Streamlit).
+
+La clave es un hash de: prompt de sistema, instrucciones, contexto canonicalizado
+(JSON con llaves ordenadas) y la pregunta normalizada (minúsculas, sin tildes ni
+signos). Cada respuesta guarda además el alcance (cliente) y la huella de datos con
+que se generó, para poder purgar lo de un cliente cuando sus datos cambian.
+
+- TTL: las respuestas vencidas no se devuelven y se purgan al escribir.
+- Tamaño: al pasar de ``max_entries`` o ``max_bytes`` se desalojan las menos usadas
+  recientemente.
+- Huella: ``sync_scope`` purga un cliente sólo cuando cambia la huella de sus datos
+  (no en cada pregunta).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Dict, Iterator, Optional
+
+from engine import slug
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "ia_respuestas.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    clave TEXT PRIMARY KEY,
+    alcance TEXT,
+    huella TEXT,
+    pregunta TEXT,
+    respuesta TEXT NOT NULL,
+    creado REAL NOT NULL,
+    usado REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS respuestas_usado ON respuestas (usado);
+CREATE INDEX IF NOT EXISTS respuestas_alcance ON respuestas (alcance, huella);
+"""
+
+def open_answer_cache(path: str = DEFAULT_PATH, ttl_s: float = 24 * 3600, max_entries: int = 5000,
+                      max_bytes: int = 50_000_000) -> Dict[str, object]:
+    """Crea la base si no existe y devuelve la configuración de la caché."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _connect(path) as conn:
+        conn.executescript(_SCHEMA)
+    return {"path": path, "ttl_s": ttl_s, "max_entries": max_entries, "max_bytes": max_bytes,
+            "lock": threading.Lock(), "huellas": {}}
+
+@contextmanager
+def _connect(path: str) -> Iterator[sqlite3.Connection]:
+    # Una conexión por operación (Streamlit atiende cada sesión en su propio hilo): se
+    # confirma o revierte la transacción y se cierra siempre
+    with closing(sqlite3.connect(path, timeout=10.0)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+
+def normalize_question(q: str) -> str:
+    return slug(q or "")
+
+def answer_key(system_prompt: str, instructions: str, context: Dict[str, object], question: str) -> str:
+    payload = json.dumps(
+        [system_prompt, instructions, context, normalize_question(question)],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_answer(cache: Dict[str, object], key: str) -> Optional[str]:
+    now = time.time()
+    with _connect(cache["path"]) as conn:
+        row = conn.execute("SELECT respuesta, creado FROM respuestas WHERE clave = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > cache["ttl_s"]:
+            conn.execute("DELETE FROM respuestas WHERE clave = ?", (key,))
+            return None
+        conn.execute("UPDATE respuestas SET usado = ?, hits = hits + 1 WHERE clave = ?", (now, key))
+        return row[0]
+
+def put_answer(cache: Dict[str, object], key: str, answer: str, question: str = "",
+               scope: Optional[str] = None, fingerprint: Optional[str] = None):
+    now = time.time()
+    nbytes = len(answer.encode("utf-8")) + len(question.encode("utf-8"))
+    with _connect(cache["path"]) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO respuestas (clave, alcance, huella, pregunta, respuesta, creado, usado, hits, bytes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+            (key, scope, fingerprint, question, answer, now, now, nbytes),
+        )
+        conn.execute("DELETE FROM respuestas WHERE creado < ?", (now - cache["ttl_s"],))
+        _evict(conn, cache)
+
+def _evict(conn: sqlite3.Connection, cache: Dict[str, object]):
+    n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()
+    if n <= cache["max_entries"] and total <= cache["max_bytes"]:
+        return
+    # Recorre de la menos usada recientemente a la más, hasta volver bajo ambos límites
+    drop = []
+    for key, nbytes in conn.execute("SELECT clave, bytes FROM respuestas ORDER BY usado ASC"):
+        if n <= cache["max_entries"] and total <= cache["max_bytes"]:
+            break
+        drop.append((key,))
+        n -= 1
+        total -= nbytes
+    conn.executemany("DELETE FROM respuestas WHERE clave = ?", drop)
+
+def invalidate_scope(cache: Dict[str, object], scope: str, keep_fingerprint: Optional[str] = None) -> int:
+    """Borra las respuestas de ``scope`` generadas con otra huella de datos (o todas)."""
+    with _connect(cache["path"]) as conn:
+        if keep_fingerprint is None:
+            cur = conn.execute("DELETE FROM respuestas WHERE alcance = ?", (scope,))
+        else:
+            cur = conn.execute("DELETE FROM respuestas WHERE alcance = ? AND (huella IS NULL OR huella != ?)",
+                               (scope, keep_fingerprint))
+        return cur.rowcount
+
+def sync_scope(cache: Dict[str, object], scope: str, fingerprint: str) -> int:
+    """Purga las respuestas de ``scope`` hechas con otra huella de datos, sólo si la huella
+    cambió desde la última vez que este proceso la vio. Devuelve las filas borradas."""
+    with cache["lock"]:
+        if cache["huellas"].get(scope) == fingerprint:
+            return 0
+        cache["huellas"][scope] = fingerprint
+    return invalidate_scope(cache, scope, keep_fingerprint=fingerprint)
+
+def answer_cache_stats(cache: Dict[str, object]) -> Dict[str, object]:
+    with _connect(cache["path"]) as conn:
+        n, total, hits = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(hits), 0) FROM respuestas").fetchone()
+    return {"entradas": n, "bytes": total, "hits": hits, "max_entradas": cache["max_entries"],
+            "max_bytes": cache["max_bytes"], "ttl_s": cache["ttl_s"]}
@@ -0,0 +1,137 @@
+"""Benchmark de las funciones analíticas de ``engine`` sobre encuestas sintéticas.
+
+Uso:
+    python ia/bench_analytics.py                                   # 1k, 10k y 100k activos
+    python ia/bench_analytics.py --filas 1000 1000000 --json analytics.json
+    python ia/bench_analytics.py --comparar analytics.json         # código 1 si algo empeoró
+
+Por tamaño se generan las tres encuestas con ``synthetic.make_surveys`` (egresos y HR en
+proporción a los activos) y se mide cada función con la mediana de ``--repeticiones``:
+``map_cols`` (las tres encuestas; en frío, sin la memoria de esquemas, y ``map_cols_memo``
+en caliente), ``normalize_likert`` (todos los drivers mapeados),
+``correlate_with_intent``, ``summarize_reasons`` (con los textos ya consolidados),
+``area_risk`` y ``hr_dashboard``.
+
+Con ``--comparar`` se contrasta contra un JSON anterior de este script: una medición es
+regresión si tarda más de ``--tolerancia`` veces la base y al menos ``MIN_DELTA_S`` más
+(los tiempos de milisegundos son puro ruido).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MIN_DELTA_S = 0.05
+
+def _time(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    secs = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        secs.append(time.perf_counter() - t0)
+    return {"mediana_s": round(statistics.median(secs), 6), "min_s": round(min(secs), 6)}
+
+def bench_size(n: int, repeats: int, seed: int = 0) -> Dict[str, object]:
+    """Genera las encuestas de ``n`` activos y mide cada función analítica."""
+    from engine import (
+        ACTIVE_OPTIONAL, ACTIVE_REQUIRED, HR_OPTIONAL, HR_REQUIRED, LEAVER_OPTIONAL, LEAVER_REQUIRED,
+        DRIVER_SKIP_KEYS, _MAPPING_CACHE, _column_index, area_risk, correlate_with_intent, hr_dashboard, map_cols,
+        normalize_likert, prepare_reason_texts, summarize_reasons,
+    )
+    from synthetic import make_surveys
+
+    t0 = time.perf_counter()
+    frames = make_surveys(n, seed)
+    gen_s = time.perf_counter() - t0
+    df_a, df_l, df_h = frames["activos"], frames["egresos"], frames["hr"]
+
+    def _map_all():
+        return (map_cols(df_a, ACTIVE_REQUIRED, ACTIVE_OPTIONAL), map_cols(df_l, LEAVER_REQUIRED, LEAVER_OPTIONAL),
+                map_cols(df_h, HR_REQUIRED, HR_OPTIONAL))
+
+    def _map_cold():
+        # map_cols memoriza por esquema: sin limpiar, cada repetición sería una búsqueda en un dict
+        _MAPPING_CACHE.clear()
+        _column_index.cache_clear()
+        return _map_all()
+
+    m_a, m_l, m_h = _map_all()
+    drivers = [c for k, c in m_a.items() if k not in DRIVER_SKIP_KEYS and c and c in df_a.columns]
+    df_a_txt, df_l_txt, m_a_txt, m_l_txt = prepare_reason_texts(df_a, df_l, m_a, m_l)
+
+    steps = {
+        "map_cols": _map_cold,
+        "map_cols_memo": _map_all,
+        "normalize_likert": lambda: [normalize_likert(df_a[c]) for c in drivers],
+        "correlate_with_intent": lambda: correlate_with_intent(df_a, m_a),
+        "summarize_reasons": lambda: summarize_reasons(df_a_txt, df_l_txt, m_a_txt, m_l_txt),
+        "area_risk": lambda: area_risk(df_a, m_a),
+        "hr_dashboard": lambda: hr_dashboard(df_h, m_h),
+    }
+    row: Dict[str, object] = {"filas": n, "egresos": len(df_l), "hr": len(df_h), "drivers": len(drivers),
+                              "generacion_s": round(gen_s, 3), "funciones": {}}
+    for name, fn in steps.items():
+        row["funciones"][name] = _time(fn, repeats)
+    return row
+
+def compare(base: Dict[str, object], current: Dict[str, object], tolerance: float) -> List[Dict[str, object]]:
+    """Mediciones de ``current`` más lentas que las de ``base`` (mismo tamaño y función)."""
+    before = {(r["filas"], name): t["mediana_s"] for r in base.get("resultados", [])
+              for name, t in r.get("funciones", {}).items()}
+    regressions = []
+    for r in current["resultados"]:
+        for name, t in r["funciones"].items():
+            old = before.get((r["filas"], name))
+            if old is None:
+                continue
+            new = t["mediana_s"]
+            if new > old * tolerance and new - old >= MIN_DELTA_S:
+                regressions.append({"filas": r["filas"], "funcion": name, "base_s": old, "actual_s": new,
+                                    "razon": round(new / old, 2) if old else None})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--filas", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--semilla", type=int, default=0)
+    ap.add_argument("--json", default=None, help="Archivo donde guardar el resultado")
+    ap.add_argument("--comparar", default=None, help="JSON anterior de este script contra el que comparar")
+    ap.add_argument("--tolerancia", type=float, default=1.25, help="Razón actual/base que cuenta como regresión")
+    args = ap.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    out: Dict[str, object] = {"python": sys.version.split()[0], "pandas": pd.__version__, "numpy": np.__version__,
+                              "repeticiones": args.repeticiones, "semilla": args.semilla, "resultados": []}
+    for n in args.filas:
+        row = bench_size(n, max(1, args.repeticiones), args.semilla)
+        out["resultados"].append(row)
+        times = " · ".join(f"{name} {t['mediana_s']:.3f}s" for name, t in row["funciones"].items())
+        print(f"{n:>9,} filas  {times}", file=sys.stderr)
+
+    status = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            out["regresiones"] = compare(json.load(fh), out, args.tolerancia)
+        for r in out["regresiones"]:
+            print(f"REGRESIÓN {r['funcion']} con {r['filas']:,} filas: {r['base_s']:.3f}s → {r['actual_s']:.3f}s",
+                  file=sys.stderr)
+        status = 1 if out["regresiones"] else 0
+
+    payload = json.dumps(out, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
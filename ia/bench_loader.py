@@ -0,0 +1,111 @@
+"""Benchmark del cargador de encuestas: tiempo y memoria pico por tamaño y formato.
+
+Uso:
+    python ia/bench_loader.py                              # 10k, 100k y 500k filas
+    python ia/bench_loader.py --filas 20000 200000 --formatos csv --json loader.json
+
+Compara la lectura anterior (``pd.read_csv`` / ``pd.read_excel`` en una pasada) contra
+``engine.read_table`` (CSV en streaming con pyarrow, XLSX en modo sólo lectura), ambas
+seguidas de ``compact_frame``. Cada medición corre en un proceso nuevo, así la memoria
+pico (``VmHWM`` en Linux) es la de esa lectura.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+XLSX_MAX_ROWS = 100_000  # openpyxl escribe ~20k filas/s: más que esto no vale la espera
+
+def survey_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    """Encuesta de activos sintética con los encabezados que espera ``engine``."""
+    from synthetic import make_active
+
+    return make_active(n, seed)
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss en Linux conserva el pico del proceso padre tras fork/exec; VmHWM no
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure(loader: str, path: str) -> Dict[str, object]:
+    """Se ejecuta en el proceso hijo: carga ``path`` con ``loader`` y reporta tiempo y memoria."""
+    sys.path.insert(0, HERE)
+    from engine import compact_frame, read_table
+
+    t0 = time.perf_counter()
+    if loader == "pandas":
+        df = pd.read_excel(path) if path.endswith(".xlsx") else pd.read_csv(path)
+    else:
+        df = read_table(path)
+    df, rep = compact_frame(df)
+    secs = time.perf_counter() - t0
+    peak_kb = _peak_rss_kb()
+    return {"segundos": round(secs, 3), "pico_mb": round(peak_kb / 1024, 1), "mb_final": round(rep["bytes_despues"] / 1e6, 1)}
+
+def run_one(loader: str, path: str) -> Dict[str, object]:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--_medir", loader, path],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"código {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    ap.add_argument("--formatos", nargs="+", choices=("csv", "xlsx"), default=["csv", "xlsx"])
+    ap.add_argument("--json", default=None, help="Archivo donde guardar el resultado")
+    ap.add_argument("--_medir", nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args._medir:
+        print(json.dumps(_measure(*args._medir)))
+        return 0
+
+    sys.path.insert(0, HERE)
+    out: Dict[str, object] = {"python": sys.version.split()[0], "pandas": pd.__version__, "resultados": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.filas:
+            df = survey_frame(n)
+            for fmt in args.formatos:
+                if fmt == "xlsx" and n > XLSX_MAX_ROWS:
+                    continue
+                path = os.path.join(tmp, f"encuesta_{n}.{fmt}")
+                if fmt == "csv":
+                    df.to_csv(path, index=False)
+                else:
+                    df.to_excel(path, index=False)
+                row = {"filas": n, "formato": fmt, "mb_archivo": round(os.path.getsize(path) / 1e6, 1)}
+                for loader in ("pandas", "read_table"):
+                    row[loader] = run_one(loader, path)
+                out["resultados"].append(row)
+                a, b = row["pandas"], row["read_table"]
+                if "error" in a or "error" in b:
+                    print(f"{fmt:<5} {n:>9,} filas  error: {a.get('error') or b.get('error')}", file=sys.stderr)
+                    continue
+                print(f"{fmt:<5} {n:>9,} filas  pandas {a['segundos']:>7.2f}s {a['pico_mb']:>7.1f} MB pico · "
+                      f"read_table {b['segundos']:>7.2f}s {b['pico_mb']:>7.1f} MB pico", file=sys.stderr)
+
+    payload = json.dumps(out, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
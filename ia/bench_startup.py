@@ -0,0 +1,135 @@
+"""Benchmark de arranque de la app: costo de importación en frío y de cada rerun.
+
+Uso:
+    python ia/bench_startup.py                      # importaciones en frío
+    python ia/bench_startup.py --reruns 5 --email usuario@empresa.com --json startup.json
+    python ia/bench_startup.py --chat 5 --email usuario@empresa.com
+
+- Importación: ``python -X importtime`` en un proceso nuevo por módulo; se reporta el
+  acumulado de cada módulo raíz y los más caros.
+- Rerun: ``streamlit.testing.v1.AppTest`` ejecuta ``ia.py`` completo varias veces (cada
+  interacción en Streamlit re-ejecuta el script), con el email opcional en la URL.
+- Chat: envía mensajes al chat y mide cada turno; como el chat es un fragmento, un turno
+  no debería re-ejecutar los dashboards de los otros tabs. Con ``IA_FAKE_LLM=1`` responde
+  el modelo local de prueba y se reportan también primer token y latencia total.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Lo que importa ia.py al arrancar, y el stack LLM que ahora se carga bajo demanda
+MODULES = ["numpy", "pandas", "requests", "streamlit", "engine", "langchain_openai", "langchain_core.messages"]
+
+def import_time(module: str) -> Optional[Dict[str, object]]:
+    """Tiempos de ``-X importtime`` para importar ``module`` en un intérprete limpio."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = (p.strip() for p in line.split(":", 1)[1].split("|"))
+        rows.append((name, int(self_us), int(cum_us)))
+    total = next((cum for name, _, cum in rows if name == module), max((cum for _, _, cum in rows), default=0))
+    top = sorted(rows, key=lambda r: r[1], reverse=True)[:10]
+    return {
+        "modulo": module,
+        "total_ms": round(total / 1000, 1),
+        "mas_caros_self_ms": [{"modulo": n, "self_ms": round(s / 1000, 1)} for n, s, _ in top],
+    }
+
+def rerun_time(reruns: int, email: Optional[str], timeout: float) -> Dict[str, object]:
+    """Duración del primer run y de los reruns de ``ia.py`` vía AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(HERE, "ia.py"), default_timeout=timeout)
+    if email:
+        at.query_params["email"] = email
+    times: List[float] = []
+    for _ in range(reruns + 1):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+    return {
+        "email": email,
+        "primer_run_ms": round(times[0] * 1000, 1),
+        "rerun_mediana_ms": round(statistics.median(times[1:]) * 1000, 1) if reruns else None,
+        "reruns_ms": [round(t * 1000, 1) for t in times[1:]],
+        "excepciones": [e.message for e in at.exception],
+    }
+
+def chat_turn_time(turns: int, email: Optional[str], timeout: float) -> Dict[str, object]:
+    """Duración de ``turns`` turnos del chat experto (sin API key responde el aviso local)."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(HERE, "ia.py"), default_timeout=timeout)
+    if email:
+        at.query_params["email"] = email
+    at.run()
+    times: List[float] = []
+    ttft: List[float] = []
+    for i in range(turns):
+        if not at.chat_input:
+            break
+        t0 = time.perf_counter()
+        at.chat_input[0].set_value(f"Pregunta de prueba {i + 1}").run()
+        times.append(time.perf_counter() - t0)
+        if "chat_metrics" in at.session_state and at.session_state["chat_metrics"]["ttft_ms"] is not None:
+            ttft.append(at.session_state["chat_metrics"]["ttft_ms"])
+    return {
+        "email": email,
+        "turno_mediana_ms": round(statistics.median(times) * 1000, 1) if times else None,
+        "turnos_ms": [round(t * 1000, 1) for t in times],
+        "primer_token_mediana_ms": round(statistics.median(ttft), 1) if ttft else None,
+        "excepciones": [e.message for e in at.exception],
+    }
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--reruns", type=int, default=0, help="Reruns de ia.py a medir con AppTest (0 = omitir)")
+    ap.add_argument("--chat", type=int, default=0, help="Turnos del chat a medir con AppTest (0 = omitir)")
+    ap.add_argument("--email", default=None, help="Email del cliente para cargar sus encuestas")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--json", default=None, help="Archivo donde guardar el resultado")
+    args = ap.parse_args(argv)
+
+    out: Dict[str, object] = {"python": sys.version.split()[0], "importaciones": []}
+    for mod in MODULES:
+        res = import_time(mod)
+        if res is None:
+            print(f"{mod:<28} no instalado", file=sys.stderr)
+            continue
+        out["importaciones"].append(res)
+        print(f"{mod:<28} {res['total_ms']:>8.1f} ms", file=sys.stderr)
+    if args.reruns:
+        out["reruns"] = rerun_time(args.reruns, args.email, args.timeout)
+        r = out["reruns"]
+        print(f"primer run {r['primer_run_ms']:.1f} ms · rerun (mediana) {r['rerun_mediana_ms']:.1f} ms", file=sys.stderr)
+
+    if args.chat:
+        out["chat"] = chat_turn_time(args.chat, args.email, args.timeout)
+        c = out["chat"]
+        print(f"turno de chat (mediana) {c['turno_mediana_ms']} ms · "
+              f"primer token (mediana) {c['primer_token_mediana_ms']} ms", file=sys.stderr)
+
+    payload = json.dumps(out, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
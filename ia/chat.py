@@ -0,0 +1,218 @@
+"""Chat experto: prompts, armado de mensajes y llamada al LLM con caché de respuestas
+(sin Streamlit).
+
+``stream_llm_answer`` entrega la respuesta por fragmentos a medida que llegan, con
+timeout (al primer token y total), cancelación por ``threading.Event`` y métricas de
+latencia. ``FakeLLM`` imita ``invoke``/``stream`` de ``ChatOpenAI`` para probar el
+chat (y la caché) sin API key: en la app se activa con ``IA_FAKE_LLM=1``.
+"""
+import json
+import queue
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from answer_cache import answer_key, get_answer, put_answer, sync_scope
+
+# --------- PROMPTS -----------
+SYSTEM_PROMPT = (
+    "Eres MARIA, una consultora ejecutiva experta en retención y fidelización de talento y reducción de rotación. "
+    "Siempre respondes en español, en tono claro, ejecutivo y accionable. "
+    "Eres rigurosa con supuestos; separas 'dato' de 'supuesto' y justificas. "
+    "Entregas diagnóstico de drivers de salida, priorización de iniciativas (alto impacto/baja complejidad), "
+    "y hoja de ruta trimestral con responsables y métricas. "
+    "Evitas lenguaje discriminatorio; promueves decisiones basadas en evidencia. "
+    "Cuando se provea contexto de HR, alinea recomendaciones con beneficios y restricciones actuales. "
+    "Incluye advertencia breve: 'Contenido referencial; no reemplaza asesoría legal/SSO.'"
+)
+
+CHAT_INSTRUCTIONS = """
+Responde como experta en **retención**, **fidelización** y **experiencia del colaborador**.
+- Identifica drivers de riesgo y protectores a partir de correlaciones y texto libre.
+- Prioriza acciones en 3 horizontes: quick wins (0-30 días), 60-90 días, 90-180 días.
+- Usa palancas: compensación, liderazgo, carrera, flexibilidad, carga, beneficios.
+- Sugiere métricas: intención de salida, tiempo de cobertura de vacantes, eNPS, % adopción de beneficios clave.
+- Si hay `comentarios_relevantes`, úsalos como evidencia cualitativa (cita breve y textual, con cuántas veces se repite); no generalices a partir de un solo comentario.
+- No inventes datos: si faltan, explícitalo y sugiere cómo obtenerlos.
+- Cierra con: *Contenido referencial; no reemplaza asesoría legal/SSO.*
+"""
+
+LLM_DISABLED_MSG = (
+    "Motor experto deshabilitado. Agrega `OPENAI_API_KEY` en `st.secrets` para activar respuestas generativas.\n\n"
+    "Puedes seguir usando el Tab de Conclusiones para el diagnóstico determinista."
+)
+
+def llm_messages(base_context: Dict[str, object], user_q: str) -> list:
+    human = human_prompt(base_context, user_q)
+    try:
+        from langchain_core.messages import SystemMessage, HumanMessage
+    except Exception:
+        try:
+            from langchain.schema import SystemMessage, HumanMessage
+        except Exception:
+            # Sin langchain (p. ej. con FakeLLM): tuplas (rol, texto), que langchain también acepta
+            return [("system", SYSTEM_PROMPT), ("human", human)]
+    return [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=human)]
+
+def human_prompt(base_context: Dict[str, object], user_q: str) -> str:
+    return (f"Contexto JSON (si disponible): {json.dumps(base_context, ensure_ascii=False)}\n\n"
+            f"Pregunta: {user_q}\n\nInstrucciones específicas:\n{CHAT_INSTRUCTIONS}")
+
+class _Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+class FakeLLM:
+    """LLM local determinista: responde con un eco de la pregunta. El primer token llega
+    tras ``delay_s`` y cada uno de los siguientes tras ``token_delay_s``."""
+
+    def __init__(self, delay_s: float = 0.5, token_delay_s: float = 0.02):
+        self.delay_s = delay_s
+        self.token_delay_s = token_delay_s
+        self.calls = 0
+
+    def _answer(self, messages) -> str:
+        last = messages[-1]
+        text = last[1] if isinstance(last, tuple) else last.content
+        question = text.split("Pregunta: ", 1)[-1].split("\n", 1)[0]
+        return (f"**Respuesta de prueba** a: _{question}_\n\n"
+                "- Quick win: conversación 1:1 con líderes de las áreas de mayor riesgo.\n"
+                "- 60-90 días: revisar bandas salariales en roles críticos.\n\n"
+                "*Contenido referencial; no reemplaza asesoría legal/SSO.*")
+
+    def invoke(self, messages):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        return _Reply(self._answer(messages))
+
+    def stream(self, messages):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        for i, word in enumerate(self._answer(messages).split(" ")):
+            if i:
+                time.sleep(self.token_delay_s)
+            yield _Reply(word if i == 0 else " " + word)
+
+def build_llm_answer(llm, base_context: Dict[str, object], user_q: str, cache: Optional[Dict[str, object]] = None,
+                     scope: Optional[str] = None, fingerprint: Optional[str] = None) -> Tuple[str, bool]:
+    """Respuesta del chat experto. Devuelve (texto, desde_cache).
+    Con ``cache`` se reutilizan respuestas previas a la misma pregunta y contexto; con
+    ``scope`` + ``fingerprint`` (huella de los datos, no de los parámetros) además se
+    purgan las del cliente hechas con otros datos cuando la huella cambia.
+    Los errores y el aviso de motor deshabilitado no se guardan.
+    """
+    if llm is None:
+        return LLM_DISABLED_MSG, False
+    key = None
+    if cache is not None:
+        if scope and fingerprint:
+            sync_scope(cache, scope, fingerprint)
+        key = answer_key(SYSTEM_PROMPT, CHAT_INSTRUCTIONS, base_context, user_q)
+        cached = get_answer(cache, key)
+        if cached is not None:
+            return cached, True
+    try:
+        answer = llm.invoke(llm_messages(base_context, user_q)).content
+    except Exception as e:
+        return f"Error al consultar el modelo: {e}\n\nSugerencia: verifica OPENAI_API_KEY en st.secrets.", False
+    if cache is not None:
+        put_answer(cache, key, answer, question=user_q, scope=scope, fingerprint=fingerprint)
+    return answer, False
+
+def new_stream_metrics() -> Dict[str, object]:
+    return {"estado": "pendiente", "texto": "", "fragmentos": 0, "ttft_ms": None, "total_ms": None,
+            "desde_cache": False, "error": None}
+
+def _produce(llm, messages, out: "queue.Queue", stop: threading.Event):
+    # Hilo productor: el cliente bloquea en cada fragmento; el consumidor espera en la cola con timeout
+    try:
+        for chunk in llm.stream(messages):
+            if stop.is_set():
+                break
+            out.put(("dato", chunk.content or ""))
+    except Exception as e:
+        out.put(("error", e))
+    finally:
+        out.put(("fin", None))
+
+def stream_llm_answer(llm, base_context: Dict[str, object], user_q: str, metrics: Dict[str, object],
+                      cancel: Optional[threading.Event] = None, cache: Optional[Dict[str, object]] = None,
+                      scope: Optional[str] = None, fingerprint: Optional[str] = None,
+                      first_token_timeout_s: float = 20.0, timeout_s: float = 90.0) -> Iterator[str]:
+    """Versión en streaming de ``build_llm_answer``: genera los fragmentos de texto.
+
+    ``metrics`` (ver ``new_stream_metrics``) se actualiza en vivo: texto acumulado,
+    fragmentos, ``ttft_ms`` (primer token), ``total_ms`` y ``estado`` final (``ok``,
+    ``cache``, ``timeout``, ``cancelada``, ``error`` o ``deshabilitado``). Si ``cancel``
+    se activa, o se cierra el generador, se deja de esperar al modelo. Sólo las
+    respuestas completas se guardan en ``cache``.
+    """
+    t0 = time.perf_counter()
+
+    def _emit(text: str) -> str:
+        if metrics["ttft_ms"] is None:
+            metrics["ttft_ms"] = (time.perf_counter() - t0) * 1000
+        metrics["texto"] += text
+        metrics["fragmentos"] += 1
+        return text
+
+    def _finish(estado: str):
+        metrics["estado"] = estado
+        metrics["total_ms"] = (time.perf_counter() - t0) * 1000
+
+    if llm is None:
+        yield _emit(LLM_DISABLED_MSG)
+        _finish("deshabilitado")
+        return
+    key = None
+    if cache is not None:
+        if scope and fingerprint:
+            sync_scope(cache, scope, fingerprint)
+        key = answer_key(SYSTEM_PROMPT, CHAT_INSTRUCTIONS, base_context, user_q)
+        cached = get_answer(cache, key)
+        if cached is not None:
+            metrics["desde_cache"] = True
+            yield _emit(cached)
+            _finish("cache")
+            return
+    if not hasattr(llm, "stream"):
+        answer, _ = build_llm_answer(llm, base_context, user_q, cache=cache, scope=scope, fingerprint=fingerprint)
+        yield _emit(answer)
+        _finish("ok")
+        return
+
+    out: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+    threading.Thread(target=_produce, args=(llm, llm_messages(base_context, user_q), out, stop), daemon=True).start()
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                _finish("cancelada")
+                return
+            elapsed = time.perf_counter() - t0
+            limit = timeout_s if metrics["ttft_ms"] is not None else min(first_token_timeout_s, timeout_s)
+            if elapsed >= limit:
+                metrics["error"] = f"sin respuesta completa en {limit:g} s"
+                _finish("timeout")
+                return
+            try:
+                kind, value = out.get(timeout=min(0.1, limit - elapsed))
+            except queue.Empty:
+                continue
+            if kind == "dato":
+                if value:
+                    yield _emit(value)
+            elif kind == "error":
+                metrics["error"] = str(value)
+                yield _emit(f"\n\nError al consultar el modelo: {value}")
+                _finish("error")
+                return
+            else:
+                _finish("ok")
+                break
+    finally:
+        stop.set()
+        if metrics["estado"] == "pendiente":  # generador cerrado desde afuera (p. ej. rerun de Streamlit)
+            _finish("cancelada")
+    if cache is not None:
+        put_answer(cache, key, metrics["texto"], question=user_q, scope=scope, fingerprint=fingerprint)
@@ -0,0 +1,185 @@
+"""Procesamiento batch del diagnóstico para varios clientes (sin Streamlit).
+
+Uso:
+    python ia/cli.py clientes.txt --out resultados/ --formato parquet --workers 4
+
+Cada línea de ``clientes.txt`` es un email registrado en el backend o las tres URLs
+(activos, egresos, HR) separadas por coma o espacios. También se acepta un ``.json``
+con una lista de objetos ``{"id": ..., "email": ...}`` o ``{"id": ..., "urls": [a, e, h]}``.
+
+Por cliente se escribe ``<out>/<id>/`` con las tablas (JSON o Parquet) y ``resumen.json``;
+al final, ``_reporte.json`` con el estado de todos y ``_errores.json`` con los fallidos.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import pandas as pd
+
+from engine import BACKEND_URL, KDA_METHODS, compact_frame, cube_trend, fetch_user_links, read_table, run_pipeline, slug
+
+TABLES = ("corr", "kda", "reasons", "risk", "segments")
+HR_TABLES = ("hr_kpis", "hr_causas", "hr_practicas")
+TREND_TABLES = {"tendencia_semanal": "W", "tendencia_mensual": "M"}
+PHRASE_TABLES = {"frases": "global", "frases_por_area": "por_area"}
+
+def parse_tenants(path: str) -> List[Dict[str, object]]:
+    """Lee la lista de clientes (texto o JSON) y asigna un id estable a cada uno.
+    Un mismo cliente listado dos veces es un error; ids que sólo coinciden tras el slug
+    se desambiguan con un hash corto, así ningún cliente pisa la carpeta de otro."""
+    with open(path, encoding="utf-8") as fh:
+        raw = fh.read()
+    if path.endswith(".json"):
+        items = json.loads(raw)
+    else:
+        items = []
+        for line in raw.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = [p for p in re.split(r"[,\s]+", line) if p]
+            if len(parts) == 1 and "@" in parts[0]:
+                items.append({"email": parts[0]})
+            elif len(parts) == 3:
+                items.append({"urls": parts})
+            else:
+                raise ValueError(f"Línea no reconocida (email o 3 URLs): {line}")
+
+    tenants, raw_ids = [], []
+    for it in items:
+        if "id" in it:
+            tid = str(it["id"])
+        elif it.get("email"):
+            tid = str(it["email"])
+        else:
+            tid = "cliente-" + hashlib.sha1("|".join(it["urls"]).encode("utf-8")).hexdigest()[:10]
+        raw_ids.append(tid)
+        tenants.append({**it, "id": slug(tid).replace(" ", "_") or "cliente"})
+
+    repeated = sorted({t for t in raw_ids if raw_ids.count(t) > 1})
+    if repeated:
+        raise ValueError(f"Clientes repetidos en la lista: {', '.join(repeated)}")
+    # Ids distintos que quedan iguales tras el slug (p. ej. a.b@x.com y a_b@x.com) compartirían
+    # carpeta de salida: todos los del grupo llevan un hash corto del id original
+    slugs = [t["id"] for t in tenants]
+    for t, tid in zip(tenants, raw_ids):
+        if slugs.count(t["id"]) > 1:
+            t["id"] += "_" + hashlib.sha1(tid.encode("utf-8")).hexdigest()[:6]
+    return tenants
+
+def _tables(res: Dict[str, object]) -> Dict[str, pd.DataFrame]:
+    kpis, causas, practicas, _ = res["hr"]
+    out = {name: res[name] for name in TABLES}
+    out.update(zip(HR_TABLES, (kpis, causas, practicas)))
+    if res.get("trends", {}).get("has_time"):
+        out.update({name: cube_trend(res["trends"]["cubes"][freq], by=("area",)) for name, freq in TREND_TABLES.items()})
+    if res.get("phrases"):
+        out.update({name: res["phrases"][part] for name, part in PHRASE_TABLES.items()})
+    return {
+        name: df.reset_index() if df.index.names != [None] else df
+        for name, df in out.items()
+        if isinstance(df, pd.DataFrame) and len(df)
+    }
+
+def write_results(res: Dict[str, object], out_dir: str, fmt: str) -> List[str]:
+    """Escribe las tablas del diagnóstico y un ``resumen.json``; devuelve los archivos creados."""
+    os.makedirs(out_dir, exist_ok=True)
+    tables = _tables(res)
+    summary = {
+        "filas": res["filas"],
+        "m_active": res["m_active"],
+        "m_leaver": res["m_leaver"],
+        "m_hr": res["m_hr"],
+        "fuzzy": res["fuzzy"],
+        "errores": res["errores"],
+        "hr_texto": res["hr"][3],
+        "r2_kda": res["kda"].attrs.get("r2") if len(res["kda"]) else None,
+    }
+    written = []
+    if fmt == "parquet":
+        for name, df in tables.items():
+            path = os.path.join(out_dir, f"{name}.parquet")
+            df.to_parquet(path, index=False)
+            written.append(path)
+    else:
+        summary["tablas"] = {name: json.loads(df.to_json(orient="records", force_ascii=False)) for name, df in tables.items()}
+    path = os.path.join(out_dir, "resumen.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(summary, fh, ensure_ascii=False, indent=2, default=str)
+    written.append(path)
+    return written
+
+def process_tenant(tenant: Dict[str, object], opts: Dict[str, object]) -> Dict[str, object]:
+    """Carga, analiza y escribe un cliente. Nunca lanza: los fallos quedan en el estado."""
+    t0 = time.perf_counter()
+    status = {"id": tenant["id"], "ok": False, "segundos": None, "error": None, "errores_etapas": {}}
+    try:
+        if tenant.get("email"):
+            urls = fetch_user_links(tenant["email"], backend_url=opts["backend"])
+        else:
+            urls = tenant["urls"]
+        if not all(urls):
+            raise ValueError("El cliente no tiene las tres URLs configuradas.")
+        frames = [compact_frame(read_table(u))[0] for u in urls]
+        res = run_pipeline(*frames, min_responses=opts["min_responses"], bootstrap=opts["bootstrap"],
+                           kda_method=opts["kda_method"])
+        status["archivos"] = write_results(res, os.path.join(opts["out"], tenant["id"]), opts["formato"])
+        status["errores_etapas"] = res["errores"]
+        status["ok"] = True
+    except Exception as e:
+        status["error"] = f"{type(e).__name__}: {e}"
+    status["segundos"] = round(time.perf_counter() - t0, 3)
+    return status
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Diagnóstico de rotación batch para varios clientes.")
+    ap.add_argument("clientes", help="Archivo con emails o tríos de URLs (una línea por cliente) o .json")
+    ap.add_argument("--out", default="resultados", help="Directorio de salida")
+    ap.add_argument("--formato", choices=("json", "parquet"), default="json")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--backend", default=BACKEND_URL, help="URL del backend Django para resolver emails")
+    ap.add_argument("--min-responses", type=int, default=10)
+    ap.add_argument("--bootstrap", type=int, default=0, help="Remuestreos bootstrap para IC (0 = sin IC)")
+    ap.add_argument("--kda", choices=KDA_METHODS, default="relative_weights")
+    args = ap.parse_args(argv)
+
+    tenants = parse_tenants(args.clientes)
+    opts = {
+        "out": args.out, "formato": args.formato, "backend": args.backend,
+        "min_responses": args.min_responses, "bootstrap": args.bootstrap, "kda_method": args.kda,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    t0 = time.perf_counter()
+    statuses = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futs = [ex.submit(process_tenant, t, opts) for t in tenants]
+        for i, fut in enumerate(as_completed(futs), 1):
+            st = fut.result()
+            statuses.append(st)
+            flag = "ok" if st["ok"] else "ERROR"
+            print(f"[{i}/{len(tenants)}] {st['id']}: {flag} ({st['segundos']:.1f}s)"
+                  + (f" – {st['error']}" if st["error"] else ""), file=sys.stderr, flush=True)
+
+    failed = [s for s in statuses if not s["ok"]]
+    report = {
+        "clientes": len(tenants),
+        "ok": len(tenants) - len(failed),
+        "fallidos": len(failed),
+        "segundos": round(time.perf_counter() - t0, 3),
+        "detalle": sorted(statuses, key=lambda s: s["id"]),
+    }
+    with open(os.path.join(args.out, "_reporte.json"), "w", encoding="utf-8") as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
+    with open(os.path.join(args.out, "_errores.json"), "w", encoding="utf-8") as fh:
+        json.dump(failed, fh, ensure_ascii=False, indent=2)
+    print(f"{report['ok']}/{report['clientes']} clientes procesados en {report['segundos']:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
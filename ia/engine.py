@@ -0,0 +1,1747 @@
+"""Motor analítico de rotación y fidelización (sin Streamlit).
+
+Carga de encuestas, mapeo de columnas, scoring y agregados que consumen tanto la
+app (``ia.py``) como el procesamiento batch (``cli.py``).
+"""
+import os
+import io
+import re
+import csv
+import json
+import hashlib
+import importlib.util
+import tempfile
+import warnings
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import requests
+
+from profiling import stage as profile_stage
+from resampling import bootstrap_correlations
+
+BACKEND_URL = os.environ.get("IA_BACKEND_URL", "http://127.0.0.1:8000")
+
+# ---------- UTILS ------------
+
+@lru_cache(maxsize=8192)
+def slug(s: str) -> str:
+    s = s.lower()
+    s = re.sub(r"[áàäâ]", "a", s)
+    s = re.sub(r"[éèëê]", "e", s)
+    s = re.sub(r"[íìïî]", "i", s)
+    s = re.sub(r"[óòöô]", "o", s)
+    s = re.sub(r"[úùüû]", "u", s)
+    s = re.sub(r"[^a-z0-9]+", " ", s)
+    return s.strip()
+
+
+# ----- CARGA DESDE URL --------
+
+GSHEET_D_EDIT = re.compile(r"https?://docs\.google\.com/spreadsheets/d/([A-Za-z0-9-_]+)")
+GSHEET_D_E = re.compile(r"https?://docs\.google\.com/spreadsheets/d/e/([A-Za-z0-9-_]+)")
+
+def normalize_gsheet_export_url(url: str, fmt: str = "csv") -> str:
+    """Normaliza enlaces de Google Sheets/Forms a export estable (csv/xlsx)."""
+    u = (url or "").strip()
+    if not u:
+        return u
+
+    # Ya es CSV/XLSX export
+    if u.endswith(".csv") or "output=csv" in u.lower() or "format=xlsx" in u.lower():
+        return re.sub(r"output=[^&#?]+", f"output={fmt}", u)
+
+    # Publicado (d/e/.../pub)
+    m_e = GSHEET_D_E.search(u)
+    if m_e:
+        sep = "&" if "?" in u else "?"
+        return re.sub(r"output=[^&#?]+", f"output={fmt}", u) if "output=" in u else f"{u}{sep}output={fmt}"
+
+    # Enlace de edición (d/<id>)
+    m_d = GSHEET_D_EDIT.search(u)
+    if m_d:
+        sid = m_d.group(1)
+        gid_match = re.search(r"gid=([0-9]+)", u)
+        gid = f"&gid={gid_match.group(1)}" if gid_match else ""
+        return f"https://docs.google.com/spreadsheets/d/{sid}/export?format={fmt}{gid}"
+
+    return u
+
+CSV_BLOCK_BYTES = 8 << 20        # bloque del lector CSV en streaming (pyarrow)
+XLSX_CHUNK_ROWS = 20_000         # filas por bloque al leer XLSX
+DOWNLOAD_SPOOL_BYTES = 64 << 20  # descargas más grandes que esto pasan a disco
+XLSX_MAGIC = b"PK\x03\x04"
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+    return df
+
+def _open_source(src: str, timeout: float = 60.0):
+    """Archivo binario posicionable para una ruta local, ``file://`` o URL (descargada por bloques)."""
+    if src.startswith("file://"):
+        src = src[len("file://"):]
+    if os.path.exists(src):
+        return open(src, "rb")
+    url = normalize_gsheet_export_url(src, fmt="csv")
+    resp = requests.get(url, stream=True, timeout=timeout)
+    resp.raise_for_status()
+    fh = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+    for block in resp.iter_content(chunk_size=1 << 20):
+        fh.write(block)
+    fh.seek(0)
+    return fh
+
+def _parse_like_read_csv(values: List[str], has_null: bool) -> pd.Series:
+    """Tipos que ``pd.read_csv`` daría a una columna con estos valores (uno por fila de un
+    CSV mínimo; con ``has_null`` se agrega un nulo al final)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["v", "_"])
+    writer.writerows([v, 0] for v in values)
+    if has_null:
+        writer.writerow(["", 0])
+    buf.seek(0)
+    return pd.read_csv(buf)["v"]
+
+def _is_text(parsed: pd.Series, k: int) -> bool:
+    return parsed.dtype == object and all(isinstance(v, str) for v in parsed.iloc[:k])
+
+def _looks_free_text(col, ratio: float) -> bool:
+    """Texto de alta cardinalidad: se pasa a objetos Python bloque a bloque en vez de
+    codificarlo por diccionario. Basta una muestra: si algún valor no es número/booleano,
+    pandas deja toda la columna como texto."""
+    import pyarrow.compute as pc
+
+    non_null = len(col) - col.null_count
+    if not non_null or pc.count_distinct(col).as_py() <= ratio * non_null:
+        return False
+    sample = col.drop_null().slice(0, 64).to_pylist()
+    return _is_text(_parse_like_read_csv(sample, False), len(sample))
+
+def _column_from_text(chunks: List[np.ndarray]) -> pd.Series:
+    values = np.concatenate(chunks) if chunks else np.empty(0, dtype=object)
+    values[pd.isnull(values)] = np.nan
+    return pd.Series(values, dtype=object)
+
+def _column_from_dictionary(chunks: list, ratio: float) -> pd.Series:
+    """Columna leída como texto codificado por diccionario → tipos de ``pd.read_csv``.
+    La inferencia se hace con pandas sobre los valores distintos, así números, booleanos
+    y nulos quedan exactamente como en una lectura normal.
+    """
+    import pyarrow as pa
+
+    if chunks:
+        chunked = pa.chunked_array(chunks).unify_dictionaries()
+        dictionary = chunked.chunk(0).dictionary
+        indices = pa.chunked_array([c.indices for c in chunked.chunks], type=pa.int32())
+    else:
+        dictionary, indices = pa.array([], pa.string()), pa.chunked_array([], pa.int32())
+    codes = indices.fill_null(-1).to_numpy().astype(np.int64, copy=False)
+    uniques = dictionary.to_pylist()
+    has_null = indices.null_count > 0
+
+    # Si una muestra ya queda como texto, toda la columna también: se evita parsear todo
+    is_text = _is_text(_parse_like_read_csv(uniques[:64], has_null), min(64, len(uniques)))
+    if is_text:
+        parsed = pd.Series(uniques + ([np.nan] if has_null else []), dtype=object)
+    else:
+        parsed = _parse_like_read_csv(uniques, has_null)
+        is_text = _is_text(parsed, len(uniques))
+
+    non_null = int((codes >= 0).sum())
+    if is_text and non_null and len(uniques) <= ratio * non_null:
+        cat = pd.Categorical.from_codes(codes, categories=uniques)
+        return pd.Series(cat.reorder_categories(sorted(uniques)))
+    # El índice -1 (nulo) toma el último valor, que es el NaN agregado al final
+    return pd.Series(parsed.to_numpy()[codes] if len(codes) else parsed.to_numpy()[:0])
+
+def _read_csv_streaming(fh, ratio: float) -> pd.DataFrame:
+    """CSV leído por bloques con pyarrow. Al llegar cada bloque, el texto repetitivo se
+    codifica por diccionario y el texto libre pasa a objetos; el bloque Arrow se descarta."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    from pandas._libs.parsers import STR_NA_VALUES
+
+    names = list(pd.read_csv(fh, nrows=0).columns)  # nombres como los deja pandas (duplicados .1, .2)
+    fh.seek(0)
+    reader = pacsv.open_csv(
+        fh,
+        read_options=pacsv.ReadOptions(column_names=names, skip_rows=1, block_size=CSV_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={n: pa.string() for n in names},
+            null_values=sorted(STR_NA_VALUES),
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=True,
+        ),
+    )
+    chunks: List[list] = [[] for _ in names]
+    free_text: List[Optional[bool]] = [None] * len(names)  # se decide con el primer bloque
+    for batch in reader:
+        for i, col in enumerate(batch.columns):
+            if free_text[i] is None:
+                free_text[i] = _looks_free_text(col, ratio)
+            chunks[i].append(col.to_numpy(zero_copy_only=False) if free_text[i] else pc.dictionary_encode(col))
+    cols = {}
+    for i in range(len(names)):
+        col_chunks, chunks[i] = chunks[i], None
+        cols[i] = _column_from_text(col_chunks) if free_text[i] else _column_from_dictionary(col_chunks, ratio)
+        del col_chunks
+    df = pd.DataFrame(cols)
+    df.columns = names
+    return df
+
+def _read_xlsx_streaming(fh, chunk_rows: int = XLSX_CHUNK_ROWS) -> pd.DataFrame:
+    """Primera hoja de un XLSX leída en modo sólo lectura de openpyxl, por bloques de filas."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        names, seen = [], {}
+        for i, h in enumerate(header):
+            name = f"Unnamed: {i}" if h is None else str(h)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        parts, block = [], []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            block.append(row[:len(names)])
+            if len(block) >= chunk_rows:
+                parts.append(pd.DataFrame(block, columns=names))
+                block = []
+        if block or not parts:
+            parts.append(pd.DataFrame(block, columns=names))
+    finally:
+        wb.close()
+    df = pd.concat(parts, ignore_index=True).infer_objects()
+    # Columnas sin encabezado ni datos (rango usado de la hoja más ancho que la tabla)
+    empty = [c for c in df.columns if c.startswith("Unnamed: ") and df[c].isna().all()]
+    return df.drop(columns=empty)
+
+def read_table(src: str, category_ratio: Optional[float] = None, profile: Optional[Dict[str, object]] = None,
+               name: str = "tabla") -> pd.DataFrame:
+    """Lee CSV/XLSX desde URL (idealmente Google Sheets publicado) o ruta local.
+    - El formato se detecta por contenido (XLSX es un zip), no por extensión.
+    - CSV: con pyarrow se lee en streaming y el texto repetitivo llega ya como
+      ``category`` (mismos tipos que ``pd.read_csv``); sin pyarrow, ``pd.read_csv``.
+    - XLSX: openpyxl en modo sólo lectura, primera hoja.
+    Con ``profile`` (ver ``profiling``) registra las etapas ``<name>.red`` y ``<name>.parseo``.
+    """
+    if not src:
+        raise ValueError("Proporciona una URL pública válida (Google Sheets/Forms publicado).")
+    ratio = COMPACT_CATEGORY_RATIO if category_ratio is None else category_ratio
+    with profile_stage(profile, f"{name}.red"):
+        fh = _open_source(src)
+    with fh, profile_stage(profile, f"{name}.parseo") as prof:
+        magic = fh.read(4)
+        fh.seek(0)
+        if magic == XLSX_MAGIC:
+            df = _read_xlsx_streaming(fh)
+        else:
+            if importlib.util.find_spec("pyarrow") is None:
+                df = pd.read_csv(fh)  # CSV por defecto (admite comas decimales)
+            else:
+                df = _read_csv_streaming(fh, ratio)
+        df = _normalize_columns(df)
+        prof["filas"] = len(df)
+    return df
+
+# ------ COMPACTACIÓN EN MEMORIA ------
+
+COMPACT_CATEGORY_RATIO = 0.5    # texto con menos distintos/filas que esto → category
+COMPACT_LONG_TEXT_CHARS = 80    # largo medio desde el que un texto se considera libre
+FLOAT32_EXACT_MAX = 2 ** 24     # enteros que float32 representa sin pérdida
+
+def _downcast_float(s: pd.Series) -> pd.Series:
+    """float64 → float32 sólo si todos los valores son enteros exactos (misma representación)."""
+    v = s.to_numpy()
+    ok = v[~np.isnan(v)]
+    if len(ok) and (np.abs(ok) < FLOAT32_EXACT_MAX).all() and (ok == np.round(ok)).all():
+        return s.astype(np.float32)
+    return s
+
+def compact_frame(df: pd.DataFrame, category_ratio: float = COMPACT_CATEGORY_RATIO, arrow_text: bool = False,
+                  long_text_chars: int = COMPACT_LONG_TEXT_CHARS) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Reduce la memoria de un frame leído sin cambiar sus valores.
+    - Texto repetitivo (Likert, áreas, cargos) → ``category``.
+    - Enteros → el entero más chico que los contiene; floats enteros → float32.
+    - Con ``arrow_text``, texto libre largo → ``string[pyarrow]``.
+    Devuelve (frame nuevo, reporte con bytes antes/después y columnas convertidas).
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    out = {}
+    changed = {}
+    for col in df.columns:
+        s = df[col]
+        new = s
+        if pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            new = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s) and s.dtype == np.float64:
+            new = _downcast_float(s)
+        elif s.dtype == object:
+            non_null = s.dropna()
+            if len(non_null) and non_null.nunique() <= category_ratio * len(non_null):
+                new = s.astype("category")
+            elif arrow_text and len(non_null) and non_null.map(type).eq(str).all() \
+                    and non_null.str.len().mean() >= long_text_chars:
+                new = s.astype("string[pyarrow]")
+        if new.dtype != s.dtype:
+            changed[col] = {"antes": str(s.dtype), "despues": str(new.dtype)}
+        out[col] = new
+    compact = pd.DataFrame(out, index=df.index)
+    compact.columns = df.columns
+    after = int(compact.memory_usage(deep=True).sum())
+    report = {"bytes_antes": before, "bytes_despues": after, "columnas": changed}
+    return compact, report
+
+def _as_plain(s: pd.Series) -> pd.Series:
+    """Deshace la compactación de una columna de texto: dtype object con NaN como nulo."""
+    if s.dtype == object or not (isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(s)):
+        return s
+    return s.astype(object).where(s.notna(), np.nan)
+
+def fetch_user_links(email: str, backend_url: str = BACKEND_URL, timeout: float = 15.0) -> Tuple[str, str, str]:
+    """URLs (activos, egresos, HR) registradas para el usuario en el backend Django."""
+    resp = requests.get(f"{backend_url.rstrip('/')}/api/accounts/user-links/", params={"email": email}, timeout=timeout)
+    if resp.status_code != 200:
+        raise ValueError(f"No se pudieron cargar los links del usuario ({resp.status_code}).")
+    data = resp.json()
+    return data.get("form_link1", ""), data.get("form_link2", ""), data.get("form_link3", "")
+
+# Encuesta a planta activa (intención y drivers)
+ACTIVE_REQUIRED = {
+    "id": ["Marca temporal", "id", "documento", "employee id", "cédula", "cedula"],
+    "area": ["¿En qué área trabajas?", "area", "área", "departamento"],
+    "rol": ["¿En qué cargo trabajas?", "rol", "cargo", "puesto", "title"],
+    "intencion_salida": ["Estoy pensando en dejar la empresa en los próximos 12 meses."],
+}
+
+ACTIVE_OPTIONAL = {
+    # Señales adicionales de intención
+    "intencion_salida_aux": ["En los últimos 3 meses, ¿has considerado o explorado oportunidades laborales fuera de la empresa?"],
+    "preferencia_quedar": ["Si otra empresa me ofreciera un trabajo similar, preferiría quedarme aquí."],
+
+    # Segmentación temporal y antigüedad
+    "marca_temporal": ["Marca temporal", "timestamp", "fecha"],
+    "antiguedad": ["¿Cuánto tiempo llevas trabajando en la empresa?", "¿Cuánto tiempo llevas en la empresa?", "antiguedad", "antigüedad"],
+
+    # Engagement/NPS
+    "satisfaccion_general": ["En una escala de 0 a 10, ¿Qué probabilidad hay de que recomiendes a un amigo trabajar en esta empresa?" ],
+
+    # Drivers (acuerdos tipo Likert)
+    "autonomia": ["Siento que tengo la autonomía necesaria para tomar decisiones en mi trabajo."],
+    "respeto_inclusion": ["Me siento respetado(a) e incluido(a) en esta organización."],
+    "confianza_liderazgo": ["Confío en la capacidad de liderazgo de quienes dirigen la organización."],
+    "voz_opiniones": ["Mi voz y mis opiniones son escuchadas por la organización."],
+    "comunicacion": ["La comunicación dentro de la organización es clara, transparente y efectiva."],
+    "carga_laboral": ["Mi carga de trabajo es razonable y puedo manejarla sin exceso de estrés."],
+    "desconexion": ["Tengo la posibilidad de desconectarme y descansar fuera del horario laboral."],
+    "claridad_funciones": ["Sé claramente cuáles son mis funciones y lo que se espera de mí."],
+    "herramientas": ["Cuento con las herramientas y recursos necesarios para hacer bien mi trabajo."],
+    "crecimiento": ["Tengo oportunidades reales de crecer y desarrollarme dentro de la empresa."],
+    "feedback": ["En los últimos 3 meses he recibido retroalimentación que me ha ayudado a mejorar."],
+    "jefe_respeto": ["Mi jefe me apoya y me respeta"],
+    "jefe_confia": ["Mi jefe confía en mi y valora mi trabajo"],
+    "reconocimiento": ["En esta empresa se valora y reconoce cuando hago bien mi trabajo."],
+    "compensacion": ["Considero que mi salario es justo frente al mercado laboral colombiano."],
+    "beneficios_adecuados": ["Los beneficios que ofrece la empresa son adecuados."],
+    "seguridad_psico": ["Siento que puedo dar mis ideas y opiniones sin temor a represalias."],
+    "respeto_equipo": ["En mi equipo hay respeto e inclusión para todos."],
+    "confianza_direccion": ["Confío en la dirección que esta tomando la empresa"],
+    "motivacion": ["Me siento motivado/a para dar lo mejor de mi cada día"],
+
+    # Texto libre
+    "razon_calificacion": ["¿Cuál fue la razón principal de tu calificación anterior?"],
+    "razones_posible_salida": ["Si algún día decidieras dejar la empresa, ¿Cuáles serían las principales razones? (Máximo 3)"],
+    "cambio_para_quedarte": ["Si pudieras cambiar una sola cosa en la empresa para quedarte por más tiempo, ¿Qué sería?"],
+    "comentario_adicional": ["¿Quieres dejar algún comentario adicional que nos ayude a mejorar?"],
+}
+
+# Encuesta de egreso (leavers)
+LEAVER_REQUIRED = {
+    "motivo_salida": ["¿Cuál es el motivo principal por el que decidiste irte de la empresa?", "motivo"],
+}
+LEAVER_OPTIONAL = {
+    "area": ["¿En qué área trabajabas?", "area", "departamento"],
+    "rol": ["¿En qué cargo trabajabas?", "rol", "cargo"],
+    "antiguedad_meses": ["¿Cuánto tiempo estuviste en la empresa?", "antiguedad", "meses"],
+    "nps": ["En una escala de 0 a 10, ¿Qué probabilidad hay de que recomiendes a un amigo trabajar en esta empresa?"],
+    "otros_factores": ["Además del motivo principal, ¿Qué otros factores influyeron en tu decisión? (Máximo 3)"],
+    "mejoras_retencion": ["¿Qué tres mejoras habrían hecho más probable que te quedaras en la empresa?"],
+    "sugerencia_final": ["¿Quieres dejarnos alguna sugerencia final para mejorar?"],
+}
+
+# Encuesta de Gestión Humana
+HR_REQUIRED = {
+    "marca": ["Marca temporal"],
+}
+HR_OPTIONAL = {
+    # KPIs
+    "headcount": ["¿Cuántas personas trabajan en la organización actualmente?"],
+    "rotacion_6m": ["¿Cual es el indice de rotación de tu roganización en los ultimos 6 meses?"],
+    "hr_headcount": ["¿Cuántas personas trabajan en el área de Gestión Humana?"],
+    "vacantes_mes": ["En promedio, ¿Cuántas vacantes tienen abiertas cada mes?"],
+    "perfiles_dificiles": ["¿Cuáles son los perfiles o cargos más difíciles de cubrir?"],
+
+    # Desajuste selección
+    "dificultad_ajuste": ["En los procesos de selección hemos identificado dificultades para lograr que el perfil de los candidatos se ajuste a la complejidad real del cargo."],
+    "sobrecalificados": ["En ocasiones contratamos personas sobre calificadas para cargos operativos (ej. con más estudios o experiencia de la necesaria)."],
+    "subcalificados": ["En ocasiones contratamos personas sub calificadas para cargos que requieren mayor experiencia o competencias."],
+    "ajuste_contribuye_rotacion": ["Considero que este desajuste entre perfil y cargo contribuye a la rotación de personal en la empresa."],
+    "factores_desajuste": ["¿Qué factores crees que explican este desajuste?"],
+
+    # Prácticas y políticas
+    "indicadores_rotacion": ["En el área llevamos indicadores claros de rotación y los revisamos con frecuencia."],
+    "medimos_tiempo_cobertura": ["Medimos el tiempo promedio para cubrir vacantes."],
+    "medimos_costo_reemplazo": ["Medimos el costo de reemplazar personal."],
+    "plan_retencion": ["Tenemos un plan formal de fidelización para los cargos más críticos."],
+    "movilidad_interna": ["Contamos con políticas de movilidad interna para ofrecer nuevas oportunidades."],
+    "revision_salarial_anual": ["Revisamos los salarios al menos una vez al año comparándolos con el mercado."],
+    "flexibilidad_laboral": ["Ofrecemos flexibilidad laboral (teletrabajo, horarios flexibles) según el rol."],
+    "encuestas_clima": ["Aplicamos encuestas de clima laboral y damos seguimiento a los resultados."],
+
+    # Causas según HR
+    "causa_compensacion": ["Considero que la compensación es una de las principales causas de salida de la gente."],
+    "causa_jefes": ["Considero que la relación con los jefes es una de las principales causas de salida."],
+    "causa_sobrecarga": ["Considero que la sobrecarga laboral es una de las principales causas de salida."],
+    "causa_proyeccion": ["Considero que la falta de proyección es una de las principales causas de salida."],
+    "causa_modalidad": ["Considero que la modalidad de trabajo (remoto/presencial) es una de las principales causas de salida."],
+
+    # Efectividad de acciones
+    "eff_ajuste_salarios": ["Nuestras acciones actuales son efectivas para ajustar salarios cuando es necesario."],
+    "eff_liderazgo": ["Nuestras acciones actuales son efectivas para desarrollar programas de liderazgo."],
+    "eff_bienestar": ["Nuestras acciones actuales son efectivas para promover bienestar y salud mental."],
+    "eff_reconocimiento": ["Nuestras acciones actuales son efectivas para reconocer el buen desempeño."],
+    "eff_capacitacion": ["Nuestras acciones actuales son efectivas para dar oportunidades de capacitación y planes de carrera."],
+
+    # Analítica y sponsorship
+    "usa_analitica": ["En la empresa usamos analítica de datos para predecir riesgos de salida."],
+    "sponsorship_alta_direccion": ["La alta dirección participa activamente en las acciones de fidelización."],
+
+    # Segmentación rotación
+    "identifico_quien_se_va": ["En los últimos 12 meses, ¿la empresa ha identificado qué tipo de personas están dejando la organización?"],
+    "percepcion_rotacion": ["Consideras que en la mayoría de los casos la rotación actual de la empresa es"],
+
+    # Acciones inmediatas
+    "acciones_6m": ["Si tuvieras que priorizar tres acciones inmediatas para reducir la rotación en los próximos 6 meses, ¿Cuáles serían?"],
+}
+
+# ----- MAPEADOR DE COLUMNAS ---
+
+FUZZY_THRESHOLD = 0.85  # similitud Dice mínima (trigramas) para aceptar un emparejamiento aproximado
+FUZZY_MIN_LEN = 15      # solo preguntas largas; pistas cortas ('area', 'rol') exigen coincidencia exacta
+
+def schema_fingerprint(columns) -> str:
+    """Huella del conjunto ordenado de columnas (identifica el esquema de un export)."""
+    return hashlib.sha1("\x1f".join(map(str, columns)).encode("utf-8")).hexdigest()
+
+FINGERPRINT_SAMPLE = 2048   # filas hasheadas por frame (primeras, últimas y equiespaciadas)
+
+def frame_fingerprint(df: pd.DataFrame, sample: int = FINGERPRINT_SAMPLE) -> str:
+    """Huella barata del contenido de un frame: esquema, tamaño, dtypes y hash de una muestra
+    fija de filas. No recorre el frame completo, así que es apta para cada rerun.
+    """
+    n = len(df)
+    if n <= sample:
+        pos = np.arange(n)
+    else:
+        edge = min(64, sample // 4)
+        pos = np.unique(np.concatenate([
+            np.arange(edge), np.linspace(0, n - 1, sample - 2 * edge).astype(np.int64), np.arange(n - edge, n),
+        ]))
+    h = hashlib.sha1()
+    h.update(schema_fingerprint(df.columns).encode("utf-8"))
+    h.update(f"{df.shape}|{'|'.join(map(str, df.dtypes))}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df.iloc[pos], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+@lru_cache(maxsize=8192)
+def _trigrams(s: str) -> frozenset:
+    s = f"  {s} "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+@lru_cache(maxsize=4096)
+def _hint_slugs(hints: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(slug(h) for h in hints)
+
+def _spec_key(spec: Dict[str, List[str]]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    return tuple((k, tuple(h)) for k, h in spec.items())
+
+@lru_cache(maxsize=64)
+def _column_index(columns: Tuple[str, ...]) -> Dict[str, object]:
+    """Índice compilado de un esquema: slug exacto → columna e índice invertido de trigramas."""
+    slugs = {slug(c): c for c in columns}
+    grams = {s: _trigrams(s) for s in slugs}
+    inverted: Dict[str, List[str]] = {}
+    for s, g in grams.items():
+        for t in g:
+            inverted.setdefault(t, []).append(s)
+    return {"slugs": slugs, "grams": grams, "inverted": inverted}
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+def _fuzzy_lookup(index: Dict[str, object], hint_slug: str, threshold: float, taken: set,
+                  rivals: Tuple[str, ...]) -> Optional[Tuple[str, float]]:
+    """Mejor columna libre por similitud de trigramas. Se descarta si la columna se parece
+    igual o más a la pista de otra clave (``rivals``), p. ej. las preguntas 'causa_*' de HR.
+    """
+    if len(hint_slug) < FUZZY_MIN_LEN:
+        return None
+    g = _trigrams(hint_slug)
+    shared: Dict[str, int] = {}
+    for t in g:
+        for s in index["inverted"].get(t, ()):
+            shared[s] = shared.get(s, 0) + 1
+    best, best_score = None, 0.0
+    for s, k in shared.items():
+        if index["slugs"][s] in taken:
+            continue
+        score = 2 * k / (len(g) + len(index["grams"][s]))
+        if score > best_score:
+            best, best_score = s, score
+    if best is None or best_score < threshold:
+        return None
+    if any(_dice(index["grams"][best], _trigrams(r)) >= best_score for r in rivals):
+        return None
+    return index["slugs"][best], best_score
+
+def guess_col(df: pd.DataFrame, hints: List[str], default: Optional[str] = None) -> Optional[str]:
+    slugs = _column_index(tuple(df.columns))["slugs"]
+    for h in _hint_slugs(tuple(hints)):
+        if h in slugs:
+            return slugs[h]
+    return default
+
+_MAPPING_CACHE: Dict[Tuple, Tuple] = {}
+_MAPPING_CACHE_MAX = 128
+
+def _map_cols_compiled(columns: Tuple[str, ...], req: Tuple, opt: Tuple, threshold: float):
+    key = (schema_fingerprint(columns), req, opt, threshold)
+    hit = _MAPPING_CACHE.get(key)
+    if hit is not None:
+        return hit
+    index = _column_index(columns)
+    slugs = index["slugs"]
+    m: Dict[str, Optional[str]] = {}
+    for k, hints in req + opt:
+        m[k] = next((slugs[h] for h in _hint_slugs(hints) if h in slugs), None)
+
+    fuzzy: Dict[str, Tuple[str, float]] = {}
+    if threshold < 1:
+        taken = {c for c in m.values() if c}
+        for k, hints in req + opt:
+            if m[k]:
+                continue
+            rivals = tuple(r for k2, h2 in req + opt if k2 != k for r in _hint_slugs(h2) if len(r) >= FUZZY_MIN_LEN)
+            for h in _hint_slugs(hints):
+                hit = _fuzzy_lookup(index, h, threshold, taken, rivals)
+                if hit:
+                    m[k] = hit[0]
+                    fuzzy[k] = (hit[0], round(hit[1], 3))
+                    taken.add(hit[0])
+                    break
+    for k, _ in req:
+        if not m[k]:
+            m[k] = columns[0]
+    if len(_MAPPING_CACHE) >= _MAPPING_CACHE_MAX:
+        _MAPPING_CACHE.pop(next(iter(_MAPPING_CACHE)))
+    _MAPPING_CACHE[key] = out = (tuple(m.items()), tuple(fuzzy.items()))
+    return out
+
+def map_cols_report(df: pd.DataFrame, req: Dict[str, List[str]], opt: Dict[str, List[str]],
+                    fuzzy_threshold: float = FUZZY_THRESHOLD) -> Tuple[Dict[str, Optional[str]], Dict[str, Tuple[str, float]]]:
+    """Como ``map_cols`` pero devuelve también las claves emparejadas por similitud
+    (clave → (columna, score)). Los resultados se memorizan por huella de esquema.
+    """
+    m, fuzzy = _map_cols_compiled(tuple(df.columns), _spec_key(req), _spec_key(opt), fuzzy_threshold)
+    return dict(m), dict(fuzzy)
+
+def map_cols(df: pd.DataFrame, req: Dict[str, List[str]], opt: Dict[str, List[str]]) -> Dict[str, Optional[str]]:
+    return map_cols_report(df, req, opt)[0]
+
+# Pistas compiladas una sola vez al importar
+for _spec in (ACTIVE_REQUIRED, ACTIVE_OPTIONAL, LEAVER_REQUIRED, LEAVER_OPTIONAL, HR_REQUIRED, HR_OPTIONAL):
+    for _hints in _spec.values():
+        _hint_slugs(tuple(_hints))
+
+# ---- PREP & SCORING LOGIC ----
+
+KEYWORDS_BUCKETS = {
+    "compensacion": ["salario", "pago", "compens", "sueldo", "bono"],
+    "beneficios": ["beneficio", "prestacion", "eps", "auxilio", "bonificación"],
+    "liderazgo": ["jefe", "lider", "manager", "trato", "feedback", "retroaliment", "reconocimiento"],
+    "carrera": ["crecimiento", "desarrollo", "ascenso", "aprendizaje", "formacion", "proyeccion", "carrera"],
+    "carga": ["carga", "horas", "turno", "estres", "estrés", "burnout", "sobre carga", "sobrecarga"],
+    "flexibilidad": ["flexibilidad", "teletrabajo", "hibrido", "híbrido", "home office", "horario", "presencial", "remoto"],
+    "ambiente": ["clima", "ambiente", "equipo", "cultura", "respeto", "inclusion", "inclusión", "seguridad"],
+    "comunicacion": ["comunicacion", "comunicación", "transparencia", "informacion"],
+    "herramientas": ["herramienta", "equipo", "recurso", "software"],
+    "claridad_rol": ["claridad", "funciones", "objetivo", "rol"],
+    "autonomia": ["autonomia", "autonomía", "decisiones"],
+    "seleccion_ajuste": ["ajuste", "perfil", "seleccion", "selección", "sobrecali", "subcali"],
+}
+
+def map_spanish_likert_to_numeric(series: pd.Series) -> pd.Series:
+    """Mapea respuestas en español a números y **garantiza dtype numérico**.
+    - Soporta Likert textual (1..5), sí/no y números ("8", "10", "10,0").
+    - Convierte valores como "—", "n/a", "no aplica" en NaN.
+    """
+    s = series.astype(str).str.strip().str.lower()
+    s = s.replace({
+        "": np.nan,
+        "-": np.nan,
+        "—": np.nan,
+        "na": np.nan,
+        "n/a": np.nan,
+        "no aplica": np.nan,
+        "prefiero no responder": np.nan,
+        "sin respuesta": np.nan,
+    })
+
+    LIKERT_ES_MAP = {
+        "totalmente en desacuerdo": 1,
+        "en desacuerdo": 2,
+        "ni de acuerdo ni en desacuerdo": 3,
+        "de acuerdo": 4,
+        "totalmente de acuerdo": 5,
+    }
+
+    mapped = s.map(LIKERT_ES_MAP)
+
+    mapped = mapped.fillna(s.replace({"sí": 5, "si": 5, "yes": 5, "no": 1}))
+
+    numeric = pd.to_numeric(s.str.replace(",", ".", regex=False), errors="coerce")
+
+    out = mapped.fillna(numeric)
+    out = pd.to_numeric(out, errors="coerce")
+    return out
+
+def normalize_likert(series: pd.Series) -> pd.Series:
+    """Normaliza a 0-100 soportando 1-5, 0-10 y 0-100.
+    Evita errores de comparación cuando hay strings mezclados.
+    """
+    s = map_spanish_likert_to_numeric(series)
+    mx = s.max(skipna=True)
+    if pd.notna(mx) and mx <= 5:
+        return (s - 1) / 4 * 100
+    if pd.notna(mx) and mx <= 10:
+        return (s / 10) * 100
+    return s.clip(0, 100)
+
+def _score_agreement(series: pd.Series, positive_is_risk: bool = True) -> pd.Series:
+    s = map_spanish_likert_to_numeric(series)
+    mx = s.max(skipna=True)
+    if pd.isna(mx):
+        score = s 
+    elif mx <= 5:
+        score = (s - 1) / 4
+    elif mx <= 10:
+        score = s / 10
+    else:
+        score = (s.clip(0, 100)) / 100
+    return score if positive_is_risk else (1 - score)
+
+def _score_yesno(series: pd.Series, yes_risk: bool = True) -> pd.Series:
+    s = series.astype(str).str.strip().str.lower()
+    s = s.replace({
+        "": np.nan,
+        "-": np.nan,
+        "—": np.nan,
+        "na": np.nan,
+        "n/a": np.nan,
+        "no aplica": np.nan,
+        "prefiero no responder": np.nan,
+        "sin respuesta": np.nan,
+    })
+    yes = s.isin(["sí", "si", "yes", "true", "verdadero"]) | s.str.contains(r"\b(?:s[ií])\b", na=False)
+    no = s.isin(["no", "false", "falso"]) | s.str.contains(r"\bno\b", na=False)
+    base = pd.Series(np.nan, index=s.index, dtype="float")
+    base[yes] = 1.0
+    base[no] = 0.0
+
+    s_num = pd.to_numeric(s.str.replace(',', '.', regex=False), errors='coerce')
+    base = base.fillna(s_num.apply(lambda x: np.nan if pd.isna(x) else (1.0 if x >= 1 else 0.0)))
+    return base if yes_risk else 1 - base
+
+def infer_intent_from_active(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.Series:
+    """Construye un score de intención de salida combinando 2-3 señales."""
+    parts = []
+
+    col_main = m_active.get("intencion_salida")
+    if col_main and col_main in df_active.columns:
+        parts.append(_score_agreement(df_active[col_main], positive_is_risk=True))
+
+    col_aux = m_active.get("intencion_salida_aux")
+    if col_aux and col_aux in df_active.columns:
+        parts.append(_score_yesno(df_active[col_aux], yes_risk=True))
+
+    col_stay = m_active.get("preferencia_quedar")
+    if col_stay and col_stay in df_active.columns:
+        parts.append(_score_agreement(df_active[col_stay], positive_is_risk=False))
+
+    if not parts:
+        return pd.Series(0.0, index=df_active.index)
+
+    X = pd.concat(parts, axis=1)
+    return X.mean(axis=1).fillna(0.0)
+
+DRIVER_SKIP_KEYS = {"id", "area", "rol", "intencion_salida", "intencion_salida_aux", "preferencia_quedar", "razones_texto", "marca_temporal", "antiguedad"}
+
+def driver_matrix(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.DataFrame:
+    """Drivers mapeados normalizados a 0-100 (una columna por clave)."""
+    drivers = {}
+    for key, col in m_active.items():
+        if key in DRIVER_SKIP_KEYS:
+            continue
+        if not col or col not in df_active.columns:
+            continue
+        drivers[key] = normalize_likert(df_active[col])
+    if not drivers:
+        return pd.DataFrame()
+    return pd.DataFrame(drivers)
+
+def correlate_with_intent(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]], bootstrap: int = 0,
+                          ci: float = 0.95, seed: int = 42, time_budget_s: Optional[float] = None,
+                          n_jobs: int = 1, drivers: Optional[pd.DataFrame] = None,
+                          intent: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Calcula correlaciones de drivers con intención de salida.
+    Con ``bootstrap > 0`` agrega intervalo de confianza percentil (``ic_inferior``/``ic_superior``)
+    y p-valor bilateral bootstrap; ``out.attrs["n_bootstrap"]`` indica los remuestreos completados.
+    ``drivers``/``intent`` reutilizan ``driver_matrix``/``infer_intent_from_active`` ya calculados.
+    """
+    y = infer_intent_from_active(df_active, m_active) if intent is None else intent
+    X = driver_matrix(df_active, m_active) if drivers is None else drivers
+    if X.empty:
+        return pd.DataFrame()
+    corr = X.assign(intent=y).corr(numeric_only=True)["intent"].drop("intent")
+    out = corr.rename("correlacion_intencion").to_frame()
+
+    if bootstrap > 0:
+        boot = bootstrap_correlations(
+            X.to_numpy(dtype=float), y.to_numpy(dtype=float), n_resamples=int(bootstrap),
+            seed=seed, time_budget_s=time_budget_s, n_jobs=n_jobs,
+        )
+        alpha = (1 - ci) / 2
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            lo, hi = np.nanquantile(boot, [alpha, 1 - alpha], axis=0) if len(boot) else (np.nan, np.nan)
+        n_ok = np.sum(~np.isnan(boot), axis=0)
+        le = (np.sum(boot <= 0, axis=0) + 1) / (n_ok + 1)
+        ge = (np.sum(boot >= 0, axis=0) + 1) / (n_ok + 1)
+        out["ic_inferior"] = lo
+        out["ic_superior"] = hi
+        out["p_valor"] = np.where(n_ok > 0, np.minimum(1.0, 2 * np.minimum(le, ge)), np.nan)
+
+    out = out.sort_values("correlacion_intencion", ascending=True)  # negativo = protector; positivo = riesgo
+    out.index.name = "driver"
+    if bootstrap > 0:
+        out.attrs["n_bootstrap"] = len(boot)
+    return out
+
+def pairwise_corr_matrix(Z: np.ndarray) -> np.ndarray:
+    """Matriz de correlación con exclusión de NaN por pares (como ``DataFrame.corr``),
+    calculada con productos matriciales sobre la máscara de valores presentes.
+    """
+    valid = ~np.isnan(Z)
+    M = valid.astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        Zc = np.where(valid, Z - np.nanmean(Z, axis=0), 0.0)
+    N = M.T @ M                  # observaciones por par
+    S = Zc.T @ M                 # S[j, k] = suma de j donde j y k están presentes
+    Q = (Zc ** 2).T @ M
+    P = Zc.T @ Zc
+    var = N * Q - S ** 2         # varianza de j restringida al par (j, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        R = (N * P - S * S.T) / np.sqrt(var * var.T)
+    R[N < 2] = np.nan
+    return R
+
+def _relative_weights(Rxx: np.ndarray, rxy: np.ndarray) -> np.ndarray:
+    """Pesos relativos de Johnson (2000): descomponen R² entre predictores correlacionados."""
+    evals, evecs = np.linalg.eigh(Rxx)
+    evals = np.clip(evals, 1e-10, None)  # la matriz por pares puede no ser semidefinida
+    lam = (evecs * np.sqrt(evals)) @ evecs.T
+    beta = (evecs / np.sqrt(evals)) @ (evecs.T @ rxy)
+    return (lam ** 2) @ (beta ** 2)
+
+def _ridge_pratt(Rxx: np.ndarray, rxy: np.ndarray, alpha: float) -> np.ndarray:
+    """Medida de Pratt (beta ridge estandarizado × correlación simple)."""
+    beta = np.linalg.solve(Rxx + alpha * np.eye(len(rxy)), rxy)
+    return beta * rxy
+
+KDA_METHODS = ("relative_weights", "ridge")
+
+def key_driver_analysis(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]],
+                        method: str = "relative_weights", ridge_alpha: float = 0.1,
+                        drivers: Optional[pd.DataFrame] = None, intent: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Importancia relativa de los drivers sobre la intención de salida.
+    A diferencia de las correlaciones simples, reparte la varianza explicada entre drivers
+    colineales (p. ej. ``jefe_respeto``/``jefe_confia``/``confianza_liderazgo``).
+    Los faltantes se tratan por pares; ``out.attrs["r2"]`` guarda el R² del modelo.
+    """
+    if method not in KDA_METHODS:
+        raise ValueError(f"Método no soportado: {method}. Usa uno de {KDA_METHODS}.")
+    X = driver_matrix(df_active, m_active) if drivers is None else drivers
+    if X.empty:
+        return pd.DataFrame()
+    y = infer_intent_from_active(df_active, m_active) if intent is None else intent
+
+    R = pairwise_corr_matrix(np.column_stack([X.to_numpy(dtype=float), y.to_numpy(dtype=float)]))
+    rxy_all = R[:-1, -1]
+    keep = np.isfinite(rxy_all) & np.isfinite(np.diag(R)[:-1])
+    if not keep.any():
+        return pd.DataFrame()
+    Rxx = np.nan_to_num(R[:-1, :-1][np.ix_(keep, keep)], nan=0.0)
+    np.fill_diagonal(Rxx, 1.0)
+    rxy = rxy_all[keep]
+
+    raw = _relative_weights(Rxx, rxy) if method == "relative_weights" else _ridge_pratt(Rxx, rxy, ridge_alpha)
+    r2 = float(raw.sum())
+    out = pd.DataFrame({
+        "peso_bruto": raw,
+        "peso_relativo_%": raw / r2 * 100 if r2 else np.nan,
+        "correlacion_intencion": rxy,
+    }, index=pd.Index(X.columns[keep], name="driver"))
+    out = out.sort_values("peso_bruto", ascending=False)
+    out.attrs["r2"] = r2
+    out.attrs["method"] = method
+    return out
+
+def correlate_by_segment(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]],
+                         by: Tuple[str, ...] = ("area",), min_responses: int = 10,
+                         drivers: Optional[pd.DataFrame] = None, intent: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Correlaciones driver–intención para todos los segmentos en una sola pasada.
+    Normaliza una vez y reduce con un único ``groupby().sum()`` las sumas, cuadrados y
+    productos cruzados por segmento. Devuelve una matriz segmento × driver (más ``n``);
+    se omiten segmentos con menos de ``min_responses`` respuestas y celdas con menos
+    pares completos que ese umbral.
+    """
+    if isinstance(by, str):
+        by = (by,)
+    cols = [m_active.get(k) for k in by]
+    if not cols or any(not c or c not in df_active.columns for c in cols):
+        return pd.DataFrame()
+    X = driver_matrix(df_active, m_active) if drivers is None else drivers
+    if X.empty:
+        return pd.DataFrame()
+    y = (infer_intent_from_active(df_active, m_active) if intent is None else intent).to_numpy(dtype=float)
+
+    Z = X.to_numpy(dtype=float)
+    valid = ~np.isnan(Z)
+    mask = valid.astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        Zc = np.where(valid, Z - np.nanmean(Z, axis=0), 0.0)
+    yc = (y - y.mean())[:, None]
+    Ym = mask * yc
+    stats = np.hstack([mask, Zc, Zc ** 2, Ym, Ym * yc, Zc * yc, np.ones((len(Z), 1))])
+
+    keys = [_as_plain(df_active[c]).rename(k) for k, c in zip(by, cols)]
+    sums = pd.DataFrame(stats, index=df_active.index).groupby(keys, sort=True).sum()
+    n = sums.iloc[:, -1]
+    cnt, sx, sxx, sy, syy, sxy = np.split(sums.iloc[:, :-1].to_numpy(), 6, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (cnt * sxy - sx * sy) / np.sqrt((cnt * sxx - sx ** 2) * (cnt * syy - sy ** 2))
+    r[cnt < max(2, min_responses)] = np.nan
+
+    out = pd.DataFrame(r, index=sums.index, columns=X.columns)
+    out.insert(0, "n", n.astype(int))
+    return out[out["n"] >= min_responses]
+
+# Stopwords en español (sin tildes) para el texto libre
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aquel aquella aqui asi aun bien cada casi como con
+contra cual cuales cuando de del desde donde dos e el ella ellas ello ellos en entre era eran es esa esas ese
+eso esos esta estaba estan estar estas este esto estos estoy fue fueron ha habia han hasta hay la las le les
+lo los mas me mi mis mucho muy nada ni no nos nosotros o otra otro otros para pero poco por porque que quien
+se sea ser si sido sin sobre solo son su sus tambien tan tanto te tener tengo tiene tienen todo todos tu un
+una uno unos usted y ya yo hace hacer puede pueden seria serian vez veces ademas
+""".split())
+
+_ACCENTS = str.maketrans("áàäâéèëêíìïîóòöôúùüûñ", "aaaaeeeeiiiioooouuuun")
+
+def tokenize(s: str) -> List[str]:
+    return re.findall(r"[a-záéíóúüñ0-9]+", str(s).lower())
+
+def bucketize_reason(text: str) -> Dict[str, int]:
+    tokens = tokenize(text)
+    counts = {k: 0 for k in KEYWORDS_BUCKETS}
+    for k, words in KEYWORDS_BUCKETS.items():
+        counts[k] = sum(1 for t in tokens for w in words if w in t)
+    return counts
+
+def summarize_reasons(df_active: pd.DataFrame, df_leaver: pd.DataFrame, m_active: Dict[str, Optional[str]], m_leaver: Dict[str, Optional[str]],
+                      active_weight: float = 1.0) -> pd.DataFrame:
+    """Menciones por categoría de motivo. ``active_weight`` expande las menciones de activos
+    cuando ``df_active`` es una muestra (modo aproximado)."""
+    buckets = {k: 0 for k in KEYWORDS_BUCKETS}
+    # Activos – texto consolidado
+    col_txt_a = m_active.get("razones_texto")
+    if col_txt_a and col_txt_a in df_active.columns:
+        active = {k: 0 for k in KEYWORDS_BUCKETS}
+        for txt in df_active[col_txt_a].dropna().astype(str).tolist():
+            counts = bucketize_reason(txt)
+            for k, v in counts.items():
+                active[k] += v
+        for k, v in active.items():
+            buckets[k] += int(round(v * active_weight))
+    # Egresos – texto consolidado y motivo estructurado
+    col_txt_l = m_leaver.get("comentarios")
+    if col_txt_l and col_txt_l in df_leaver.columns:
+        for txt in df_leaver[col_txt_l].dropna().astype(str).tolist():
+            counts = bucketize_reason(txt)
+            for k, v in counts.items():
+                buckets[k] += v
+    col_mot = m_leaver.get("motivo_salida")
+    if col_mot and col_mot in df_leaver.columns:
+        for txt in df_leaver[col_mot].dropna().astype(str).tolist():
+            counts = bucketize_reason(txt)
+            for k, v in counts.items():
+                buckets[k] += v
+    df = pd.DataFrame([
+        {"categoria": k, "menciones": v} for k, v in buckets.items()
+    ]).sort_values("menciones", ascending=False)
+    df["peso_relativo_%"] = (df["menciones"] / max(1, df["menciones"].sum())) * 100
+    return df
+
+# drivers principales que acompañan el riesgo por segmento
+RISK_DRIVER_KEYS = [
+    "satisfaccion_general", "compensacion", "jefe_respeto", "jefe_confia", "crecimiento",
+    "carga_laboral", "comunicacion", "reconocimiento"
+]
+
+def _risk_score(agg: pd.DataFrame, sat_col: Optional[str]) -> pd.DataFrame:
+    if sat_col and (sat_col+"_avg") in agg.columns:
+        agg["riesgo"] = 0.5*agg["intent_media"] + 0.5*(100 - agg[sat_col+"_avg"]) / 100
+    else:
+        agg["riesgo"] = agg["intent_media"]
+    agg["riesgo_%"] = (agg["riesgo"]*100).round(1)
+    return agg.sort_values(["riesgo", "n"], ascending=[False, False])
+
+def area_risk(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.DataFrame:
+    a_col = m_active.get("area")
+    if not a_col or a_col not in df_active.columns:
+        return pd.DataFrame()
+    intent = infer_intent_from_active(df_active, m_active)
+    # drivers principales si existen
+    drv_cols = [m_active.get(k) for k in RISK_DRIVER_KEYS]
+    drv_cols = [c for c in drv_cols if c and c in df_active.columns]
+    df = pd.DataFrame({a_col: _as_plain(df_active[a_col])}, index=df_active.index)
+    df["intent"] = intent
+    for c in drv_cols:
+        df[c+"_norm"] = normalize_likert(df_active[c])
+    agg = df.groupby(a_col, observed=True).agg(
+        intent_media=("intent", "mean"),
+        n=("intent", "size"),
+        **{c+"_avg": (c+"_norm", "mean") for c in drv_cols}
+    ).reset_index()
+    return _risk_score(agg, m_active.get("satisfaccion_general"))
+
+# ------ CUBO DE RIESGO (OLAP) ------
+
+CUBE_DIMS = ("area", "rol", "antiguedad", "periodo")
+CUBE_NA = "(sin dato)"
+
+def parse_timestamp(series: pd.Series) -> pd.Series:
+    """Convierte la 'Marca temporal' de Google Forms (dd/mm/aaaa hh:mm:ss) a datetime."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors="coerce", dayfirst=True)
+
+def tenure_band(series: pd.Series) -> pd.Series:
+    """Agrupa antigüedades en texto ('6 meses', '1 a 3 años', 'Más de 5 años') en bandas.
+    Sin la palabra 'mes' el número se interpreta en años.
+    """
+    s = series.astype(str).str.lower()
+    num = pd.to_numeric(s.str.extract(r"(\d+(?:[.,]\d+)?)")[0].str.replace(",", ".", regex=False), errors="coerce")
+    months = num.where(s.str.contains("mes", na=False), num * 12)
+    months = months.where(~s.str.contains("menos", na=False), months - 0.01)
+    bands = pd.cut(months, bins=[-np.inf, 12, 36, 60, np.inf], right=False,
+                   labels=["< 1 año", "1-3 años", "3-5 años", "5+ años"])
+    return bands.astype(object).where(bands.notna(), CUBE_NA)
+
+def _cube_static_dims(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> Dict[str, pd.Series]:
+    dims = {}
+    for key in ("area", "rol"):
+        col = m_active.get(key)
+        dims[key] = (df_active[col].astype(object).where(df_active[col].notna(), CUBE_NA)
+                     if col and col in df_active.columns else pd.Series(CUBE_NA, index=df_active.index))
+    col = m_active.get("antiguedad")
+    dims["antiguedad"] = (tenure_band(df_active[col]) if col and col in df_active.columns
+                          else pd.Series(CUBE_NA, index=df_active.index))
+    return dims
+
+def _cube_timestamps(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> Optional[pd.Series]:
+    col = m_active.get("marca_temporal")
+    return parse_timestamp(df_active[col]) if col and col in df_active.columns else None
+
+def _period_dim(ts: Optional[pd.Series], time_freq: str, index: pd.Index) -> pd.Series:
+    if ts is None:
+        return pd.Series(CUBE_NA, index=index)
+    return ts.dt.to_period(time_freq).astype(str).where(ts.notna(), CUBE_NA)
+
+def _cube_rows(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Valores por fila que suman las celdas del cubo: conteo, suma y suma de cuadrados de
+    intención y drivers, y promotores/detractores de eNPS.
+    Los drivers se guardan en su escala original (y recortados a 0-100) para normalizar al
+    consultar con el máximo global, de modo que lotes pequeños no cambien la escala detectada.
+    """
+    drv_cols = [m_active.get(k) for k in RISK_DRIVER_KEYS]
+    drv_cols = [c for c in drv_cols if c and c in df_active.columns]
+    intent = infer_intent_from_active(df_active, m_active)
+    data = {"n": np.ones(len(df_active)), "intent_sum": intent.to_numpy(dtype=float), "intent_sq": intent.to_numpy(dtype=float) ** 2}
+    maxima = {}
+    for c in drv_cols:
+        raw = map_spanish_likert_to_numeric(df_active[c]).to_numpy(dtype=float)
+        ok = ~np.isnan(raw)
+        clip = np.clip(raw, 0, 100)
+        data[c+"__n"] = ok.astype(float)
+        data[c+"__sum"] = np.where(ok, raw, 0.0)
+        data[c+"__sq"] = np.where(ok, raw ** 2, 0.0)
+        data[c+"__csum"] = np.where(ok, clip, 0.0)
+        data[c+"__csq"] = np.where(ok, clip ** 2, 0.0)
+        maxima[c] = float(np.nanmax(raw)) if ok.any() else np.nan
+    sat = m_active.get("satisfaccion_general")
+    if sat and sat in df_active.columns:
+        # eNPS: % promotores (9-10) - % detractores (0-6) sobre respuestas válidas de 0 a 10
+        score = pd.to_numeric(_as_plain(df_active[sat]), errors="coerce").to_numpy(dtype=float)
+        ok = (score >= 0) & (score <= 10)
+        data["enps_n"] = ok.astype(float)
+        data["enps_prom"] = (ok & (score >= 9)).astype(float)
+        data["enps_det"] = (ok & (score <= 6)).astype(float)
+    return pd.DataFrame(data, index=df_active.index), maxima
+
+def _group_cells(rows: pd.DataFrame, dims: Dict[str, pd.Series]) -> pd.DataFrame:
+    return rows.groupby([dims[d].rename(d) for d in CUBE_DIMS]).sum()
+
+def _cube_cells(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]], time_freq: str) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Agregados aditivos por celda área × cargo × antigüedad × periodo (ver ``_cube_rows``)."""
+    rows, maxima = _cube_rows(df_active, m_active)
+    dims = _cube_static_dims(df_active, m_active)
+    dims["periodo"] = _period_dim(_cube_timestamps(df_active, m_active), time_freq, df_active.index)
+    return _group_cells(rows, dims), maxima
+
+def _new_cube(cells: pd.DataFrame, maxima: Dict[str, float], m_active: Dict[str, Optional[str]], time_freq: str) -> Dict[str, object]:
+    return {
+        "cells": cells,
+        "maxima": maxima,
+        "time_freq": time_freq,
+        "dim_cols": {"area": m_active.get("area"), "rol": m_active.get("rol")},
+        "sat_col": m_active.get("satisfaccion_general"),
+    }
+
+def _merge_cube(cube: Dict[str, object], cells: pd.DataFrame, maxima: Dict[str, float]) -> Dict[str, object]:
+    merged = cube["cells"].add(cells, fill_value=0)
+    old_max = cube["maxima"]
+    cols = list(old_max) + [c for c in maxima if c not in old_max]
+    return {
+        **cube,
+        "cells": merged,
+        "maxima": {c: np.fmax(old_max.get(c, np.nan), maxima.get(c, np.nan)) for c in cols},
+    }
+
+def build_risk_cube(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]], time_freq: str = "M") -> Dict[str, object]:
+    """Precalcula el cubo área × cargo × antigüedad × periodo para el panel de riesgo.
+    Cualquier corte, agregación o umbral se resuelve luego con ``cube_risk`` sin tocar las filas.
+    """
+    cells, maxima = _cube_cells(df_active, m_active, time_freq)
+    return _new_cube(cells, maxima, m_active, time_freq)
+
+def update_risk_cube(cube: Dict[str, object], df_new: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> Dict[str, object]:
+    """Incorpora respuestas nuevas sumando sus agregados al cubo (costo proporcional a ``df_new``).
+    La intención se puntúa con la escala detectada en el lote nuevo.
+    """
+    if df_new is None or len(df_new) == 0:
+        return cube
+    cells, maxima = _cube_cells(df_new, m_active, cube["time_freq"])
+    return _merge_cube(cube, cells, maxima)
+
+def _likert_affine(mx: float) -> Optional[Tuple[float, float]]:
+    """(a, b) tales que normalize_likert(x) = a*x + b para la escala detectada; None si se recorta."""
+    if pd.notna(mx) and mx <= 5:
+        return 25.0, -25.0
+    if pd.notna(mx) and mx <= 10:
+        return 10.0, 0.0
+    return None
+
+def _segment_cells(cube: Dict[str, object], by: Tuple[str, ...], filters: Optional[Dict[str, List[str]]]) -> Tuple[pd.DataFrame, List[str]]:
+    """Celdas del cubo sumadas por las dimensiones ``by`` (sin ``(sin dato)``) tras ``filters``."""
+    cells: pd.DataFrame = cube["cells"]
+    if isinstance(by, str):
+        by = (by,)
+    by = [d for d in by if d in CUBE_DIMS]
+    if cells.empty or not by:
+        return pd.DataFrame(), by
+    keep = np.ones(len(cells), dtype=bool)
+    for d, values in (filters or {}).items():
+        if d in CUBE_DIMS and values:
+            keep &= cells.index.get_level_values(d).isin(values)
+    for d in by:
+        keep &= cells.index.get_level_values(d) != CUBE_NA
+    sub = cells[keep]
+    if sub.empty:
+        return pd.DataFrame(), by
+    return sub.groupby(level=by).sum(), by
+
+def _cell_metrics(g: pd.DataFrame, cube: Dict[str, object]) -> pd.DataFrame:
+    """Intención media, n y promedio normalizado de cada driver a partir de sumas por celda."""
+    agg = pd.DataFrame(index=g.index)
+    agg["intent_media"] = g["intent_sum"] / g["n"]
+    agg["n"] = g["n"].astype(int)
+    for c, mx in cube["maxima"].items():
+        if c+"__n" not in g.columns:
+            continue
+        cnt = g[c+"__n"].where(g[c+"__n"] > 0)
+        ab = _likert_affine(mx)
+        agg[c+"_avg"] = (ab[0] * g[c+"__sum"] / cnt + ab[1]) if ab else g[c+"__csum"] / cnt
+    return agg
+
+def cube_risk(cube: Dict[str, object], by: Tuple[str, ...] = ("area",), filters: Optional[Dict[str, List[str]]] = None,
+              min_responses: int = 1) -> pd.DataFrame:
+    """Riesgo por segmento calculado desde el cubo (mismo formato que ``area_risk``).
+    ``by`` son dimensiones de ``CUBE_DIMS``; ``filters`` restringe valores por dimensión.
+    """
+    g, by = _segment_cells(cube, by, filters)
+    if g.empty:
+        return pd.DataFrame()
+    names = {d: (cube["dim_cols"].get(d) or d) for d in by}
+    agg = _cell_metrics(g, cube).rename_axis([names[d] for d in by]).reset_index()
+    agg = agg[agg["n"] >= min_responses]
+    return _risk_score(agg, cube["sat_col"])
+
+# ------ TENDENCIAS ------
+
+TREND_FREQS = ("W", "M")   # semanal y mensual
+
+def build_trends(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]], freqs: Tuple[str, ...] = TREND_FREQS) -> Dict[str, object]:
+    """Un cubo de riesgo por granularidad de tiempo (ver ``build_risk_cube``).
+    La marca temporal se parsea y las filas se puntúan una sola vez para todas las
+    granularidades; sólo cambia la agrupación por periodo.
+    """
+    rows, maxima = _cube_rows(df_active, m_active)
+    dims = _cube_static_dims(df_active, m_active)
+    ts = _cube_timestamps(df_active, m_active)
+    cubes = {}
+    for freq in freqs:
+        cells = _group_cells(rows, {**dims, "periodo": _period_dim(ts, freq, df_active.index)})
+        cubes[freq] = _new_cube(cells, maxima, m_active, freq)
+    return {"cubes": cubes, "rows": len(df_active), "added": len(df_active),
+            "has_time": ts is not None and bool(ts.notna().any())}
+
+def update_trends(trends: Dict[str, object], df_new: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> Dict[str, object]:
+    """Suma las respuestas nuevas a todos los cubos de ``trends`` (costo proporcional a ``df_new``,
+    sin volver a recorrer el histórico). Devuelve un dict nuevo; ``trends`` no se modifica."""
+    if df_new is None or len(df_new) == 0:
+        return trends
+    rows, maxima = _cube_rows(df_new, m_active)
+    dims = _cube_static_dims(df_new, m_active)
+    ts = _cube_timestamps(df_new, m_active)
+    cubes = {}
+    for freq, cube in trends["cubes"].items():
+        cells = _group_cells(rows, {**dims, "periodo": _period_dim(ts, freq, df_new.index)})
+        cubes[freq] = _merge_cube(cube, cells, maxima)
+    return {"cubes": cubes, "rows": trends["rows"] + len(df_new), "added": len(df_new),
+            "has_time": trends["has_time"] or (ts is not None and bool(ts.notna().any()))}
+
+def cube_trend(cube: Dict[str, object], by: Tuple[str, ...] = ("area",), filters: Optional[Dict[str, List[str]]] = None,
+               window: int = 1, min_responses: int = 1) -> pd.DataFrame:
+    """Serie por periodo (y por segmento de ``by``) servida desde el cubo, sin tocar filas.
+
+    Columnas: periodo, segmento(s), n, intent_media, intent_sd, enps y el promedio de cada
+    driver. Con ``window > 1`` cada periodo acumula los ``window`` últimos (ventana móvil
+    sobre periodos calendario: los periodos sin respuestas cuentan como vacíos).
+    """
+    if isinstance(by, str):
+        by = (by,)
+    g, dims = _segment_cells(cube, ("periodo",) + tuple(d for d in by if d != "periodo"), filters)
+    if g.empty:
+        return pd.DataFrame()
+    seg = dims[1:]
+    g = g.reset_index()
+    periods = pd.PeriodIndex(g["periodo"], freq=cube["time_freq"])
+    full = pd.period_range(periods.min(), periods.max(), freq=cube["time_freq"])
+    g["periodo"] = periods
+    if seg:
+        idx = pd.MultiIndex.from_product([full] + [sorted(g[d].unique(), key=str) for d in seg], names=["periodo"] + seg)
+    else:
+        idx = pd.Index(full, name="periodo")
+    g = g.set_index(["periodo"] + seg).reindex(idx, fill_value=0)
+    if window > 1:
+        g = (g.groupby(level=seg, sort=False).rolling(window, min_periods=1).sum().droplevel(list(range(len(seg))))
+             if seg else g.rolling(window, min_periods=1).sum()).reindex(idx)
+    g = g[g["n"] >= max(min_responses, 1)]
+    if g.empty:
+        return pd.DataFrame()
+
+    agg = _cell_metrics(g, cube)
+    mean = agg["intent_media"]
+    var = (g["intent_sq"] / g["n"] - mean ** 2).clip(lower=0) * g["n"] / (g["n"] - 1).where(g["n"] > 1)
+    agg.insert(1, "intent_sd", np.sqrt(var))
+    if "enps_n" in g.columns:
+        answered = g["enps_n"].where(g["enps_n"] > 0)
+        agg.insert(3, "enps", (100 * (g["enps_prom"] - g["enps_det"]) / answered).round(1))
+    names = {d: (cube["dim_cols"].get(d) or d) for d in seg}
+    agg = agg.rename_axis(["periodo"] + [names[d] for d in seg]).reset_index()
+    agg["periodo"] = agg["periodo"].astype(str)
+    return agg.sort_values(["periodo"] + [names[d] for d in seg]).reset_index(drop=True)
+
+# ------ FRASES FRECUENTES (COUNT-MIN SKETCH) ------
+
+PHRASE_MAX_N = 3            # uni-, bi- y trigramas
+SKETCH_WIDTH = 1 << 16      # contadores por fila del sketch
+SKETCH_DEPTH = 4            # filas (funciones hash independientes)
+PHRASE_CANDIDATES = 2000    # frases candidatas retenidas en total
+PHRASE_AREA_CANDIDATES = 100  # y por área
+PHRASE_BATCH = 20_000       # filas por lote al recorrer cada columna
+
+def new_sketch(width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH) -> Dict[str, object]:
+    """Count-Min Sketch: ``depth`` filas de ``width`` contadores. Nunca subestima; con
+    probabilidad 1 - e^-depth sobreestima en a lo sumo e/width del total agregado."""
+    return {"table": np.zeros((depth, width), dtype=np.int64), "total": 0,
+            "keys": [f"cms{i:013d}" for i in range(depth)]}
+
+def _sketch_cells(sketch: Dict[str, object], keys: np.ndarray) -> List[np.ndarray]:
+    width = sketch["table"].shape[1]
+    return [(pd.util.hash_array(keys, hash_key=k, categorize=False) % width).astype(np.int64) for k in sketch["keys"]]
+
+def sketch_add(sketch: Dict[str, object], keys: np.ndarray, counts: np.ndarray):
+    width = sketch["table"].shape[1]
+    for row, cells in enumerate(_sketch_cells(sketch, keys)):
+        sketch["table"][row] += np.bincount(cells, weights=counts, minlength=width).astype(np.int64)
+    sketch["total"] += int(counts.sum())
+
+def sketch_query(sketch: Dict[str, object], keys: np.ndarray) -> np.ndarray:
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.min([sketch["table"][row][cells] for row, cells in enumerate(_sketch_cells(sketch, keys))], axis=0)
+
+def sketch_error(sketch: Dict[str, object]) -> int:
+    """Sobreestimación máxima (con probabilidad 1 - e^-depth) de cualquier conteo."""
+    return int(np.ceil(np.e * sketch["total"] / sketch["table"].shape[1]))
+
+@lru_cache(maxsize=50_000)
+def _phrases_of(text: str, max_n: int = PHRASE_MAX_N) -> Tuple[str, ...]:
+    """N-gramas de 1..``max_n`` palabras de ``text`` tras ``tokenize``, sin stopwords ni números."""
+    words = [w for w in tokenize(text)
+             if len(w) > 1 and not w.isdigit() and w.translate(_ACCENTS) not in SPANISH_STOPWORDS]
+    return tuple(" ".join(words[i:i + n]) for n in range(1, max_n + 1) for i in range(len(words) - n + 1))
+
+def _heavy_hitters(candidates: pd.Series, sketch: Dict[str, object], new_keys: np.ndarray, capacity: int,
+                   by_area: bool = False) -> pd.Series:
+    """Candidatas con mayor conteo estimado: las retenidas más las del lote, re-estimadas en
+    el sketch y recortadas a ``capacity`` (por área si las claves son ``área\x1ffrase``)."""
+    keys = pd.Index(candidates.index).append(pd.Index(new_keys)).unique()
+    est = pd.Series(sketch_query(sketch, keys.to_numpy(dtype=object)), index=keys)
+    if not by_area:
+        return est.nlargest(capacity)
+    groups = pd.Series(keys.str.split("\x1f", n=1).str[0], index=keys)
+    return est.groupby(groups, sort=False).nlargest(capacity).droplevel(0)
+
+def _comment_columns(frames: Dict[str, pd.DataFrame], mappings: Dict[str, Dict[str, Optional[str]]]):
+    # (encuesta, texto, área) por columna de comentarios; el área vale None si la encuesta no la tiene
+    for survey, keys in COMMENT_KEYS.items():
+        df, m = frames.get(survey), mappings.get(survey, {})
+        if df is None:
+            continue
+        a_col = m.get("area")
+        area = _as_plain(df[a_col]).astype(object) if a_col and a_col in df.columns else None
+        for key in keys:
+            col = m.get(key)
+            if col and col in df.columns:
+                yield survey, _as_plain(df[col]), area
+
+def _category_of(phrase: str) -> Optional[str]:
+    # Misma regla que ``bucketize_reason``: la palabra clave aparece dentro de algún token
+    for k, words in KEYWORDS_BUCKETS.items():
+        if any(w in t for t in phrase.split() for w in words):
+            return k
+    return None
+
+def _absorb(top: pd.Series, ratio: float = 0.9) -> pd.Series:
+    """Quita frases contenidas en otra más larga de la lista con al menos ``ratio`` de su conteo
+    ("mejor" cuando casi siempre aparece como "mejor salario")."""
+    keep = []
+    for phrase, cnt in top.items():
+        inner = f" {phrase} "
+        if not any(len(other) > len(phrase) and inner in f" {other} " and other_cnt >= ratio * cnt
+                   for other, other_cnt in top.items()):
+            keep.append(phrase)
+    return top[keep]
+
+def mine_phrases(frames: Dict[str, pd.DataFrame], mappings: Dict[str, Dict[str, Optional[str]]], top: int = 30,
+                 top_per_area: int = 10, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 batch: int = PHRASE_BATCH, weights: Optional[Dict[str, float]] = None) -> Dict[str, object]:
+    """Frases más repetidas en los comentarios (``COMMENT_KEYS``) en general y por área.
+
+    Recorre cada columna una vez, en lotes: cuenta uni/bi/trigramas en dos Count-Min Sketch
+    (frase y área + frase) y retiene sólo las candidatas con mayor conteo estimado, así la
+    memoria no crece con el corpus. ``emergente`` marca frases que no caen en ninguna
+    categoría de ``KEYWORDS_BUCKETS`` (temas que el conteo por palabras clave no ve).
+    ``weights`` expande los conteos de una encuesta muestreada (``{"activos": N/n}``).
+    Devuelve ``{"global", "por_area", "sketch"}``.
+    """
+    overall, by_area = new_sketch(width, depth), new_sketch(width, depth)
+    cand = pd.Series(dtype=np.int64)
+    cand_area = pd.Series(dtype=np.int64)
+    area_ngrams: Dict[str, int] = {}   # n-gramas por área (exacto: una entrada por área)
+    for survey, texts, area in _comment_columns(frames, mappings):
+        weight = (weights or {}).get(survey, 1.0)
+        for start in range(0, len(texts), batch):
+            chunk = pd.DataFrame({"texto": texts.iloc[start:start + batch].to_numpy(),
+                                  "area": area.iloc[start:start + batch].to_numpy() if area is not None else None})
+            chunk = chunk[chunk["texto"].notna()].astype({"texto": str})
+            if chunk.empty:
+                continue
+            # Textos repetidos (frecuentes en encuestas) se tokenizan una vez por lote
+            pairs = chunk.value_counts(dropna=False)
+            if weight != 1.0:
+                pairs = (pairs * weight).round().astype(np.int64)
+            phrases, areas, counts = [], [], []
+            for (text, a), cnt in pairs.items():
+                grams = _phrases_of(text)
+                phrases.extend(grams)
+                areas.extend([a] * len(grams))
+                counts.extend([cnt] * len(grams))
+            if not phrases:
+                continue
+            grams = pd.DataFrame({"frase": phrases, "area": areas, "n": counts})
+            g = grams.groupby("frase", sort=False)["n"].sum()
+            sketch_add(overall, g.index.to_numpy(dtype=object), g.to_numpy(dtype=float))
+            cand = _heavy_hitters(cand, overall, g.index.to_numpy(dtype=object), PHRASE_CANDIDATES)
+            ga = grams[grams["area"].notna()]
+            if len(ga):
+                for a, n in ga.groupby(ga["area"].astype(str))["n"].sum().items():
+                    area_ngrams[a] = area_ngrams.get(a, 0) + int(n)
+                ga = ga.groupby(ga["area"].astype(str) + "\x1f" + ga["frase"], sort=False)["n"].sum()
+                sketch_add(by_area, ga.index.to_numpy(dtype=object), ga.to_numpy(dtype=float))
+                cand_area = _heavy_hitters(cand_area, by_area, ga.index.to_numpy(dtype=object),
+                                           PHRASE_AREA_CANDIDATES, by_area=True)
+
+    info = {"ancho": width, "profundidad": depth, "ngramas": overall["total"], "error_max": sketch_error(overall),
+            "bytes": overall["table"].nbytes + by_area["table"].nbytes}
+    glob = _absorb(cand.sort_values(ascending=False).head(top * 3)).head(top)
+    out_global = pd.DataFrame({"frase": glob.index, "menciones": glob.to_numpy(dtype=np.int64)})
+    out_global["palabras"] = out_global["frase"].str.count(" ") + 1
+    out_global["categoria"] = out_global["frase"].map(_category_of)
+    out_global["emergente"] = out_global["categoria"].isna()
+
+    rows = []
+    if len(cand_area):
+        split = cand_area.index.str.split("\x1f", n=1)
+        per = pd.DataFrame({"area": split.str[0], "frase": split.str[1], "menciones": cand_area.to_numpy(dtype=np.int64)})
+        for a, sub in per.groupby("area", sort=True):
+            best = _absorb(sub.set_index("frase")["menciones"].sort_values(ascending=False).head(top_per_area * 3))
+            best = best.head(top_per_area)
+            # lift: peso de la frase en el área frente a su peso general (>1 = más propia del área)
+            general = sketch_query(overall, best.index.to_numpy(dtype=object)) / max(overall["total"], 1)
+            lift = (best.to_numpy() / max(area_ngrams.get(a, 0), 1)) / np.where(general > 0, general, np.nan)
+            rows.extend({"area": a, "frase": phrase, "menciones": int(cnt), "lift": round(float(lf), 2)}
+                        for (phrase, cnt), lf in zip(best.items(), lift))
+    out_area = pd.DataFrame(rows, columns=["area", "frase", "menciones", "lift"])
+    out_area["categoria"] = out_area["frase"].map(_category_of)
+    out_area["emergente"] = out_area["categoria"].isna()
+    return {"global": out_global, "por_area": out_area, "sketch": info}
+
+# --------- HR DASHBOARD -------
+
+def to_bool(s: pd.Series) -> pd.Series:
+    x = s.astype(str).str.strip().str.lower()
+    yes_like = x.isin(["sí", "si", "yes", "true"]) | x.str.contains(r"de acuerdo|aplica|cumple|si\b|sí\b", na=False)
+    no_like = x.isin(["no", "false"]) | x.str.contains(r"no aplica|no cumple|en desacuerdo", na=False)
+    out = pd.Series(np.nan, index=x.index, dtype="float")
+    out[yes_like] = 1.0
+    out[no_like] = 0.0
+    # fallback numérico
+    num = pd.to_numeric(x.str.replace(",", ".", regex=False), errors="coerce")
+    out = out.fillna(num.where(num.isna(), (num >= 1).astype(float)))
+    return out
+
+def _answer_codes(df: pd.DataFrame, cols: List[str]) -> Tuple[np.ndarray, pd.Series]:
+    """Codifica ``cols`` contra una tabla común de respuestas distintas (como texto).
+    Devuelve la matriz de códigos (filas × columnas, -1 = vacío) y la tabla: cada
+    respuesta distinta se interpreta una sola vez, sin importar en cuántas filas o
+    columnas aparezca."""
+    parts, uniques = [], []
+    for c in cols:
+        codes, uniq = pd.factorize(df[c])
+        parts.append(codes)
+        uniques.append(pd.Index(uniq).astype(str))
+    if not cols:
+        return np.empty((len(df), 0), dtype=np.int32), pd.Series(dtype=object)
+    shared, answers = pd.factorize(np.concatenate([u.to_numpy(dtype=object) for u in uniques]))
+    offsets = np.cumsum([0] + [len(u) for u in uniques])
+    matrix = np.empty((len(df), len(cols)), dtype=np.int32)
+    for j, codes in enumerate(parts):
+        remap = shared[offsets[j]:offsets[j + 1]]
+        matrix[:, j] = np.where(codes >= 0, remap[np.maximum(codes, 0)] if len(remap) else -1, -1)
+    return matrix, pd.Series(answers, dtype=object)
+
+def _decode(matrix: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # El código -1 (vacío) cae en el NaN agregado al final de la tabla
+    return np.append(values.astype(float), np.nan)[matrix]
+
+def hr_dashboard(df_hr: pd.DataFrame, m_hr: Dict[str, Optional[str]]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, str]:
+    # KPIs, causas y prácticas: una sola codificación de todas las columnas mapeadas
+    kpi_keys = ["headcount", "rotacion_6m", "hr_headcount", "vacantes_mes"]
+    causas_keys = [
+        ("causa_compensacion", "Compensación"),
+        ("causa_jefes", "Jefes/Liderazgo"),
+        ("causa_sobrecarga", "Sobrecarga"),
+        ("causa_proyeccion", "Falta de proyección"),
+        ("causa_modalidad", "Modalidad trabajo"),
+    ]
+    pract_keys = [
+        ("indicadores_rotacion", "Indicadores de rotación"),
+        ("medimos_tiempo_cobertura", "Medimos tiempo de cobertura"),
+        ("medimos_costo_reemplazo", "Medimos costo de reemplazo"),
+        ("plan_retencion", "Plan de retención"),
+        ("movilidad_interna", "Movilidad interna"),
+        ("revision_salarial_anual", "Revisión salarial anual"),
+        ("flexibilidad_laboral", "Flexibilidad laboral"),
+        ("encuestas_clima", "Encuestas de clima"),
+        ("usa_analitica", "Analítica de rotación"),
+        ("sponsorship_alta_direccion", "Sponsorship Alta Dirección"),
+        ("eff_ajuste_salarios", "Efectivo: ajuste salarios"),
+        ("eff_liderazgo", "Efectivo: liderazgo"),
+        ("eff_bienestar", "Efectivo: bienestar/SM"),
+        ("eff_reconocimiento", "Efectivo: reconocimiento"),
+        ("eff_capacitacion", "Efectivo: capacitación/carrera"),
+    ]
+    def _mapped(keys):
+        return [(k, m_hr.get(k)) for k in keys if m_hr.get(k) and m_hr.get(k) in df_hr.columns]
+
+    kpi_cols = _mapped(kpi_keys)
+    bool_cols = _mapped([k for k, _ in causas_keys + pract_keys])
+    cols = list(dict.fromkeys(c for _, c in kpi_cols + bool_cols))
+    matrix, answers = _answer_codes(df_hr, cols)
+    pos = {c: j for j, c in enumerate(cols)}
+
+    # KPIs simples
+    numbers = _decode(matrix, pd.to_numeric(answers.str.replace(",", ".", regex=False), errors="coerce").to_numpy())
+    kpi_val = {}
+    for key, col in kpi_cols:
+        v = numbers[:, pos[col]]
+        kpi_val[key] = pd.Series(v[~np.isnan(v)]).mean()
+    hc = kpi_val.get("headcount", np.nan)
+    rot = kpi_val.get("rotacion_6m", np.nan)
+    hr_hc = kpi_val.get("hr_headcount", np.nan)
+    vac = kpi_val.get("vacantes_mes", np.nan)
+    ratio_hr = (hr_hc / hc * 100) if (pd.notna(hr_hc) and pd.notna(hc) and hc > 0) else np.nan
+
+    kpis = []
+    kpis.append({"indicador": "Headcount", "valor": hc})
+    kpis.append({"indicador": "Rotación 6m (%)", "valor": rot})
+    kpis.append({"indicador": "Headcount HR", "valor": hr_hc})
+    kpis.append({"indicador": "Vacantes/mes", "valor": vac})
+    kpis.append({"indicador": "% HR sobre total", "valor": ratio_hr})
+    kpis_df = pd.DataFrame(kpis)
+
+    # % sí/acuerdo por columna, reducido de una vez (respuestas 0/1: la suma es exacta)
+    flags = _decode(matrix, to_bool(answers).to_numpy())
+    answered = (~np.isnan(flags)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.nansum(flags, axis=0) / answered
+    bool_val = {key: share[pos[col]] for key, col in bool_cols}
+
+    # Causas según HR
+    causas_rows = []
+    for key, label in causas_keys:
+        if key in bool_val:
+            val = bool_val[key]
+            causas_rows.append({"causa": label, "% acuerdo": round(val*100, 1) if pd.notna(val) else np.nan})
+    causas_df = pd.DataFrame(causas_rows).sort_values("% acuerdo", ascending=False) if causas_rows else pd.DataFrame()
+
+    pract_rows = []
+    for key, label in pract_keys:
+        if key in bool_val:
+            val = bool_val[key]
+            pract_rows.append({"práctica": label, "% sí/efectivo": round(val*100, 1) if pd.notna(val) else np.nan})
+    pract_df = pd.DataFrame(pract_rows).sort_values("% sí/efectivo", ascending=False) if pract_rows else pd.DataFrame()
+
+    # Campos de texto
+    perfiles = m_hr.get("perfiles_dificiles")
+    acciones = m_hr.get("acciones_6m")
+    text_concat = []
+    if perfiles and perfiles in df_hr.columns:
+        text_concat += ["Perfiles difíciles: " + "; ".join(df_hr[perfiles].dropna().astype(str).tolist())]
+    if acciones and acciones in df_hr.columns:
+        text_concat += ["Acciones 6m sugeridas: " + "; ".join(df_hr[acciones].dropna().astype(str).tolist())]
+    text_blob = " | ".join(text_concat)
+
+    return kpis_df, causas_df, pract_df, text_blob
+
+# --------- PIPELINE -----------
+
+ACTIVE_TEXT_KEYS = ["razon_calificacion", "razones_posible_salida", "cambio_para_quedarte", "comentario_adicional"]
+LEAVER_TEXT_KEYS = ["otros_factores", "mejoras_retencion", "sugerencia_final"]
+# Campos de texto libre por encuesta (comentarios)
+COMMENT_KEYS = {
+    "activos": ACTIVE_TEXT_KEYS,
+    "egresos": ["motivo_salida"] + LEAVER_TEXT_KEYS,
+    "hr": ["perfiles_dificiles", "factores_desajuste", "acciones_6m"],
+}
+
+def prepare_reason_texts(df_active: pd.DataFrame, df_leaver: pd.DataFrame, m_active: Dict[str, Optional[str]],
+                         m_leaver: Dict[str, Optional[str]]):
+    """Consolida los campos de texto libre en una columna por encuesta.
+    Devuelve copias (frames y mapeos) con ``razones_texto``/``comentarios`` apuntando a ellas.
+    """
+    m_active, m_leaver = dict(m_active), dict(m_leaver)
+
+    def _concat(df: pd.DataFrame, cols: List[str]) -> pd.Series:
+        out = _as_plain(df[cols[0]]).astype(str)
+        for c in cols[1:]:
+            out = out + " | " + _as_plain(df[c]).astype(str)
+        return out
+
+    active_text_cols = [m_active.get(k) for k in ACTIVE_TEXT_KEYS]
+    active_text_cols = [c for c in active_text_cols if c and c in df_active.columns]
+    if active_text_cols:
+        df_active = df_active.assign(__reasons_text_activos=_concat(df_active, active_text_cols))
+        m_active["razones_texto"] = "__reasons_text_activos"
+
+    leaver_text_cols = [m_leaver.get(k) for k in LEAVER_TEXT_KEYS]
+    leaver_text_cols = [c for c in leaver_text_cols if c and c in df_leaver.columns]
+    if leaver_text_cols:
+        df_leaver = df_leaver.assign(__reasons_text_egresos=_concat(df_leaver, leaver_text_cols))
+        m_leaver["comentarios"] = "__reasons_text_egresos"
+    return df_active, df_leaver, m_active, m_leaver
+
+def analytics_key(frames: List[pd.DataFrame], mappings: List[Dict[str, Optional[str]]], **params) -> str:
+    """Clave de caché del diagnóstico: huellas de los frames, mapeos de columnas y parámetros."""
+    h = hashlib.sha1()
+    for df in frames:
+        h.update(frame_fingerprint(df).encode("utf-8"))
+    h.update(json.dumps([mappings, params], sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+def run_pipeline(df_active: pd.DataFrame, df_leaver: pd.DataFrame, df_hr: pd.DataFrame, min_responses: int = 10,
+                 bootstrap: int = 0, kda_method: str = "relative_weights", time_budget_s: Optional[float] = None,
+                 n_jobs: int = 1, trends_base: Optional[Tuple[Dict[str, object], int]] = None,
+                 active_weight: float = 1.0, profile: Optional[Dict[str, object]] = None) -> Dict[str, object]:
+    """Ejecuta todo el diagnóstico sobre las tres encuestas.
+    Un error en una etapa no detiene las demás: queda en ``errores`` y la tabla sale vacía.
+    ``trends_base = (tendencias, filas)`` reutiliza tendencias ya calculadas sobre las
+    primeras ``filas`` de ``df_active`` y sólo agrega las restantes. ``active_weight`` expande
+    los conteos de texto de activos en motivos y frases (ver ``run_pipeline_approx``).
+    Con ``profile`` (ver ``profiling``) registra tiempo, filas y memoria de cada etapa.
+    """
+    n_rows = len(df_active) + len(df_leaver) + len(df_hr)
+    with profile_stage(profile, "map_cols", rows=n_rows):
+        m_active, fz_active = map_cols_report(df_active, ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
+        m_leaver, fz_leaver = map_cols_report(df_leaver, LEAVER_REQUIRED, LEAVER_OPTIONAL)
+        m_hr, fz_hr = map_cols_report(df_hr, HR_REQUIRED, HR_OPTIONAL)
+    with profile_stage(profile, "textos", rows=len(df_active) + len(df_leaver)):
+        df_active, df_leaver, m_active, m_leaver = prepare_reason_texts(df_active, df_leaver, m_active, m_leaver)
+
+    res: Dict[str, object] = {
+        "m_active": m_active,
+        "m_leaver": m_leaver,
+        "m_hr": m_hr,
+        "fuzzy": {"activos": fz_active, "egresos": fz_leaver, "hr": fz_hr},
+        "filas": {"activos": len(df_active), "egresos": len(df_leaver), "hr": len(df_hr)},
+        "errores": {},
+    }
+
+    def _stage(name: str, label: str, fn, empty=None, rows: Optional[int] = None):
+        with profile_stage(profile, name, rows=len(df_active) if rows is None else rows):
+            try:
+                res[name] = fn()
+            except Exception as e:
+                res["errores"][name] = f"Error {label}: {e}"
+                res[name] = pd.DataFrame() if empty is None else empty
+
+    # Normalización Likert e intención una sola vez para correlaciones, KDA y segmentos
+    with profile_stage(profile, "likert", rows=len(df_active)):
+        try:
+            drivers, intent = driver_matrix(df_active, m_active), infer_intent_from_active(df_active, m_active)
+        except Exception:
+            drivers = intent = None   # cada etapa la recalcula y reporta su propio error
+
+    _stage("corr", "calculando correlaciones", lambda: correlate_with_intent(
+        df_active, m_active, bootstrap=bootstrap, time_budget_s=time_budget_s, n_jobs=n_jobs,
+        drivers=drivers, intent=intent))
+    _stage("kda", "calculando importancia relativa", lambda: key_driver_analysis(
+        df_active, m_active, method=kda_method, drivers=drivers, intent=intent))
+    _stage("reasons", "procesando razones de salida", lambda: summarize_reasons(df_active, df_leaver, m_active, m_leaver, active_weight),
+           rows=len(df_active) + len(df_leaver))
+    if trends_base is not None:
+        # Respuestas agregadas al final del formulario: sólo se suman las filas nuevas
+        base, covered = trends_base
+        _stage("trends", "actualizando tendencias", lambda: update_trends(base, df_active.iloc[covered:], m_active), empty={},
+               rows=len(df_active) - covered)
+    else:
+        _stage("trends", "calculando riesgo por área y tendencias", lambda: build_trends(df_active, m_active), empty={})
+    res["risk_cube"] = res["trends"].get("cubes", {}).get("M", {}) if res["trends"] else {}
+    _stage("risk", "calculando riesgo por área", lambda: cube_risk(res["risk_cube"], by=("area",), min_responses=min_responses)
+           if res["risk_cube"] else pd.DataFrame())
+    _stage("segments", "calculando correlaciones por segmento", lambda: correlate_by_segment(
+        df_active, m_active, by=("area",), min_responses=min_responses, drivers=drivers, intent=intent))
+    _stage("phrases", "buscando frases frecuentes", lambda: mine_phrases(
+        {"activos": df_active, "egresos": df_leaver, "hr": df_hr},
+        {"activos": m_active, "egresos": m_leaver, "hr": m_hr}, weights={"activos": active_weight}), empty={}, rows=n_rows)
+    _stage("hr", "en panel HR", lambda: hr_dashboard(df_hr, m_hr),
+           empty=(pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), ""), rows=len(df_hr))
+    return res
+
+# ------ MODO APROXIMADO (MUESTREO ESTRATIFICADO) ------
+
+APPROX_Z = 1.959964   # cuantil normal del nivel de confianza de 95 %
+
+def stratified_sample(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]], n: int,
+                      min_per_stratum: int = 30, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Muestra de ~``n`` filas estratificada por área (sin dato = un estrato más).
+    Asignación proporcional con al menos ``min_per_stratum`` filas por área (o el área
+    completa si es más chica); con ``min_per_stratum=0`` es proporcional pura. Con la
+    misma semilla, una muestra más grande (o con piso) contiene a la más chica. Devuelve
+    (muestra en el orden original, ``N``/``n`` por estrato).
+    """
+    a_col = m_active.get("area")
+    if a_col and a_col in df_active.columns:
+        strata = _as_plain(df_active[a_col]).astype(object)
+        strata = strata.where(strata.notna(), CUBE_NA)
+    else:
+        strata = pd.Series(CUBE_NA, index=df_active.index)
+    codes, labels = pd.factorize(strata)
+    N = np.bincount(codes, minlength=len(labels))
+    share = np.round(N * n / max(len(df_active), 1)).astype(np.int64)
+    alloc = np.minimum(N, np.maximum(share, min_per_stratum))
+
+    # En cada estrato se toman las filas con las claves aleatorias más bajas
+    keys = np.random.default_rng(seed).random(len(df_active))
+    order = np.lexsort((keys, codes))
+    rank = np.empty(len(df_active), dtype=np.int64)
+    rank[order] = np.arange(len(df_active)) - np.repeat(np.cumsum(N) - N, N)
+    sample = df_active[rank < alloc[codes]]
+    return sample, pd.DataFrame({"N": N, "n": alloc}, index=pd.Index(labels, name="estrato"))
+
+def _corr_bounds(corr: pd.DataFrame, X: pd.DataFrame, y: pd.Series, fpc: float, z: float = APPROX_Z) -> pd.DataFrame:
+    """IC normal de cada correlación con error estándar por método delta no paramétrico
+    (función de influencia de Pearson, válida para escalas Likert no normales) y
+    corrección por población finita."""
+    yv = y.to_numpy(dtype=float)
+    se = {}
+    for d in corr.index:
+        x = X[d].to_numpy(dtype=float)
+        ok = ~np.isnan(x) & ~np.isnan(yv)
+        if ok.sum() < 4:
+            se[d] = np.nan
+            continue
+        zx, zy = x[ok] - x[ok].mean(), yv[ok] - yv[ok].mean()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            zx, zy = zx / zx.std(), zy / zy.std()
+            r = corr.at[d, "correlacion_intencion"]
+            infl = zx * zy - r / 2 * (zx ** 2 + zy ** 2)
+        se[d] = infl.std(ddof=1) / np.sqrt(ok.sum()) * np.sqrt(fpc)
+    se = pd.Series(se).reindex(corr.index)
+    out = corr.copy()
+    out["ic_inferior"] = (out["correlacion_intencion"] - z * se).clip(lower=-1)
+    out["ic_superior"] = (out["correlacion_intencion"] + z * se).clip(upper=1)
+    out.attrs.update(corr.attrs)
+    return out
+
+def _row_risk(df: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.Series:
+    """Riesgo por respuesta con la fórmula de ``_risk_score`` (su media por área es el riesgo)."""
+    intent = infer_intent_from_active(df, m_active)
+    sat = m_active.get("satisfaccion_general")
+    if sat and sat in df.columns:
+        return 0.5 * intent + 0.5 * (100 - normalize_likert(df[sat])) / 100
+    return intent
+
+def _risk_bounds(risk: pd.DataFrame, sample: pd.DataFrame, m_active: Dict[str, Optional[str]],
+                 strata: pd.DataFrame, z: float = APPROX_Z) -> pd.DataFrame:
+    """Agrega ``riesgo_%_error`` (semiamplitud del IC) y reemplaza ``n`` por las respuestas
+    del área en la población (``n_muestra`` conserva las de la muestra)."""
+    a_col = m_active.get("area")
+    if risk.empty or not a_col or a_col not in risk.columns:
+        return risk
+    r = _row_risk(sample, m_active)
+    g = r.groupby(_as_plain(sample[a_col]), observed=True)
+    n_h = g.count()
+    N_h = strata["N"].reindex(n_h.index).astype(float)
+    se = g.std(ddof=1) / np.sqrt(n_h) * np.sqrt((1 - n_h / N_h).clip(lower=0))
+    out = risk.copy()
+    areas = out[a_col]
+    out["n_muestra"] = out["n"]
+    out["n"] = strata["N"].reindex(areas).fillna(out["n"]).astype(int).to_numpy()
+    out["riesgo_%_error"] = (100 * z * se.reindex(areas)).round(1).to_numpy()
+    return out
+
+def run_pipeline_approx(df_active: pd.DataFrame, df_leaver: pd.DataFrame, df_hr: pd.DataFrame, sample_rows: int = 20_000,
+                        seed: int = 0, min_responses: int = 10, **kwargs) -> Dict[str, object]:
+    """``run_pipeline`` sobre una muestra estratificada por área de ``df_active`` (egresos y HR
+    completos), con cotas de error al 95 %: IC en ``corr`` (si no hubo bootstrap)
+    y ``riesgo_%_error`` en ``risk``. ``res["aproximado"]`` describe la muestra; si
+    ``sample_rows`` cubre todas las filas el resultado es el exacto (sin esa clave).
+
+    Las métricas agregadas (correlaciones, KDA, motivos, tendencias, frases) usan la
+    muestra con asignación proporcional: cada respuesta pesa lo mismo, así que no se
+    sesgan hacia las áreas chicas. El piso de ``min_responses`` por área sólo amplía la
+    muestra del riesgo y las correlaciones por área, que se calculan dentro de cada estrato.
+    """
+    if sample_rows >= len(df_active):
+        return run_pipeline(df_active, df_leaver, df_hr, min_responses=min_responses, **kwargs)
+    m_active = map_cols(df_active, ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
+    profile = kwargs.get("profile")
+    with profile_stage(profile, "muestreo", rows=len(df_active)):
+        # Con la misma semilla la muestra proporcional está contenida en la del piso
+        core, _ = stratified_sample(df_active, m_active, sample_rows, 0, seed)
+        sample, strata = stratified_sample(df_active, m_active, sample_rows, max(30, min_responses), seed)
+    kwargs.pop("trends_base", None)   # las tendencias guardadas son de la población
+    res = run_pipeline(core, df_leaver, df_hr, min_responses=min_responses,
+                       active_weight=len(df_active) / len(core), **kwargs)
+    # Muestra proporcional: el error estándar de muestreo simple con su corrección por
+    # población finita es conservador (la estratificación proporcional no lo aumenta)
+    fpc = 1 - len(core) / len(df_active)
+
+    corr = res["corr"]
+    if isinstance(corr, pd.DataFrame) and len(corr) and "ic_inferior" not in corr.columns:
+        res["corr"] = _corr_bounds(corr, driver_matrix(core, m_active), infer_intent_from_active(core, m_active), fpc)
+        res["corr"].attrs["ic_muestra"] = True
+    if res.get("trends"):
+        res["trends"] = {**res["trends"], "fraccion_muestra": len(core) / len(df_active)}
+
+    # Por área: muestra con piso; dentro de un estrato cada respuesta pesa igual
+    with profile_stage(profile, "por_area", rows=len(sample)):
+        try:
+            risk = cube_risk(build_risk_cube(sample, m_active), by=("area",), min_responses=min_responses)
+            res["risk"] = _risk_bounds(risk, sample, m_active, strata)
+            res["errores"].pop("risk", None)
+        except Exception as e:
+            res["errores"]["risk"] = f"Error calculando riesgo por área: {e}"
+            res["risk"] = pd.DataFrame()
+        try:
+            seg = correlate_by_segment(sample, m_active, by=("area",), min_responses=min_responses)
+            if isinstance(seg, pd.DataFrame) and "n" in seg.columns and seg.index.nlevels == 1:
+                seg = seg.copy()
+                seg["n"] = strata["N"].reindex(seg.index).fillna(seg["n"]).astype(int).to_numpy()
+            res["segments"] = seg
+            res["errores"].pop("segments", None)
+        except Exception as e:
+            res["errores"]["segments"] = f"Error calculando correlaciones por segmento: {e}"
+            res["segments"] = pd.DataFrame()
+
+    res["filas"] = {**res["filas"], "activos": len(df_active)}
+    res["aproximado"] = {
+        "n_muestra": len(sample),
+        "n_proporcional": len(core),
+        "n_total": len(df_active),
+        "fraccion": round(len(sample) / len(df_active), 4),
+        "estratos": len(strata),
+        "semilla": seed,
+        "confianza": 0.95,
+    }
+    return res
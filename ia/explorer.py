@@ -0,0 +1,209 @@
+"""Motor de filtrado, orden y paginación para el explorador de encuestas (sin Streamlit).
+
+Se trabaja sobre posiciones de fila (``np.ndarray`` de enteros) y nunca se copia el
+frame: sólo se materializa la página pedida. Cada columna tiene un índice que se
+construye la primera vez que se usa y queda en ``index["cols"]``:
+
+- ``cat``: códigos de ``pd.factorize`` + posiciones agrupadas por código (estilo CSR);
+  ``eq``/``in``/``contains`` se resuelven sobre los valores distintos, no sobre las filas.
+- ``num`` (números y fechas): valores como float64 y su orden; los rangos se resuelven
+  con ``searchsorted`` sobre el arreglo ordenado.
+
+Predicados: dicts ``{"col": c, "op": "eq"|"in"|"range"|"contains", ...}`` con
+``value`` (eq), ``values`` (in), ``min``/``max`` (range, inclusivos, ``None`` = abierto)
+o ``value``/``case`` (contains). Orden: lista de ``(columna, ascendente)``; los nulos
+van siempre al final.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+def build_index(df: pd.DataFrame) -> Dict[str, object]:
+    """Índice vacío sobre ``df``; los índices por columna se crean bajo demanda."""
+    return {"df": df, "n": len(df), "cols": {}}
+
+def index_bytes(index: Dict[str, object]) -> int:
+    """Bytes de los índices por columna construidos hasta ahora (el frame no cuenta: es de
+    quien lo pasó a ``build_index``)."""
+    total = 0
+    for ci in list(index["cols"].values()):
+        for v in ci.values():
+            if isinstance(v, np.ndarray):
+                total += v.nbytes
+            elif isinstance(v, pd.Index):
+                total += int(v.memory_usage(deep=True))
+    return total
+
+def _is_num(s: pd.Series) -> bool:
+    return (pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)) \
+        or pd.api.types.is_datetime64_any_dtype(s)
+
+def _num_values(s: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        v = s.to_numpy(dtype="datetime64[ns]").astype("int64").astype("float64")
+        v[s.isna().to_numpy()] = np.nan
+        return v
+    return pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+def column_index(index: Dict[str, object], col: str) -> Dict[str, object]:
+    """Índice de ``col`` (lo construye la primera vez)."""
+    ci = index["cols"].get(col)
+    if ci is not None:
+        return ci
+    s = index["df"][col]
+    if _is_num(s):
+        values = _num_values(s)
+        order = np.argsort(values, kind="stable")  # NaN al final
+        n_valid = int((~np.isnan(values)).sum())
+        ci = {"kind": "num", "values": values, "order": order, "sorted": values[order[:n_valid]],
+              "n_valid": n_valid, "datetime": pd.api.types.is_datetime64_any_dtype(s)}
+    else:
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        codes = codes.astype(np.int64)
+        # Filas agrupadas por código; el grupo 0 son los nulos (código -1)
+        order = np.argsort(codes, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(uniques) + 1))])
+        ci = {"kind": "cat", "codes": codes, "uniques": pd.Index(uniques), "order": order, "offsets": offsets}
+    index["cols"][col] = ci
+    return ci
+
+def column_kind(index: Dict[str, object], col: str) -> str:
+    return column_index(index, col)["kind"]
+
+def distinct_values(index: Dict[str, object], col: str) -> List[object]:
+    """Valores distintos de una columna categórica, ordenados como texto."""
+    ci = column_index(index, col)
+    if ci["kind"] != "cat":
+        raise ValueError(f"La columna '{col}' es numérica.")
+    return sorted(ci["uniques"].tolist(), key=str)
+
+def value_range(index: Dict[str, object], col: str) -> Tuple[object, object]:
+    """Mínimo y máximo (sin nulos) de una columna numérica; ``pd.Timestamp`` si es fecha."""
+    ci = column_index(index, col)
+    if ci["kind"] != "num":
+        raise ValueError(f"La columna '{col}' no es numérica.")
+    if not ci["n_valid"]:
+        return None, None
+    lo, hi = float(ci["sorted"][0]), float(ci["sorted"][-1])
+    if ci["datetime"]:
+        return pd.Timestamp(int(lo)), pd.Timestamp(int(hi))
+    return lo, hi
+
+def _cat_rows(ci: Dict[str, object], codes: np.ndarray) -> np.ndarray:
+    off, order = ci["offsets"], ci["order"]
+    parts = [order[off[c + 1]:off[c + 2]] for c in codes]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+def _to_num(v, is_datetime: bool) -> float:
+    if is_datetime:
+        return float(pd.Timestamp(v).value)
+    return float(v)
+
+def _positions(index: Dict[str, object], pred: Dict[str, object]) -> np.ndarray:
+    ci = column_index(index, pred["col"])
+    op = pred["op"]
+    if ci["kind"] == "cat":
+        uniques = ci["uniques"]
+        if op == "eq":
+            codes = np.flatnonzero(uniques.isin([pred["value"]]))
+        elif op == "in":
+            codes = np.flatnonzero(uniques.isin(list(pred["values"])))
+        elif op == "contains":
+            txt = pd.Series(uniques.astype(str))
+            codes = np.flatnonzero(txt.str.contains(str(pred["value"]), case=pred.get("case", False),
+                                                    regex=False, na=False).to_numpy())
+        elif op == "range":
+            nums = pd.to_numeric(pd.Series(uniques), errors="coerce")
+            ok = nums.notna()
+            if pred.get("min") is not None:
+                ok &= nums >= float(pred["min"])
+            if pred.get("max") is not None:
+                ok &= nums <= float(pred["max"])
+            codes = np.flatnonzero(ok.to_numpy())
+        else:
+            raise ValueError(f"Operación no soportada: {op}")
+        return _cat_rows(ci, codes)
+
+    srt, order, is_dt = ci["sorted"], ci["order"], ci["datetime"]
+    if op in ("eq", "in"):
+        vals = [pred["value"]] if op == "eq" else list(pred["values"])
+        parts = []
+        for v in vals:
+            x = _to_num(v, is_dt)
+            lo, hi = np.searchsorted(srt, x, "left"), np.searchsorted(srt, x, "right")
+            parts.append(order[lo:hi])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    if op == "range":
+        lo = 0 if pred.get("min") is None else np.searchsorted(srt, _to_num(pred["min"], is_dt), "left")
+        hi = len(srt) if pred.get("max") is None else np.searchsorted(srt, _to_num(pred["max"], is_dt), "right")
+        return order[lo:hi]
+    if op == "contains":
+        uniq = np.unique(srt)
+        txt = pd.Series(pd.to_datetime(uniq) if is_dt else uniq).astype(str)
+        hits = uniq[txt.str.contains(str(pred["value"]), case=pred.get("case", False), regex=False).to_numpy()]
+        return np.flatnonzero(np.isin(ci["values"], hits))
+    raise ValueError(f"Operación no soportada: {op}")
+
+def filter_positions(index: Dict[str, object], predicates: Sequence[Dict[str, object]] = ()) -> np.ndarray:
+    """Posiciones (ascendentes) de las filas que cumplen todos los predicados."""
+    n = index["n"]
+    if not predicates:
+        return np.arange(n)
+    mask = None
+    for pred in predicates:
+        hit = np.zeros(n, dtype=bool)
+        hit[_positions(index, pred)] = True
+        mask = hit if mask is None else (mask & hit)
+    return np.flatnonzero(mask)
+
+def _rank(index: Dict[str, object], col: str) -> np.ndarray:
+    """Rango denso por fila (empates comparten rango; nulos = -1)."""
+    ci = column_index(index, col)
+    if "rank" not in ci:
+        if ci["kind"] == "cat":
+            uniques = np.asarray(ci["uniques"].tolist(), dtype=object)
+            try:
+                order = np.argsort(uniques, kind="stable")
+            except TypeError:  # tipos mezclados: se ordena como texto
+                order = np.argsort(uniques.astype(str), kind="stable")
+            uniq_rank = np.empty(len(uniques) + 1, dtype=np.int64)
+            uniq_rank[order] = np.arange(len(uniques))
+            uniq_rank[-1] = -1  # código -1 (nulo)
+            rank = uniq_rank[ci["codes"]]
+        else:
+            values = ci["values"]
+            rank = np.full(len(values), -1, dtype=np.int64)
+            valid = ~np.isnan(values)
+            rank[valid] = np.unique(values[valid], return_inverse=True)[1]
+        ci["rank"] = rank
+    return ci["rank"]
+
+def sort_positions(index: Dict[str, object], positions: np.ndarray,
+                   sort: Sequence[Tuple[str, bool]] = ()) -> np.ndarray:
+    """Ordena ``positions`` por varias columnas ``(col, ascendente)``; nulos al final."""
+    if not sort or not len(positions):
+        return positions
+    keys = []
+    for col, ascending in sort:
+        r = _rank(index, col)[positions]
+        top = int(r.max()) + 1
+        key = r if ascending else (top - 1 - r)
+        keys.append(np.where(r < 0, top, key))
+    # lexsort usa la última clave como principal; estable para empates completos
+    return positions[np.lexsort(keys[::-1])]
+
+def query(index: Dict[str, object], predicates: Sequence[Dict[str, object]] = (),
+          sort: Sequence[Tuple[str, bool]] = (), offset: int = 0, limit: int = 50,
+          columns: Optional[Sequence[str]] = None) -> Tuple[pd.DataFrame, int, np.ndarray]:
+    """Filtra, ordena y pagina. Devuelve (página, total de filas que cumplen, posiciones)."""
+    pos = sort_positions(index, filter_positions(index, predicates), sort)
+    return page_rows(index, pos, offset, limit, columns), len(pos), pos
+
+def page_rows(index: Dict[str, object], positions: np.ndarray, offset: int = 0, limit: int = 50,
+              columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Materializa sólo las filas ``positions[offset:offset + limit]``."""
+    offset = max(0, int(offset))
+    page_pos = positions[offset:offset + max(0, int(limit))]
+    page = index["df"].iloc[page_pos]
+    return page if columns is None else page[list(columns)]
@@ -0,0 +1,106 @@
+"""Exportación de tablas por bloques: CSV, CSV gzip, Parquet y XLSX (sin Streamlit).
+
+Cada formato se escribe bloque a bloque sobre un archivo (o buffer), sin construir
+primero el texto completo en memoria como hace ``df.to_csv()``. ``export_file`` escribe
+sobre un temporal que pasa a disco al superar ``EXPORT_SPOOL_BYTES``.
+"""
+import gzip
+import tempfile
+from typing import IO, Dict, Iterator
+
+import numpy as np
+import pandas as pd
+
+EXPORT_CHUNK_ROWS = 50_000
+XLSX_MAX_ROWS = 1_048_575  # límite de Excel menos la fila de encabezado
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+EXPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    "csv": {"label": "CSV", "ext": "csv", "mime": "text/csv"},
+    "csv.gz": {"label": "CSV comprimido (gzip)", "ext": "csv.gz", "mime": "application/gzip"},
+    "parquet": {"label": "Parquet", "ext": "parquet", "mime": "application/vnd.apache.parquet"},
+    "xlsx": {
+        "label": "Excel (XLSX)",
+        "ext": "xlsx",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    },
+}
+
+def iter_row_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Vistas consecutivas de ``chunk_rows`` filas (al menos una, aunque ``df`` esté vacío)."""
+    chunk_rows = max(1, int(chunk_rows))
+    yield df.iloc[:chunk_rows]
+    for start in range(chunk_rows, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def _write_csv(df: pd.DataFrame, fh, chunk_rows: int):
+    for i, chunk in enumerate(iter_row_chunks(df, chunk_rows)):
+        fh.write(chunk.to_csv(index=False, header=(i == 0)).encode("utf-8"))
+
+def _write_parquet(df: pd.DataFrame, fh, chunk_rows: int):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Esquema fijado con el frame completo: un bloque con sólo nulos no cambia los tipos
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fh, schema) as writer:
+        for chunk in iter_row_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def _xlsx_value(v):
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    if v is None or v is pd.NA or v is pd.NaT:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime().replace(tzinfo=None)
+    return v
+
+def _write_xlsx(df: pd.DataFrame, fh, chunk_rows: int):
+    from openpyxl import Workbook
+
+    if len(df) > XLSX_MAX_ROWS:
+        raise ValueError(f"Excel admite hasta {XLSX_MAX_ROWS:,} filas; exporta en CSV o Parquet.")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("datos")
+    ws.append([str(c) for c in df.columns])
+    for chunk in iter_row_chunks(df, chunk_rows):
+        if not len(chunk):
+            continue
+        for row in chunk.astype(object).to_numpy().tolist():
+            ws.append([_xlsx_value(v) for v in row])
+    wb.save(fh)
+
+def write_export(df: pd.DataFrame, fmt: str, fh, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Escribe ``df`` en ``fh`` (binario) con el formato ``fmt`` de ``EXPORT_FORMATS``."""
+    if fmt == "csv":
+        _write_csv(df, fh, chunk_rows)
+    elif fmt == "csv.gz":
+        # mtime fijo: el mismo contenido produce siempre los mismos bytes
+        with gzip.GzipFile(fileobj=fh, mode="wb", mtime=0) as gz:
+            _write_csv(df, gz, chunk_rows)
+    elif fmt == "parquet":
+        _write_parquet(df, fh, chunk_rows)
+    elif fmt == "xlsx":
+        _write_xlsx(df, fh, chunk_rows)
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {fmt}")
+
+def export_file(df: pd.DataFrame, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                spool_bytes: int = EXPORT_SPOOL_BYTES) -> IO[bytes]:
+    """Exporta ``df`` a un temporal (en memoria hasta ``spool_bytes``, luego en disco),
+    rebobinado. Quien llama lo cierra."""
+    fh = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        write_export(df, fmt, fh, chunk_rows)
+        fh.seek(0)
+    except BaseException:
+        fh.close()
+        raise
+    return fh
+
+def export_bytes(df: pd.DataFrame, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> bytes:
+    """Exporta ``df`` a bytes en el formato pedido. Los bloques se acumulan en disco (pasado
+    ``EXPORT_SPOOL_BYTES``), así que en memoria queda una sola copia del archivo."""
+    with export_file(df, fmt, chunk_rows) as fh:
+        return fh.read()
@@ -1,17 +1,51 @@
+import os
+import hashlib
+import html
 import re
-import json
-from typing import Dict, List, Optional, Tuple
-import numpy as np
+import time
+import threading
+from typing import Dict, Optional, Tuple
 import pandas as pd
 import streamlit as st
-import requests
 
-try:
-    from langchain_openai import ChatOpenAI
-    from langchain.schema import SystemMessage, HumanMessage
-except Exception:
-    ChatOpenAI = None
-    SystemMessage = HumanMessage = None
+from engine import (
+    ACTIVE_OPTIONAL,
+    ACTIVE_REQUIRED,
+    CUBE_DIMS,
+    HR_OPTIONAL,
+    HR_REQUIRED,
+    KDA_METHODS,
+    LEAVER_OPTIONAL,
+    LEAVER_REQUIRED,
+    analytics_key,
+    compact_frame,
+    correlate_by_segment,
+    cube_risk,
+    cube_trend,
+    fetch_user_links,
+    frame_fingerprint,
+    map_cols,
+    normalize_gsheet_export_url,
+    read_table,
+    run_pipeline,
+    run_pipeline_approx,
+    slug,
+)
+from exports import EXPORT_FORMATS, export_bytes
+from snapshots import load_or_build
+from tenant_cache import (
+    cache_discard, cache_get, cache_get_or_build, cache_peek, cache_put, cache_resize, cache_stats,
+    estimate_bytes, new_cache,
+)
+from chat import FakeLLM, build_llm_answer, new_stream_metrics, stream_llm_answer
+from answer_cache import DEFAULT_PATH as DEFAULT_ANSWER_CACHE_PATH, answer_cache_stats, open_answer_cache
+from retrieval import build_comment_index, index_bytes, search_comments
+from llm_context import DEFAULT_CONTEXT_TOKENS, build_llm_context
+from profiling import append_jsonl, new_profile, profile_table, stage as profile_stage
+from explorer import (
+    build_index, column_kind, distinct_values, filter_positions, index_bytes as explorer_bytes, page_rows,
+    sort_positions, value_range,
+)
 
 
 # --------- CONFIG ------------
@@ -32,543 +66,223 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# Con IA_FAKE_LLM=1 el chat usa un modelo local de prueba (sin API key ni red)
+FAKE_LLM = os.environ.get("IA_FAKE_LLM", "0") == "1"
+
 OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
+if not OPENAI_API_KEY and not FAKE_LLM:
     st.warning("Configura OPENAI_API_KEY en st.secrets para habilitar el motor experto (opcional).")
 
-llm = None
-if OPENAI_API_KEY and ChatOpenAI is not None:
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.2, openai_api_key=OPENAI_API_KEY)
-
-# ---------- UTILS ------------
-
-def slug(s: str) -> str:
-    s = s.lower()
-    s = re.sub(r"[áàäâ]", "a", s)
-    s = re.sub(r"[éèëê]", "e", s)
-    s = re.sub(r"[íìïî]", "i", s)
-    s = re.sub(r"[óòöô]", "o", s)
-    s = re.sub(r"[úùüû]", "u", s)
-    s = re.sub(r"[^a-z0-9]+", " ", s)
-    return s.strip()
-
-
-# ----- CARGA DESDE URL --------
-
-GSHEET_D_EDIT = re.compile(r"https?://docs\.google\.com/spreadsheets/d/([A-Za-z0-9-_]+)")
-GSHEET_D_E = re.compile(r"https?://docs\.google\.com/spreadsheets/d/e/([A-Za-z0-9-_]+)")
-
-def normalize_gsheet_export_url(url: str, fmt: str = "csv") -> str:
-    """Normaliza enlaces de Google Sheets/Forms a export estable (csv/xlsx)."""
-    u = (url or "").strip()
-    if not u:
-        return u
-
-    # Ya es CSV/XLSX export
-    if u.endswith(".csv") or "output=csv" in u.lower() or "format=xlsx" in u.lower():
-        return re.sub(r"output=[^&#?]+", f"output={fmt}", u)
-
-    # Publicado (d/e/.../pub)
-    m_e = GSHEET_D_E.search(u)
-    if m_e:
-        sep = "&" if "?" in u else "?"
-        return re.sub(r"output=[^&#?]+", f"output={fmt}", u) if "output=" in u else f"{u}{sep}output={fmt}"
-
-    # Enlace de edición (d/<id>)
-    m_d = GSHEET_D_EDIT.search(u)
-    if m_d:
-        sid = m_d.group(1)
-        gid_match = re.search(r"gid=([0-9]+)", u)
-        gid = f"&gid={gid_match.group(1)}" if gid_match else ""
-        return f"https://docs.google.com/spreadsheets/d/{sid}/export?format={fmt}{gid}"
-
-    return u
-
-@st.cache_data(ttl=3600, show_spinner=True)
-def load_table(url: str) -> pd.DataFrame:
-    """Lee CSV/XLSX desde URL (idealmente Google Sheets publicado)."""
-    if not url:
-        raise ValueError("Proporciona una URL pública válida (Google Sheets/Forms publicado).")
-    url_norm = normalize_gsheet_export_url(url, fmt="csv")
-    # CSV por defecto (admite comas decimales)
-    df = pd.read_csv(url_norm)
-    df.columns = df.columns.astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
-    return df
-
-# Encuesta a planta activa (intención y drivers)
-ACTIVE_REQUIRED = {
-    "id": ["Marca temporal", "id", "documento", "employee id", "cédula", "cedula"],
-    "area": ["¿En qué área trabajas?", "area", "área", "departamento"],
-    "rol": ["¿En qué cargo trabajas?", "rol", "cargo", "puesto", "title"],
-    "intencion_salida": ["Estoy pensando en dejar la empresa en los próximos 12 meses."],
-}
-
-ACTIVE_OPTIONAL = {
-    # Señales adicionales de intención
-    "intencion_salida_aux": ["En los últimos 3 meses, ¿has considerado o explorado oportunidades laborales fuera de la empresa?"],
-    "preferencia_quedar": ["Si otra empresa me ofreciera un trabajo similar, preferiría quedarme aquí."],
-
-    # Engagement/NPS
-    "satisfaccion_general": ["En una escala de 0 a 10, ¿Qué probabilidad hay de que recomiendes a un amigo trabajar en esta empresa?" ],
-
-    # Drivers (acuerdos tipo Likert)
-    "autonomia": ["Siento que tengo la autonomía necesaria para tomar decisiones en mi trabajo."],
-    "respeto_inclusion": ["Me siento respetado(a) e incluido(a) en esta organización."],
-    "confianza_liderazgo": ["Confío en la capacidad de liderazgo de quienes dirigen la organización."],
-    "voz_opiniones": ["Mi voz y mis opiniones son escuchadas por la organización."],
-    "comunicacion": ["La comunicación dentro de la organización es clara, transparente y efectiva."],
-    "carga_laboral": ["Mi carga de trabajo es razonable y puedo manejarla sin exceso de estrés."],
-    "desconexion": ["Tengo la posibilidad de desconectarme y descansar fuera del horario laboral."],
-    "claridad_funciones": ["Sé claramente cuáles son mis funciones y lo que se espera de mí."],
-    "herramientas": ["Cuento con las herramientas y recursos necesarios para hacer bien mi trabajo."],
-    "crecimiento": ["Tengo oportunidades reales de crecer y desarrollarme dentro de la empresa."],
-    "feedback": ["En los últimos 3 meses he recibido retroalimentación que me ha ayudado a mejorar."],
-    "jefe_respeto": ["Mi jefe me apoya y me respeta"],
-    "jefe_confia": ["Mi jefe confía en mi y valora mi trabajo"],
-    "reconocimiento": ["En esta empresa se valora y reconoce cuando hago bien mi trabajo."],
-    "compensacion": ["Considero que mi salario es justo frente al mercado laboral colombiano."],
-    "beneficios_adecuados": ["Los beneficios que ofrece la empresa son adecuados."],
-    "seguridad_psico": ["Siento que puedo dar mis ideas y opiniones sin temor a represalias."],
-    "respeto_equipo": ["En mi equipo hay respeto e inclusión para todos."],
-    "confianza_direccion": ["Confío en la dirección que esta tomando la empresa"],
-    "motivacion": ["Me siento motivado/a para dar lo mejor de mi cada día"],
-
-    # Texto libre
-    "razon_calificacion": ["¿Cuál fue la razón principal de tu calificación anterior?"],
-    "razones_posible_salida": ["Si algún día decidieras dejar la empresa, ¿Cuáles serían las principales razones? (Máximo 3)"],
-    "cambio_para_quedarte": ["Si pudieras cambiar una sola cosa en la empresa para quedarte por más tiempo, ¿Qué sería?"],
-    "comentario_adicional": ["¿Quieres dejar algún comentario adicional que nos ayude a mejorar?"],
-}
+@st.cache_resource(show_spinner="Cargando motor experto…")
+def get_llm(api_key: str):
+    """Cliente LLM compartido por el proceso. langchain se importa aquí, en el primer uso
+    del chat, para no pagar su importación en cada arranque ni en cada rerun.
+    """
+    if FAKE_LLM:
+        return FakeLLM()
+    try:
+        from langchain_openai import ChatOpenAI
+    except Exception:
+        return None
+    return ChatOpenAI(model="gpt-4o", temperature=0.2, openai_api_key=api_key)
 
-# Encuesta de egreso (leavers)
-LEAVER_REQUIRED = {
-    "motivo_salida": ["¿Cuál es el motivo principal por el que decidiste irte de la empresa?", "motivo"],
-}
-LEAVER_OPTIONAL = {
-    "area": ["¿En qué área trabajabas?", "area", "departamento"],
-    "rol": ["¿En qué cargo trabajabas?", "rol", "cargo"],
-    "antiguedad_meses": ["¿Cuánto tiempo estuviste en la empresa?", "antiguedad", "meses"],
-    "nps": ["En una escala de 0 a 10, ¿Qué probabilidad hay de que recomiendes a un amigo trabajar en esta empresa?"],
-    "otros_factores": ["Además del motivo principal, ¿Qué otros factores influyeron en tu decisión? (Máximo 3)"],
-    "mejoras_retencion": ["¿Qué tres mejoras habrían hecho más probable que te quedaras en la empresa?"],
-    "sugerencia_final": ["¿Quieres dejarnos alguna sugerencia final para mejorar?"],
-}
+# Respuestas del chat persistidas en disco: sobreviven reinicios y se comparten entre procesos
+ANSWER_CACHE_PATH = os.environ.get("IA_ANSWER_CACHE", DEFAULT_ANSWER_CACHE_PATH)
+ANSWER_TTL_H = float(os.environ.get("IA_ANSWER_TTL_H", "24"))
+ANSWER_CACHE_MAX = int(os.environ.get("IA_ANSWER_CACHE_MAX", "5000"))
 
-# Encuesta de Gestión Humana
-HR_REQUIRED = {
-    "marca": ["Marca temporal"],
-}
-HR_OPTIONAL = {
-    # KPIs
-    "headcount": ["¿Cuántas personas trabajan en la organización actualmente?"],
-    "rotacion_6m": ["¿Cual es el indice de rotación de tu roganización en los ultimos 6 meses?"],
-    "hr_headcount": ["¿Cuántas personas trabajan en el área de Gestión Humana?"],
-    "vacantes_mes": ["En promedio, ¿Cuántas vacantes tienen abiertas cada mes?"],
-    "perfiles_dificiles": ["¿Cuáles son los perfiles o cargos más difíciles de cubrir?"],
-
-    # Desajuste selección
-    "dificultad_ajuste": ["En los procesos de selección hemos identificado dificultades para lograr que el perfil de los candidatos se ajuste a la complejidad real del cargo."],
-    "sobrecalificados": ["En ocasiones contratamos personas sobre calificadas para cargos operativos (ej. con más estudios o experiencia de la necesaria)."],
-    "subcalificados": ["En ocasiones contratamos personas sub calificadas para cargos que requieren mayor experiencia o competencias."],
-    "ajuste_contribuye_rotacion": ["Considero que este desajuste entre perfil y cargo contribuye a la rotación de personal en la empresa."],
-    "factores_desajuste": ["¿Qué factores crees que explican este desajuste?"],
-
-    # Prácticas y políticas
-    "indicadores_rotacion": ["En el área llevamos indicadores claros de rotación y los revisamos con frecuencia."],
-    "medimos_tiempo_cobertura": ["Medimos el tiempo promedio para cubrir vacantes."],
-    "medimos_costo_reemplazo": ["Medimos el costo de reemplazar personal."],
-    "plan_retencion": ["Tenemos un plan formal de fidelización para los cargos más críticos."],
-    "movilidad_interna": ["Contamos con políticas de movilidad interna para ofrecer nuevas oportunidades."],
-    "revision_salarial_anual": ["Revisamos los salarios al menos una vez al año comparándolos con el mercado."],
-    "flexibilidad_laboral": ["Ofrecemos flexibilidad laboral (teletrabajo, horarios flexibles) según el rol."],
-    "encuestas_clima": ["Aplicamos encuestas de clima laboral y damos seguimiento a los resultados."],
-
-    # Causas según HR
-    "causa_compensacion": ["Considero que la compensación es una de las principales causas de salida de la gente."],
-    "causa_jefes": ["Considero que la relación con los jefes es una de las principales causas de salida."],
-    "causa_sobrecarga": ["Considero que la sobrecarga laboral es una de las principales causas de salida."],
-    "causa_proyeccion": ["Considero que la falta de proyección es una de las principales causas de salida."],
-    "causa_modalidad": ["Considero que la modalidad de trabajo (remoto/presencial) es una de las principales causas de salida."],
-
-    # Efectividad de acciones
-    "eff_ajuste_salarios": ["Nuestras acciones actuales son efectivas para ajustar salarios cuando es necesario."],
-    "eff_liderazgo": ["Nuestras acciones actuales son efectivas para desarrollar programas de liderazgo."],
-    "eff_bienestar": ["Nuestras acciones actuales son efectivas para promover bienestar y salud mental."],
-    "eff_reconocimiento": ["Nuestras acciones actuales son efectivas para reconocer el buen desempeño."],
-    "eff_capacitacion": ["Nuestras acciones actuales son efectivas para dar oportunidades de capacitación y planes de carrera."],
-
-    # Analítica y sponsorship
-    "usa_analitica": ["En la empresa usamos analítica de datos para predecir riesgos de salida."],
-    "sponsorship_alta_direccion": ["La alta dirección participa activamente en las acciones de fidelización."],
-
-    # Segmentación rotación
-    "identifico_quien_se_va": ["En los últimos 12 meses, ¿la empresa ha identificado qué tipo de personas están dejando la organización?"],
-    "percepcion_rotacion": ["Consideras que en la mayoría de los casos la rotación actual de la empresa es"],
-
-    # Acciones inmediatas
-    "acciones_6m": ["Si tuvieras que priorizar tres acciones inmediatas para reducir la rotación en los próximos 6 meses, ¿Cuáles serían?"],
-}
+@st.cache_resource
+def answer_cache() -> Dict[str, object]:
+    return open_answer_cache(ANSWER_CACHE_PATH, ttl_s=ANSWER_TTL_H * 3600, max_entries=ANSWER_CACHE_MAX)
 
-# ----- MAPEADOR DE COLUMNAS ---
-
-def guess_col(df: pd.DataFrame, hints: List[str], default: Optional[str] = None) -> Optional[str]:
-    slugs = {slug(c): c for c in df.columns}
-    for h in hints:
-        if slug(h) in slugs:
-            return slugs[slug(h)]
-    return default
-
-def map_cols(df: pd.DataFrame, req: Dict[str, List[str]], opt: Dict[str, List[str]]) -> Dict[str, Optional[str]]:
-    m: Dict[str, Optional[str]] = {}
-    for k, hints in req.items():
-        c = guess_col(df, hints)
-        if not c:
-            c = df.columns[0]
-        m[k] = c
-    for k, hints in opt.items():
-        m[k] = guess_col(df, hints, default=None)
-    return m
-
-# ---- PREP & SCORING LOGIC ----
-
-KEYWORDS_BUCKETS = {
-    "compensacion": ["salario", "pago", "compens", "sueldo", "bono"],
-    "beneficios": ["beneficio", "prestacion", "eps", "auxilio", "bonificación"],
-    "liderazgo": ["jefe", "lider", "manager", "trato", "feedback", "retroaliment", "reconocimiento"],
-    "carrera": ["crecimiento", "desarrollo", "ascenso", "aprendizaje", "formacion", "proyeccion", "carrera"],
-    "carga": ["carga", "horas", "turno", "estres", "estrés", "burnout", "sobre carga", "sobrecarga"],
-    "flexibilidad": ["flexibilidad", "teletrabajo", "hibrido", "híbrido", "home office", "horario", "presencial", "remoto"],
-    "ambiente": ["clima", "ambiente", "equipo", "cultura", "respeto", "inclusion", "inclusión", "seguridad"],
-    "comunicacion": ["comunicacion", "comunicación", "transparencia", "informacion"],
-    "herramientas": ["herramienta", "equipo", "recurso", "software"],
-    "claridad_rol": ["claridad", "funciones", "objetivo", "rol"],
-    "autonomia": ["autonomia", "autonomía", "decisiones"],
-    "seleccion_ajuste": ["ajuste", "perfil", "seleccion", "selección", "sobrecali", "subcali"],
-}
+# -------------- UI -----------
 
-def map_spanish_likert_to_numeric(series: pd.Series) -> pd.Series:
-    """Mapea respuestas en español a números y **garantiza dtype numérico**.
-    - Soporta Likert textual (1..5), sí/no y números ("8", "10", "10,0").
-    - Convierte valores como "—", "n/a", "no aplica" en NaN.
+# Texto libre largo como string[pyarrow] (requiere pyarrow); el resto de la compactación siempre aplica
+ARROW_TEXT = os.environ.get("IA_ARROW_TEXT", "0") == "1"
+TABLE_TTL_S = 3600
+# La huella de un frame es muestreada: un cambio fuera de la muestra no cambia la clave.
+# Como con el antiguo st.cache_data(ttl=3600), los resultados derivados vencen a la hora.
+ANALYTICS_TTL_S = 3600
+
+# Con IA_SNAPSHOT_DIR, los procesos de Streamlit de la máquina comparten cada tabla
+# como snapshot Arrow mapeado en memoria en vez de descargarla y guardarla cada uno.
+SNAPSHOT_DIR = os.environ.get("IA_SNAPSHOT_DIR")
+
+# Tablas y resultados de todos los clientes comparten un presupuesto de memoria
+CACHE_BUDGET_MB = float(os.environ.get("IA_CACHE_BUDGET_MB", "1024"))
+CACHE_POLICY = os.environ.get("IA_CACHE_POLICY", "lru")   # lru | lfu
+
+# Perfil por etapa (tiempo, filas, memoria) de cada ejecución del script, agregado a
+# IA_PROFILE_LOG en JSONL para analizarlo fuera de la app. Opcional: el log crece sin
+# tope y guarda el email del cliente, así que por defecto no se escribe
+PROFILE_LOG = os.environ.get("IA_PROFILE_LOG", "")
+
+@st.cache_resource
+def tenant_cache() -> Dict[str, object]:
+    return new_cache(int(CACHE_BUDGET_MB * 1e6), policy=CACHE_POLICY)
+
+def _read_compact(url: str, profile: Optional[Dict[str, object]], name: str) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    df = read_table(url, profile=profile, name=name)
+    with profile_stage(profile, f"{name}.compactar", rows=len(df)):
+        return compact_frame(df, arrow_text=ARROW_TEXT)
+
+def _build_table(url: str, profile: Optional[Dict[str, object]] = None, name: str = "tabla") -> Tuple[pd.DataFrame, Dict[str, object]]:
+    if SNAPSHOT_DIR:
+        key = hashlib.sha1(f"{url}|arrow_text={ARROW_TEXT}".encode("utf-8")).hexdigest()[:20]
+        return load_or_build(SNAPSHOT_DIR, key, lambda: _read_compact(url, profile, name), max_age_s=TABLE_TTL_S)
+    return _read_compact(url, profile, name)
+
+def _table_bytes(value: Tuple[pd.DataFrame, Dict[str, object]]) -> int:
+    df, rep = value
+    if rep.get("version"):
+        # Snapshot mapeado: los datos viven en la caché de páginas; sólo cuentan los códigos
+        return sum(df[c].cat.codes.nbytes for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype))
+    return estimate_bytes(df)
+
+def get_table(url: str, tenant: Optional[str] = None, profile: Optional[Dict[str, object]] = None,
+              name: str = "tabla") -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Lee CSV/XLSX desde URL (idealmente Google Sheets publicado), compactado en memoria.
+    Devuelve (frame, reporte de compactación). El frame se comparte entre sesiones y entre
+    clientes con la misma planilla: no modificarlo.
     """
-    s = series.astype(str).str.strip().str.lower()
-    s = s.replace({
-        "": np.nan,
-        "-": np.nan,
-        "—": np.nan,
-        "na": np.nan,
-        "n/a": np.nan,
-        "no aplica": np.nan,
-        "prefiero no responder": np.nan,
-        "sin respuesta": np.nan,
-    })
-
-    LIKERT_ES_MAP = {
-        "totalmente en desacuerdo": 1,
-        "en desacuerdo": 2,
-        "ni de acuerdo ni en desacuerdo": 3,
-        "de acuerdo": 4,
-        "totalmente de acuerdo": 5,
-    }
-
-    mapped = s.map(LIKERT_ES_MAP)
-
-    mapped = mapped.fillna(s.replace({"sí": 5, "si": 5, "yes": 5, "no": 1}))
+    key = ("tabla", normalize_gsheet_export_url(url, fmt="csv"), ARROW_TEXT)
+    with profile_stage(profile, f"{name}.carga") as prof:
+        value, hit = cache_get_or_build(tenant_cache(), key, lambda: _build_table(url, profile, name), tenant=tenant,
+                                        size_of=_table_bytes, ttl_s=TABLE_TTL_S)
+        prof.update(filas=len(value[0]), desde_cache=hit)
+    return value
+
+# Últimas tendencias de cada cliente, para actualizarlas con las filas nuevas. Viven en la
+# caché compartida: si se desalojan, el próximo cálculo las rehace desde cero
+def _trends_base(cache: Dict[str, object], tenant: Optional[str], df_active: pd.DataFrame,
+                 mapping: Dict[str, Optional[str]]):
+    """(tendencias, filas) del cálculo anterior del cliente si ``df_active`` sólo agrega filas
+    al final (lo normal en un formulario); None si hay que recalcular desde cero."""
+    if not tenant:
+        return None
+    prev = cache_get(cache, ("tendencias", tenant), tenant=tenant)
+    if not prev or prev["mapping"] != mapping or not prev["rows"] < len(df_active):
+        return None
+    if frame_fingerprint(df_active.iloc[:prev["rows"]]) != prev["fingerprint"]:
+        return None
+    return prev["trends"], prev["rows"]
+
+def _remember_trends(cache: Dict[str, object], tenant: Optional[str], df_active: pd.DataFrame,
+                     mapping: Dict[str, Optional[str]], res: Dict[str, object]):
+    if not tenant or not res.get("trends"):
+        return
+    cache_put(cache, ("tendencias", tenant), {"mapping": mapping, "rows": len(df_active),
+                                              "fingerprint": frame_fingerprint(df_active), "trends": res["trends"]},
+              tenant=tenant)
+
+# Encuestas grandes: primero el diagnóstico sobre una muestra estratificada por área (con
+# cotas de error); en segundo plano se refina con muestras ×4 hasta el resultado exacto.
+APPROX_MIN_ROWS = int(os.environ.get("IA_APPROX_MIN_ROWS", "100000"))
+APPROX_SAMPLE_ROWS = int(os.environ.get("IA_APPROX_SAMPLE_ROWS", "20000"))
+APPROX_REFINE_FACTOR = 4
+
+def _refine_bytes(item: Dict[str, object]) -> int:
+    return estimate_bytes(item["res"])
+
+def _refine(item: Dict[str, object], frames, params: Dict[str, object], run_exact, cache: Dict[str, object],
+            key: str, tenant: Optional[str]):
+    # Hilo de refinamiento: cada muestra reemplaza a la anterior y la entrada ("refinamiento", key)
+    # de la caché compartida se actualiza con su tamaño; el exacto queda como ("analitica", key)
+    n = APPROX_SAMPLE_ROWS * APPROX_REFINE_FACTOR
+    rkey = ("refinamiento", key)
+    try:
+        while n < len(frames[0]) / 2:
+            item["res"] = run_pipeline_approx(*frames, sample_rows=n, **params)
+            if not cache_resize(cache, rkey, _refine_bytes(item)):
+                # desalojada mientras corría: se vuelve a guardar para no lanzar otro refinamiento
+                cache_put(cache, rkey, item, nbytes=_refine_bytes(item), tenant=tenant, ttl_s=ANALYTICS_TTL_S)
+            n *= APPROX_REFINE_FACTOR
+        item["res"], _ = cache_get_or_build(cache, ("analitica", key), run_exact, tenant=tenant,
+                                            ttl_s=ANALYTICS_TTL_S)
+        item["exacto"] = True
+        if cache_peek(cache, ("analitica", key)) is not None:
+            cache_discard(cache, rkey)   # el exacto ya cuenta en la caché: no se guarda dos veces
+        else:
+            cache_resize(cache, rkey, _refine_bytes(item))
+    except Exception as e:
+        item["error"] = str(e)
 
-    numeric = pd.to_numeric(s.str.replace(",", ".", regex=False), errors="coerce")
+def _approx_result(key: str, frames, params: Dict[str, object], run_exact, cache: Dict[str, object],
+                   tenant: Optional[str], profile: Optional[Dict[str, object]] = None) -> Optional[Dict[str, object]]:
+    """Mejor resultado disponible para ``key``. La primera vez calcula la muestra inicial y
+    lanza el refinamiento; None si la muestra falló o no cabe en la caché (se calcula el
+    exacto en primer plano)."""
+    rkey = ("refinamiento", key)
 
-    out = mapped.fillna(numeric)
-    out = pd.to_numeric(out, errors="coerce")
-    return out
+    def _start() -> Dict[str, object]:
+        res = run_pipeline_approx(*frames, sample_rows=APPROX_SAMPLE_ROWS, profile=profile, **params)
+        return {"res": res, "exacto": False, "error": None}
 
-def normalize_likert(series: pd.Series) -> pd.Series:
-    """Normaliza a 0-100 soportando 1-5, 0-10 y 0-100.
-    Evita errores de comparación cuando hay strings mezclados.
+    try:
+        item, hit = cache_get_or_build(cache, rkey, _start, tenant=tenant, size_of=_refine_bytes,
+                                       ttl_s=ANALYTICS_TTL_S)
+    except Exception:
+        return None
+    if not hit:
+        if cache_peek(cache, rkey) is not item:
+            return None   # rechazada por el presupuesto: sin entrada, la página no podría seguirla
+        threading.Thread(target=_refine, args=(item, frames, params, run_exact, cache, key, tenant),
+                         daemon=True).start()
+    return item["res"]
+
+def cached_pipeline(df_active: pd.DataFrame, df_leaver: pd.DataFrame, df_hr: pd.DataFrame, min_responses: int,
+                    bootstrap: int, kda_method: str, tenant: Optional[str] = None,
+                    approx: bool = False, profile: Optional[Dict[str, object]] = None) -> Tuple[Dict[str, object], str, bool]:
+    """Diagnóstico memorizado por huella de datos + mapeos + parámetros.
+    Devuelve (resultados, clave, hit). Los resultados se comparten: no modificarlos.
+    Con ``approx`` y al menos ``APPROX_MIN_ROWS`` activos, mientras no esté el exacto se
+    devuelve el aproximado (``resultados["aproximado"]``) y se refina en segundo plano.
+    ``profile`` recibe las etapas de lo que se calcule en primer plano.
     """
-    s = map_spanish_likert_to_numeric(series)
-    mx = s.max(skipna=True)
-    if pd.notna(mx) and mx <= 5:
-        return (s - 1) / 4 * 100
-    if pd.notna(mx) and mx <= 10:
-        return (s / 10) * 100
-    return s.clip(0, 100)
-
-def _score_agreement(series: pd.Series, positive_is_risk: bool = True) -> pd.Series:
-    s = map_spanish_likert_to_numeric(series)
-    mx = s.max(skipna=True)
-    if pd.isna(mx):
-        score = s 
-    elif mx <= 5:
-        score = (s - 1) / 4
-    elif mx <= 10:
-        score = s / 10
-    else:
-        score = (s.clip(0, 100)) / 100
-    return score if positive_is_risk else (1 - score)
-
-def _score_yesno(series: pd.Series, yes_risk: bool = True) -> pd.Series:
-    s = series.astype(str).str.strip().str.lower()
-    s = s.replace({
-        "": np.nan,
-        "-": np.nan,
-        "—": np.nan,
-        "na": np.nan,
-        "n/a": np.nan,
-        "no aplica": np.nan,
-        "prefiero no responder": np.nan,
-        "sin respuesta": np.nan,
-    })
-    yes = s.isin(["sí", "si", "yes", "true", "verdadero"]) | s.str.contains(r"\b(s[ií])\b", na=False)
-    no = s.isin(["no", "false", "falso"]) | s.str.contains(r"\bno\b", na=False)
-    base = pd.Series(np.nan, index=s.index, dtype="float")
-    base[yes] = 1.0
-    base[no] = 0.0
-
-    s_num = pd.to_numeric(s.str.replace(',', '.', regex=False), errors='coerce')
-    base = base.fillna(s_num.apply(lambda x: np.nan if pd.isna(x) else (1.0 if x >= 1 else 0.0)))
-    return base if yes_risk else 1 - base
-
-def infer_intent_from_active(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.Series:
-    """Construye un score de intención de salida combinando 2-3 señales."""
-    parts = []
-
-    col_main = m_active.get("intencion_salida")
-    if col_main and col_main in df_active.columns:
-        parts.append(_score_agreement(df_active[col_main], positive_is_risk=True))
-
-    col_aux = m_active.get("intencion_salida_aux")
-    if col_aux and col_aux in df_active.columns:
-        parts.append(_score_yesno(df_active[col_aux], yes_risk=True))
-
-    col_stay = m_active.get("preferencia_quedar")
-    if col_stay and col_stay in df_active.columns:
-        parts.append(_score_agreement(df_active[col_stay], positive_is_risk=False))
-
-    if not parts:
-        return pd.Series(0.0, index=df_active.index)
-
-    X = pd.concat(parts, axis=1)
-    return X.mean(axis=1).fillna(0.0)
-
-def correlate_with_intent(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.DataFrame:
-    """Calcula correlaciones de drivers con intención de salida."""
-    y = infer_intent_from_active(df_active, m_active)
-    drivers = {}
-    skip_keys = {"id", "area", "rol", "intencion_salida", "intencion_salida_aux", "preferencia_quedar", "razones_texto"}
-    for key, col in m_active.items():
-        if key in skip_keys:
-            continue
-        if not col or col not in df_active.columns:
-            continue
-        x = normalize_likert(df_active[col])
-        drivers[key] = x
-    if not drivers:
-        return pd.DataFrame()
-    X = pd.DataFrame(drivers)
-    corr = X.assign(intent=y).corr(numeric_only=True)["intent"].drop("intent")
-    out = (
-        corr.rename("correlacion_intencion")
-        .sort_values(ascending=True)  # negativo = protector; positivo = riesgo
-        .to_frame()
-    )
-    out.index.name = "driver"
-    return out
-
-def tokenize(s: str) -> List[str]:
-    return re.findall(r"[a-záéíóúüñ0-9]+", str(s).lower())
-
-def bucketize_reason(text: str) -> Dict[str, int]:
-    tokens = tokenize(text)
-    counts = {k: 0 for k in KEYWORDS_BUCKETS}
-    for k, words in KEYWORDS_BUCKETS.items():
-        counts[k] = sum(1 for t in tokens for w in words if w in t)
-    return counts
-
-def summarize_reasons(df_active: pd.DataFrame, df_leaver: pd.DataFrame, m_active: Dict[str, Optional[str]], m_leaver: Dict[str, Optional[str]]) -> pd.DataFrame:
-    buckets = {k: 0 for k in KEYWORDS_BUCKETS}
-    # Activos – texto consolidado
-    col_txt_a = m_active.get("razones_texto")
-    if col_txt_a and col_txt_a in df_active.columns:
-        for txt in df_active[col_txt_a].dropna().astype(str).tolist():
-            counts = bucketize_reason(txt)
-            for k, v in counts.items():
-                buckets[k] += v
-    # Egresos – texto consolidado y motivo estructurado
-    col_txt_l = m_leaver.get("comentarios")
-    if col_txt_l and col_txt_l in df_leaver.columns:
-        for txt in df_leaver[col_txt_l].dropna().astype(str).tolist():
-            counts = bucketize_reason(txt)
-            for k, v in counts.items():
-                buckets[k] += v
-    col_mot = m_leaver.get("motivo_salida")
-    if col_mot and col_mot in df_leaver.columns:
-        for txt in df_leaver[col_mot].dropna().astype(str).tolist():
-            counts = bucketize_reason(txt)
-            for k, v in counts.items():
-                buckets[k] += v
-    df = pd.DataFrame([
-        {"categoria": k, "menciones": v} for k, v in buckets.items()
-    ]).sort_values("menciones", ascending=False)
-    df["peso_relativo_%"] = (df["menciones"] / max(1, df["menciones"].sum())) * 100
-    return df
-
-def area_risk(df_active: pd.DataFrame, m_active: Dict[str, Optional[str]]) -> pd.DataFrame:
-    a_col = m_active.get("area")
-    if not a_col or a_col not in df_active.columns:
-        return pd.DataFrame()
-    intent = infer_intent_from_active(df_active, m_active)
-    # drivers principales si existen
-    drv_cols_keys = [
-        "satisfaccion_general", "compensacion", "jefe_respeto", "jefe_confia", "crecimiento",
-        "carga_laboral", "comunicacion", "reconocimiento"
-    ]
-    drv_cols = [m_active.get(k) for k in drv_cols_keys]
-    drv_cols = [c for c in drv_cols if c and c in df_active.columns]
-    df = df_active[[a_col]].copy()
-    df["intent"] = intent
-    for c in drv_cols:
-        df[c+"_norm"] = normalize_likert(df_active[c])
-    agg = df.groupby(a_col).agg(
-        intent_media=("intent", "mean"),
-        n=("intent", "size"),
-        **{c+"_avg": (c+"_norm", "mean") for c in drv_cols}
-    ).reset_index()
-    sat_key = m_active.get("satisfaccion_general")
-    if sat_key and (sat_key+"_avg") in agg.columns:
-        agg["riesgo"] = 0.5*agg["intent_media"] + 0.5*(100 - agg[sat_key+"_avg"]) / 100
-    else:
-        agg["riesgo"] = agg["intent_media"]
-    agg["riesgo_%"] = (agg["riesgo"]*100).round(1)
-    agg = agg.sort_values(["riesgo", "n"], ascending=[False, False])
-    return agg
-
-# --------- HR DASHBOARD -------
-
-def to_bool(s: pd.Series) -> pd.Series:
-    x = s.astype(str).str.strip().str.lower()
-    yes_like = x.isin(["sí", "si", "yes", "true"]) | x.str.contains(r"de acuerdo|aplica|cumple|si\b|sí\b", na=False)
-    no_like = x.isin(["no", "false"]) | x.str.contains(r"no aplica|no cumple|en desacuerdo", na=False)
-    out = pd.Series(np.nan, index=x.index, dtype="float")
-    out[yes_like] = 1.0
-    out[no_like] = 0.0
-    # fallback numérico
-    out = out.fillna(pd.to_numeric(x.str.replace(",", ".", regex=False), errors="coerce").apply(
-        lambda v: np.nan if pd.isna(v) else (1.0 if v >= 1 else 0.0)
-    ))
-    return out
-
-def hr_dashboard(df_hr: pd.DataFrame, m_hr: Dict[str, Optional[str]]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, str]:
-    # KPIs simples
-    kpis = []
-    def _num(col_key):
-        col = m_hr.get(col_key)
-        if col and col in df_hr.columns:
-            return pd.to_numeric(df_hr[col].astype(str).str.replace(",", ".", regex=False), errors="coerce").dropna().mean()
-        return np.nan
-
-    hc = _num("headcount")
-    rot = _num("rotacion_6m")
-    hr_hc = _num("hr_headcount")
-    vac = _num("vacantes_mes")
-    ratio_hr = (hr_hc / hc * 100) if (pd.notna(hr_hc) and pd.notna(hc) and hc > 0) else np.nan
-
-    kpis.append({"indicador": "Headcount", "valor": hc})
-    kpis.append({"indicador": "Rotación 6m (%)", "valor": rot})
-    kpis.append({"indicador": "Headcount HR", "valor": hr_hc})
-    kpis.append({"indicador": "Vacantes/mes", "valor": vac})
-    kpis.append({"indicador": "% HR sobre total", "valor": ratio_hr})
-    kpis_df = pd.DataFrame(kpis)
-
-    # Causas según HR
-    causas_keys = [
-        ("causa_compensacion", "Compensación"),
-        ("causa_jefes", "Jefes/Liderazgo"),
-        ("causa_sobrecarga", "Sobrecarga"),
-        ("causa_proyeccion", "Falta de proyección"),
-        ("causa_modalidad", "Modalidad trabajo"),
-    ]
-    causas_rows = []
-    for key, label in causas_keys:
-        col = m_hr.get(key)
-        if col and col in df_hr.columns:
-            val = to_bool(df_hr[col]).mean()
-            causas_rows.append({"causa": label, "% acuerdo": round(val*100, 1) if pd.notna(val) else np.nan})
-    causas_df = pd.DataFrame(causas_rows).sort_values("% acuerdo", ascending=False) if causas_rows else pd.DataFrame()
-
-    pract_keys = [
-        ("indicadores_rotacion", "Indicadores de rotación"),
-        ("medimos_tiempo_cobertura", "Medimos tiempo de cobertura"),
-        ("medimos_costo_reemplazo", "Medimos costo de reemplazo"),
-        ("plan_retencion", "Plan de retención"),
-        ("movilidad_interna", "Movilidad interna"),
-        ("revision_salarial_anual", "Revisión salarial anual"),
-        ("flexibilidad_laboral", "Flexibilidad laboral"),
-        ("encuestas_clima", "Encuestas de clima"),
-        ("usa_analitica", "Analítica de rotación"),
-        ("sponsorship_alta_direccion", "Sponsorship Alta Dirección"),
-        ("eff_ajuste_salarios", "Efectivo: ajuste salarios"),
-        ("eff_liderazgo", "Efectivo: liderazgo"),
-        ("eff_bienestar", "Efectivo: bienestar/SM"),
-        ("eff_reconocimiento", "Efectivo: reconocimiento"),
-        ("eff_capacitacion", "Efectivo: capacitación/carrera"),
+    mappings = [
+        map_cols(df_active, ACTIVE_REQUIRED, ACTIVE_OPTIONAL),
+        map_cols(df_leaver, LEAVER_REQUIRED, LEAVER_OPTIONAL),
+        map_cols(df_hr, HR_REQUIRED, HR_OPTIONAL),
     ]
-    pract_rows = []
-    for key, label in pract_keys:
-        col = m_hr.get(key)
-        if col and col in df_hr.columns:
-            val = to_bool(df_hr[col]).mean()
-            pract_rows.append({"práctica": label, "% sí/efectivo": round(val*100, 1) if pd.notna(val) else np.nan})
-    pract_df = pd.DataFrame(pract_rows).sort_values("% sí/efectivo", ascending=False) if pract_rows else pd.DataFrame()
-
-    # Campos de texto
-    perfiles = m_hr.get("perfiles_dificiles")
-    acciones = m_hr.get("acciones_6m")
-    text_concat = []
-    if perfiles and perfiles in df_hr.columns:
-        text_concat += ["Perfiles difíciles: " + "; ".join(df_hr[perfiles].dropna().astype(str).tolist())]
-    if acciones and acciones in df_hr.columns:
-        text_concat += ["Acciones 6m sugeridas: " + "; ".join(df_hr[acciones].dropna().astype(str).tolist())]
-    text_blob = " | ".join(text_concat)
-
-    return kpis_df, causas_df, pract_df, text_blob
-
-# --------- PROMPTS -----------
-SYSTEM_PROMPT = (
-    "Eres MARIA, una consultora ejecutiva experta en retención y fidelización de talento y reducción de rotación. "
-    "Siempre respondes en español, en tono claro, ejecutivo y accionable. "
-    "Eres rigurosa con supuestos; separas 'dato' de 'supuesto' y justificas. "
-    "Entregas diagnóstico de drivers de salida, priorización de iniciativas (alto impacto/baja complejidad), "
-    "y hoja de ruta trimestral con responsables y métricas. "
-    "Evitas lenguaje discriminatorio; promueves decisiones basadas en evidencia. "
-    "Cuando se provea contexto de HR, alinea recomendaciones con beneficios y restricciones actuales. "
-    "Incluye advertencia breve: 'Contenido referencial; no reemplaza asesoría legal/SSO.'"
-)
-
-CHAT_INSTRUCTIONS = """
-Responde como experta en **retención**, **fidelización** y **experiencia del colaborador**.
-- Identifica drivers de riesgo y protectores a partir de correlaciones y texto libre.
-- Prioriza acciones en 3 horizontes: quick wins (0-30 días), 60-90 días, 90-180 días.
-- Usa palancas: compensación, liderazgo, carrera, flexibilidad, carga, beneficios.
-- Sugiere métricas: intención de salida, tiempo de cobertura de vacantes, eNPS, % adopción de beneficios clave.
-- No inventes datos: si faltan, explícitalo y sugiere cómo obtenerlos.
-- Cierra con: *Contenido referencial; no reemplaza asesoría legal/SSO.*
-"""
-
-def build_llm_answer(base_context: Dict[str, object], user_q: str) -> str:
-    if llm is None or SystemMessage is None or HumanMessage is None:
-        return (
-            "Motor experto deshabilitado. Agrega `OPENAI_API_KEY` en `st.secrets` para activar respuestas generativas.\n\n"
-            "Puedes seguir usando el Tab de Conclusiones para el diagnóstico determinista."
-        )
-    system = SystemMessage(content=SYSTEM_PROMPT)
-    human = HumanMessage(content=f"Contexto JSON (si disponible): {json.dumps(base_context, ensure_ascii=False)}\n\nPregunta: {user_q}\n\nInstrucciones específicas:\n{CHAT_INSTRUCTIONS}")
-    try:
-        resp = llm.invoke([system, human])
-        return resp.content
-    except Exception as e:
-        return f"Error al consultar el modelo: {e}\n\nSugerencia: verifica OPENAI_API_KEY en st.secrets."
+    key = analytics_key([df_active, df_leaver, df_hr], mappings,
+                        min_responses=min_responses, bootstrap=bootstrap, kda_method=kda_method)
+    # Recurso resuelto aquí: el refinamiento corre fuera del hilo de la sesión
+    cache = tenant_cache()
+    params = {"min_responses": min_responses, "bootstrap": bootstrap, "kda_method": kda_method,
+              "time_budget_s": 20.0, "n_jobs": os.cpu_count() or 1}
+
+    def _run(prof: Optional[Dict[str, object]] = None) -> Dict[str, object]:
+        res = run_pipeline(df_active, df_leaver, df_hr, **params, profile=prof,
+                           trends_base=_trends_base(cache, tenant, df_active, mappings[0]))
+        _remember_trends(cache, tenant, df_active, mappings[0], res)
+        return res
+
+    if approx and len(df_active) >= APPROX_MIN_ROWS:
+        res = cache_get(cache, ("analitica", key), tenant=tenant)
+        if res is not None:
+            cache_discard(cache, ("refinamiento", key))
+            return res, key, True
+        res = _approx_result(key, (df_active, df_leaver, df_hr), params, _run, cache, tenant, profile)
+        if res is not None:
+            return res, key, False
+    res, hit = cache_get_or_build(cache, ("analitica", key), lambda: _run(profile), tenant=tenant,
+                                  ttl_s=ANALYTICS_TTL_S)
+    return res, key, hit
+
+def _view_hash(df: pd.DataFrame) -> str:
+    # Hash de todas las celdas (y del índice, que refleja filtro y orden), no de una muestra:
+    # dos vistas del mismo tamaño nunca comparten archivo. Sólo corre al descargar.
+    h = hashlib.sha1(f"{list(df.columns)}|{list(map(str, df.dtypes))}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+def cached_export(df: pd.DataFrame, fmt: str, tenant: Optional[str] = None) -> bytes:
+    """Exportación memorizada por contenido completo del frame exportado + formato, en la
+    caché compartida: cuenta su tamaño real contra el presupuesto y se desaloja como el resto."""
+    data, _ = cache_get_or_build(tenant_cache(), ("exportacion", _view_hash(df), fmt),
+                                 lambda: export_bytes(df, fmt), tenant=tenant, size_of=len)
+    return data
 
-# -------------- UI -----------
 st.markdown("<div class='container-box'>", unsafe_allow_html=True)
 st.title(f"🍃 {APP_NAME}")
 
@@ -583,15 +297,10 @@ with st.sidebar:
 
     if email_usuario:
         try:
-            resp = requests.get(f"http://127.0.0.1:8000/api/accounts/user-links/?email={email_usuario}")
-            if resp.status_code == 200:
-                data = resp.json()
-                url_active = data.get("form_link1", "")
-                url_leaver = data.get("form_link2", "")
-                url_hr = data.get("form_link3", "")
-                st.success("✅ Links cargados desde tu cuenta.")
-            else:
-                st.error("No se pudieron cargar los links del usuario.")
+            url_active, url_leaver, url_hr = fetch_user_links(email_usuario)
+            st.success("✅ Links cargados desde tu cuenta.")
+        except ValueError:
+            st.error("No se pudieron cargar los links del usuario.")
         except Exception as e:
             st.error(f"Error conectando con backend: {e}")
     else:
@@ -601,80 +310,173 @@ with st.sidebar:
     st.subheader("Parámetros")
     min_responses = st.number_input("Mín. respuestas por área para mostrar (umbral)", value=10, min_value=1, step=1)
     top_n = st.slider("Top N drivers a destacar", 3, 15, 7, step=1)
+    use_bootstrap = st.checkbox("Intervalos de confianza (bootstrap)", value=False)
+    n_bootstrap = st.number_input("Remuestreos bootstrap", value=2000, min_value=200, max_value=20000, step=200, disabled=not use_bootstrap)
+    kda_method = st.selectbox(
+        "Importancia relativa (key-driver)",
+        options=list(KDA_METHODS),
+        format_func=lambda m: {"relative_weights": "Pesos relativos (Johnson)", "ridge": "Ridge + Pratt"}[m],
+    )
+    show_profile = st.checkbox("Mostrar perfil por etapa (depuración)", value=False)
+    approx_mode = st.checkbox(
+        "Resultados aproximados mientras se calcula (encuestas grandes)", value=True,
+        help=f"Con {APPROX_MIN_ROWS:,} o más respuestas de activos se muestra primero un diagnóstico sobre una "
+             "muestra estratificada por área, con márgenes de error, y se refina hasta el exacto en segundo plano.",
+    )
 
 if not (url_active and url_leaver and url_hr):
     st.info("Pega las **tres** URLs públicas para continuar.")
     st.markdown("</div>", unsafe_allow_html=True)
     st.stop()
 
+# Perfil de esta ejecución: carga, diagnóstico, contexto del chat y render de cada tab.
+# Sólo con el panel o el log activos; si no, las etapas no miden nada (ni la memoria)
+run_profile = new_profile(cliente=email_usuario, min_responses=int(min_responses),
+                          bootstrap=int(n_bootstrap) if use_bootstrap else 0,
+                          kda=kda_method) if show_profile or PROFILE_LOG else None
+
+def _log_profile():
+    if not PROFILE_LOG or run_profile is None:
+        return
+    try:
+        append_jsonl(PROFILE_LOG, run_profile)
+    except OSError:
+        pass   # el log es diagnóstico: nunca debe romper la app
+
 try:
-    df_active = load_table(url_active)
-    df_leaver = load_table(url_leaver)
-    df_hr = load_table(url_hr)
+    with st.spinner("Cargando encuestas…"):
+        df_active, mem_active = get_table(url_active, tenant=email_usuario, profile=run_profile, name="activos")
+        df_leaver, mem_leaver = get_table(url_leaver, tenant=email_usuario, profile=run_profile, name="egresos")
+        df_hr, mem_hr = get_table(url_hr, tenant=email_usuario, profile=run_profile, name="hr")
     st.success(f"Cargados: activos {len(df_active):,} filas · egresos {len(df_leaver):,} · HR {len(df_hr):,}")
 except Exception as e:
     st.error(f"No se pudieron leer las URLs: {e}")
     st.markdown("</div>", unsafe_allow_html=True)
+    _log_profile()
     st.stop()
 
-# Mapear columnas
-m_active = map_cols(df_active, ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
-m_leaver = map_cols(df_leaver, LEAVER_REQUIRED, LEAVER_OPTIONAL)
-m_hr = map_cols(df_hr, HR_REQUIRED, HR_OPTIONAL)
+# Diagnóstico (motor compartido con el procesamiento batch de cli.py)
+t_analytics = time.perf_counter()
+with profile_stage(run_profile, "analitica", rows=len(df_active)) as prof:
+    results, analytics_fp, analytics_hit = cached_pipeline(
+        df_active, df_leaver, df_hr, int(min_responses),
+        int(n_bootstrap) if use_bootstrap else 0, kda_method, tenant=email_usuario, approx=approx_mode,
+        profile=run_profile,
+    )
+    prof["desde_cache"] = analytics_hit
+t_analytics = time.perf_counter() - t_analytics
+approx_info = results.get("aproximado")
+
+@st.fragment(run_every=2)
+def render_refine_status(key: str, n_shown: int):
+    # Sondea el refinamiento en segundo plano y recarga la página cuando hay un resultado mejor
+    item = cache_peek(tenant_cache(), ("refinamiento", key))
+    if item is None or item["exacto"] or (item["res"] or {}).get("aproximado", {}).get("n_muestra") != n_shown:
+        st.rerun(scope="app")
+    if item["error"]:
+        st.warning(f"No se pudo completar el resultado exacto: {item['error']}")
+        return
+    st.info(
+        f"⏳ **Resultados aproximados**: muestra estratificada por área de {approx_info['n_muestra']:,} de "
+        f"{approx_info['n_total']:,} respuestas de activos ({approx_info['fraccion']:.0%}), con márgenes de "
+        f"error al {approx_info['confianza']:.0%}. Calculando el resultado exacto en segundo plano…"
+    )
 
-TAB1, TAB2, TAB3 = st.tabs(["Conclusiones y correlaciones", "Chat experto", "Explorar archivos"])
+if approx_info:
+    render_refine_status(analytics_fp, approx_info["n_muestra"])
+
+# Agregados del diagnóstico con claves cortas, recortados al presupuesto de tokens del chat
+CHAT_CONTEXT_TOKENS = int(os.environ.get("IA_CHAT_CONTEXT_TOKENS", str(DEFAULT_CONTEXT_TOKENS)))
+context_key = (analytics_fp, CHAT_CONTEXT_TOKENS, (approx_info or {}).get("n_muestra"))
+if st.session_state.get("chat_context_key") != context_key:
+    with profile_stage(run_profile, "contexto_chat"):
+        st.session_state.chat_context = build_llm_context(results, CHAT_CONTEXT_TOKENS)
+    st.session_state.chat_context_key = context_key
+base_context, context_report = st.session_state.chat_context
+
+with st.sidebar.expander("🔧 Depuración"):
+    st.caption(
+        f"Analítica: {'✅ desde caché (sin recálculo)' if analytics_hit else '🔄 recalculada'} · "
+        f"{t_analytics*1000:.0f} ms · huella `{analytics_fp[:12]}`"
+        + (f" · aproximada ({approx_info['n_muestra']:,} filas)" if approx_info else "")
+    )
+    if results.get("trends"):
+        tr = results["trends"]
+        st.caption(f"Tendencias: {tr['rows']:,} respuestas" + (" de la muestra" if tr.get("fraccion_muestra") else "")
+                   + " · " + (f"incremental (+{tr['added']:,} nuevas)" if tr["added"] < tr["rows"] else "calculadas desde cero"))
+    if "chat_turn_ms" in st.session_state:
+        st.caption(f"Último turno de chat: {st.session_state.chat_turn_ms:,.0f} ms")
+    if "chat_metrics" in st.session_state:
+        cm = st.session_state.chat_metrics
+        st.caption(
+            f"Última respuesta ({cm['estado']}): primer token {cm['ttft_ms'] or 0:,.0f} ms · "
+            f"total {cm['total_ms'] or 0:,.0f} ms · {cm['fragmentos']} fragmentos"
+        )
+    for name, rep in (("Activos", mem_active), ("Egresos", mem_leaver), ("HR", mem_hr)):
+        st.caption(
+            f"Memoria {name}: {rep['bytes_antes']/1e6:,.1f} MB → {rep['bytes_despues']/1e6:,.1f} MB "
+            f"({len(rep['columnas'])} columnas compactadas)"
+            + (" · snapshot compartido" if rep.get("version") else "")
+        )
+    cs = cache_stats(tenant_cache())
+    st.caption(
+        f"Caché ({cs['policy'].upper()}): {cs['resident_bytes']/1e6:,.1f} / {cs['budget_bytes']/1e6:,.1f} MB · "
+        f"{cs['entries']} entradas ({cs['shared_entries']} compartidas) · {cs['tenants']} clientes · "
+        f"hits {cs['hits']} · misses {cs['misses']} · desalojos {cs['evictions']}"
+    )
+    st.caption(
+        f"Contexto del chat: {context_report['total']:,} / {context_report['presupuesto']:,} tokens "
+        f"({context_report['tokenizador']}) · "
+        + " · ".join(f"{name} {sec['tokens']} ({sec['items']}/{sec['disponibles']})"
+                     for name, sec in context_report["secciones"].items())
+    )
+    ac = answer_cache_stats(answer_cache())
+    st.caption(
+        f"Caché de respuestas del chat: {ac['entradas']} / {ac['max_entradas']} entradas · "
+        f"{ac['bytes']/1e3:,.0f} KB · {ac['hits']} hits · TTL {ac['ttl_s']/3600:,.0f} h"
+    )
 
-# TAB 1 – CONCLUSIONES Y CORRELACIONES
+fuzzy_matches = {
+    f"{name}.{k}": v
+    for name, fz in results["fuzzy"].items()
+    for k, v in fz.items()
+}
+if fuzzy_matches:
+    with st.sidebar.expander(f"🔎 {len(fuzzy_matches)} columnas emparejadas por similitud"):
+        st.caption("La pregunta del formulario no coincide exactamente con la esperada; revisa que el emparejamiento sea correcto.")
+        for k, (col, score) in fuzzy_matches.items():
+            st.markdown(f"- `{k}` → {col} ({score:.0%})")
 
-with TAB1:
-    st.subheader("🧭 Diagnóstico integral de rotación")
+TAB1, TAB2, TAB3 = st.tabs(["Conclusiones y correlaciones", "Chat experto", "Explorar archivos"])
 
-    active_text_cols = [
-        m_active.get("razon_calificacion"),
-        m_active.get("razones_posible_salida"),
-        m_active.get("cambio_para_quedarte"),
-        m_active.get("comentario_adicional"),
-    ]
-    active_text_cols = [c for c in active_text_cols if c and c in df_active.columns]
-    if active_text_cols:
-        df_active["__reasons_text_activos"] = df_active[active_text_cols].astype(str).agg(" | ".join, axis=1)
-        m_active["razones_texto"] = "__reasons_text_activos"
-
-    leaver_text_cols = [
-        m_leaver.get("otros_factores"),
-        m_leaver.get("mejoras_retencion"),
-        m_leaver.get("sugerencia_final"),
-    ]
-    leaver_text_cols = [c for c in leaver_text_cols if c and c in df_leaver.columns]
-    if leaver_text_cols:
-        df_leaver["__reasons_text_egresos"] = df_leaver[leaver_text_cols].astype(str).agg(" | ".join, axis=1)
-        m_leaver["comentarios"] = "__reasons_text_egresos"
+# Cada tab es un fragmento: sus widgets (y cada turno del chat) re-ejecutan solo ese tab,
+# no el resto de la página.
 
-    try:
-        corr_df = correlate_with_intent(df_active, m_active)
-    except Exception as e:
-        st.error(f"Error calculando correlaciones: {e}")
-        corr_df = pd.DataFrame()
+# TAB 1 – CONCLUSIONES Y CORRELACIONES
 
-    try:
-        reasons_df = summarize_reasons(df_active, df_leaver, m_active, m_leaver)
-    except Exception as e:
-        st.error(f"Error procesando razones de salida: {e}")
-        reasons_df = pd.DataFrame()
+@st.fragment
+def render_conclusions(results: Dict[str, object], df_active: pd.DataFrame, min_responses: int, top_n: int):
+    st.subheader("🧭 Diagnóstico integral de rotación")
+    m_active = results["m_active"]
 
-    try:
-        risk_df = area_risk(df_active, m_active)
-        if len(risk_df):
-            risk_df = risk_df[risk_df["n"] >= min_responses]
-    except Exception as e:
-        st.error(f"Error calculando riesgo por área: {e}")
-        risk_df = pd.DataFrame()
+    for stage, msg in results["errores"].items():
+        if stage != "hr":
+            st.error(msg)
+    corr_df = results["corr"]
+    kda_df = results["kda"]
+    reasons_df = results["reasons"]
+    risk_cube = results["risk_cube"] or None
+    risk_df = results["risk"]
 
     cols = st.columns(2)
     with cols[0]:
         st.markdown("**Drivers asociados a intención de salida** (corr. Pearson; negativo = protector, positivo = riesgo)")
         if len(corr_df):
             st.dataframe(corr_df.head(top_n), use_container_width=True)
+            if "n_bootstrap" in corr_df.attrs:
+                st.caption(f"IC 95% percentil y p-valor bilateral con {corr_df.attrs['n_bootstrap']:,} remuestreos bootstrap (semilla fija).")
+            elif corr_df.attrs.get("ic_muestra"):
+                st.caption("Resultado aproximado: IC 95% por error de muestreo (método delta, con corrección por población finita).")
         else:
             st.info("No se pudieron calcular correlaciones. Revisa columnas de drivers en la encuesta de activos.")
     with cols[1]:
@@ -684,18 +486,108 @@ with TAB1:
         else:
             st.info("No se detectaron razones. Revisa campos de texto y motivo de salida.")
 
+    st.markdown("---")
+    st.markdown("**Frases más repetidas en comentarios** (activos, egresos y HR; 🆕 = fuera de las categorías de motivos)")
+    phrases = results.get("phrases") or {}
+    if len(phrases.get("global", [])):
+        areas = sorted(phrases["por_area"]["area"].unique()) if len(phrases["por_area"]) else []
+        scope = st.selectbox("Ver", ["Todas las áreas"] + areas, key="phrases_scope")
+        view = phrases["global"] if scope == "Todas las áreas" else phrases["por_area"][phrases["por_area"]["area"] == scope]
+        view = view.assign(frase=view["frase"].where(~view["emergente"], "🆕 " + view["frase"]))
+        st.dataframe(view.drop(columns=["emergente", "area"], errors="ignore").head(max(top_n, 15)),
+                     use_container_width=True, hide_index=True)
+        sk = phrases["sketch"]
+        st.caption(f"Conteos estimados con Count-Min Sketch ({sk['profundidad']}×{sk['ancho']:,}) sobre "
+                   f"{sk['ngramas']:,} n-gramas: pueden sobreestimar hasta {sk['error_max']:,} menciones. "
+                   "`lift` > 1: frase más propia del área que del total.")
+    else:
+        st.info("No se encontraron comentarios de texto libre.")
+
+    st.markdown("---")
+    st.markdown("**Importancia relativa de drivers** (descuenta la colinealidad entre drivers; % del R² explicado)")
+    if len(kda_df):
+        st.dataframe(kda_df.head(top_n), use_container_width=True)
+        st.caption(f"R² del modelo: {kda_df.attrs.get('r2', float('nan')):.3f}")
+    else:
+        st.info("No hay drivers suficientes para el análisis de importancia relativa.")
+
+    st.markdown("---")
+    st.markdown("**Correlaciones por segmento** (driver × intención; negativo = protector, positivo = riesgo)")
+    seg_opts = {"Área": ("area",), "Cargo": ("rol",), "Área y cargo": ("area", "rol")}
+    seg_label = st.radio("Segmentar por", list(seg_opts.keys()), horizontal=True, key="seg_corr_by")
+    seg_df = results["segments"]
+    if seg_label != "Área":
+        try:
+            seg_df = correlate_by_segment(df_active, m_active, by=seg_opts[seg_label], min_responses=int(min_responses))
+        except Exception as e:
+            st.error(f"Error calculando correlaciones por segmento: {e}")
+            seg_df = pd.DataFrame()
+    if len(seg_df):
+        st.dataframe(seg_df, use_container_width=True)
+    else:
+        st.info("No hay segmentos con el mínimo de respuestas o faltan columnas de área/cargo.")
+
     st.markdown("---")
     st.markdown("**Riesgo por área (intención y eNPS/engagement)**")
-    if len(risk_df):
-        st.dataframe(risk_df, use_container_width=True)
+    dim_labels = {"area": "Área", "rol": "Cargo", "antiguedad": "Antigüedad", "periodo": "Mes"}
+    risk_by = st.multiselect("Cortar riesgo por", options=list(CUBE_DIMS), default=["area"],
+                             format_func=dim_labels.get, key="risk_cube_by")
+    risk_view = risk_df
+    if risk_cube is not None and risk_by and list(risk_by) != ["area"]:
+        risk_view = cube_risk(risk_cube, by=tuple(risk_by), min_responses=int(min_responses))
+    if len(risk_view):
+        st.dataframe(risk_view, use_container_width=True)
+        if "riesgo_%_error" in risk_view:
+            st.caption("Resultado aproximado: `riesgo_%` ± `riesgo_%_error` (IC 95%); `n` son las respuestas "
+                       "del área y `n_muestra` las usadas en el cálculo.")
+        elif results.get("aproximado"):
+            st.caption("Resultado aproximado: calculado sobre la muestra (`n` son respuestas de la muestra).")
     else:
         st.info("No hay suficientes datos por área o faltan columnas clave (área, intención, eNPS/engagement).")
 
+    st.markdown("---")
+    st.markdown("**Tendencias por área** (intención de salida y eNPS por semana o mes)")
+    trends = results.get("trends") or {}
+    if not trends.get("has_time"):
+        st.info("No se encontró la marca temporal en la encuesta de activos: no hay tendencias.")
+    else:
+        tcols = st.columns(3)
+        freq = tcols[0].radio("Periodo", ["M", "W"], format_func={"M": "Mensual", "W": "Semanal"}.get,
+                              horizontal=True, key="trend_freq")
+        metric = tcols[1].radio("Métrica", ["intent_media", "enps"],
+                                format_func={"intent_media": "Intención de salida", "enps": "eNPS"}.get,
+                                horizontal=True, key="trend_metric")
+        window = tcols[2].slider("Ventana móvil (periodos)", 1, 6, 1, key="trend_window")
+        trend_df = cube_trend(trends["cubes"][freq], by=("area",), window=window, min_responses=int(min_responses))
+        area_col = m_active.get("area") or "area"
+        if len(trend_df) and metric in trend_df and area_col in trend_df:
+            chart = trend_df.pivot(index="periodo", columns=area_col, values=metric)
+            st.line_chart(chart)
+            # Deterioro del último periodo frente al anterior (más intención o menos eNPS)
+            last_two = chart.ffill().tail(2)
+            if len(last_two) == 2:
+                delta = (last_two.iloc[1] - last_two.iloc[0]) * (1 if metric == "intent_media" else -1)
+                worse = delta[delta > 0].sort_values(ascending=False).head(3)
+                if len(worse):
+                    fmt, unit = (".1f", "pts eNPS") if metric == "enps" else (".3f", "de intención")
+                    st.caption("⚠️ Mayor deterioro en el último periodo: " + ", ".join(
+                        f"{area} ({worse[area]:{fmt}} {unit})" for area in worse.index))
+            with st.expander("Ver tabla de tendencias"):
+                if trends.get("fraccion_muestra"):
+                    st.caption(f"Resultado aproximado: `n` son respuestas de la muestra proporcional "
+                               f"({trends['fraccion_muestra']:.0%} de la población); los promedios y el eNPS "
+                               "no necesitan reescalarse.")
+                st.dataframe(trend_df, use_container_width=True)
+        else:
+            st.info("No hay periodos con el mínimo de respuestas por área.")
+
 
     st.markdown("---")
     st.subheader("🏢 Gestión Humana: KPIs, causas y capacidades")
-    try:
-        kpis_df, causas_df, pract_df, hr_text = hr_dashboard(df_hr, m_hr)
+    if "hr" in results["errores"]:
+        st.error(results["errores"]["hr"])
+    else:
+        kpis_df, causas_df, pract_df, hr_text = results["hr"]
         if len(kpis_df):
             st.markdown("**KPIs**")
             st.dataframe(kpis_df, use_container_width=True)
@@ -707,8 +599,6 @@ with TAB1:
             st.dataframe(pract_df.head(15), use_container_width=True)
         if hr_text:
             st.caption(hr_text[:1000])
-    except Exception as e:
-        st.error(f"Error en panel HR: {e}")
 
     # Conclusiones accionables
     st.markdown("---")
@@ -742,90 +632,249 @@ with TAB1:
 
     st.caption("*Contenido referencial; no reemplaza asesoría legal/SSO.*")
 
+# Panel del perfil: se llena al final, cuando ya se midió el render de los tabs
+profile_panel = st.sidebar.empty()
+
+with TAB1, profile_stage(run_profile, "render.conclusiones"):
+    render_conclusions(results, df_active, int(min_responses), top_n)
+
 # TAB 2 – CHAT EXPERTO
-with TAB2:
+
+CHAT_FIRST_TOKEN_TIMEOUT_S = float(os.environ.get("IA_CHAT_FIRST_TOKEN_TIMEOUT_S", "20"))
+CHAT_TIMEOUT_S = float(os.environ.get("IA_CHAT_TIMEOUT_S", "90"))
+CHAT_END_NOTES = {
+    "timeout": "⏱️ _Respuesta cortada: el modelo tardó demasiado._",
+    "cancelada": "⏹️ _Respuesta interrumpida por una nueva pregunta._",
+}
+
+# Comentarios de texto libre recuperados (BM25 local) y agregados al contexto de cada pregunta
+CHAT_COMMENTS_K = int(os.environ.get("IA_CHAT_COMMENTS_K", "8"))
+CHAT_COMMENTS_TOKENS = int(os.environ.get("IA_CHAT_COMMENTS_TOKENS", "600"))
+
+def comment_index() -> Dict[str, object]:
+    """Índice de comentarios de las encuestas cargadas; se construye una vez por huella
+    de datos en la caché compartida (en la primera pregunta, no en cada rerun)."""
+    key = ("comentarios", frame_fingerprint(df_active), frame_fingerprint(df_leaver), frame_fingerprint(df_hr))
+    frames = {"activos": df_active, "egresos": df_leaver, "hr": df_hr}
+    mappings = {"activos": results["m_active"], "egresos": results["m_leaver"], "hr": results["m_hr"]}
+    index, _ = cache_get_or_build(tenant_cache(), key, lambda: build_comment_index(frames, mappings),
+                                  tenant=email_usuario, size_of=index_bytes, ttl_s=ANALYTICS_TTL_S)
+    return index
+
+_MD_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|~$])")
+
+def _respondent_text(text: str) -> str:
+    """Texto escrito por encuestados, para markdown con HTML habilitado: se escapan el HTML
+    y la sintaxis markdown (enlaces, imágenes), así se muestra tal cual."""
+    return _MD_SPECIAL.sub(r"\\\1", html.escape(text, quote=False)).replace("\n", " ")
+
+def _close_pending_turn():
+    """Si el turno anterior quedó a medias (el usuario preguntó de nuevo mientras se
+    generaba), lo cancela y guarda en el historial lo que alcanzó a llegar."""
+    pending = st.session_state.pop("chat_pending", None)
+    if pending is None:
+        return
+    pending["cancel"].set()
+    m = pending["metrics"]
+    if m["estado"] == "pendiente":
+        m["estado"] = "cancelada"
+    note = CHAT_END_NOTES.get(m["estado"], "")
+    st.session_state.rot_chat_history.append(("assistant", (m["texto"] + "\n\n" + note).strip()))
+    st.session_state.chat_metrics = m
+
+@st.fragment
+def render_chat(base_context: Dict[str, object]):
+    t_turn = time.perf_counter()
     st.subheader("💬 Chat experto en fidelización y experiencia del colaborador")
 
     if "rot_chat_history" not in st.session_state:
         st.session_state.rot_chat_history = []
+    _close_pending_turn()
 
-    base_context = {
-        "active_cols": list(df_active.columns),
-        "leaver_cols": list(df_leaver.columns),
-        "hr_cols": list(df_hr.columns),
-        "m_active": m_active,
-        "m_leaver": m_leaver,
-        "m_hr": m_hr,
-        "corr_top": corr_df.tail(min(5, len(corr_df))).reset_index().to_dict(orient="records") if 'corr_df' in locals() and len(corr_df) else [],
-        "reasons_top": reasons_df.head(min(5, len(reasons_df))).to_dict(orient="records") if 'reasons_df' in locals() and len(reasons_df) else [],
-        "risk_top": risk_df.head(min(5, len(risk_df))).to_dict(orient="records") if 'risk_df' in locals() and len(risk_df) else [],
-    }
     # Historial
     for role, msg in st.session_state.rot_chat_history:
         with st.chat_message(role):
             st.markdown(msg)
 
+    streaming = st.toggle("Mostrar la respuesta mientras se genera", value=True, key="chat_stream")
     user_q = st.chat_input("Pregunta algo como: '¿qué quick wins implementar en 30 días?' o '¿cómo reducir salidas por liderazgo?'")
     if user_q:
         st.session_state.rot_chat_history.append(("user", user_q))
         with st.chat_message("user"):
             st.markdown(user_q)
 
-        answer = build_llm_answer(base_context, user_q)
-
+        t_search = time.perf_counter()
+        evidence = search_comments(comment_index(), user_q, k=CHAT_COMMENTS_K, budget_tokens=CHAT_COMMENTS_TOKENS)
+        t_search = (time.perf_counter() - t_search) * 1000
+        context = {**base_context, "comentarios_relevantes": evidence} if evidence else base_context
+        if evidence:
+            with st.expander(f"📝 {len(evidence)} comentarios usados como evidencia · {t_search:,.1f} ms"):
+                for hit in evidence:
+                    sources = ", ".join(f"{html.escape(src)} ×{n}" if len(hit["fuentes"]) > 1 else html.escape(src)
+                                        for src, n in hit["fuentes"].items())
+                    st.markdown(f"- {_respondent_text(hit['texto'])}  \n  <span class='small-note'>{sources} · "
+                                f"{hit['veces']} {'vez' if hit['veces'] == 1 else 'veces'}</span>", unsafe_allow_html=True)
+
+        llm = get_llm(OPENAI_API_KEY) if (OPENAI_API_KEY or FAKE_LLM) else None
+        # Las respuestas del cliente hechas con otros datos se descartan. La huella es sólo
+        # de los datos: cambiar parámetros del panel no purga (la clave ya los distingue)
+        data_fp = hashlib.sha1("|".join(frame_fingerprint(d) for d in (df_active, df_leaver, df_hr))
+                               .encode("utf-8")).hexdigest()
+        cache_args = {"cache": answer_cache(), "scope": email_usuario, "fingerprint": data_fp}
+        metrics = new_stream_metrics()
         with st.chat_message("assistant"):
-            st.markdown(answer)
+            if streaming:
+                # Si llega otra pregunta mientras se escribe, Streamlit corta este run y el
+                # siguiente cierra el turno con _close_pending_turn
+                st.session_state.chat_pending = {"cancel": threading.Event(), "metrics": metrics}
+                st.write_stream(stream_llm_answer(
+                    llm, context, user_q, metrics, cancel=st.session_state.chat_pending["cancel"],
+                    first_token_timeout_s=CHAT_FIRST_TOKEN_TIMEOUT_S, timeout_s=CHAT_TIMEOUT_S, **cache_args,
+                ))
+                st.session_state.pop("chat_pending", None)
+            else:
+                t0 = time.perf_counter()
+                answer, from_cache = build_llm_answer(llm, context, user_q, **cache_args)
+                ms = (time.perf_counter() - t0) * 1000
+                metrics.update({"texto": answer, "fragmentos": 1, "ttft_ms": ms, "total_ms": ms,
+                                "estado": "cache" if from_cache else "ok", "desde_cache": from_cache})
+                st.markdown(answer)
+            answer = metrics["texto"]
+            if metrics["estado"] in CHAT_END_NOTES:
+                answer = (answer + "\n\n" + CHAT_END_NOTES[metrics["estado"]]).strip()
+                st.markdown(CHAT_END_NOTES[metrics["estado"]])
         st.session_state.rot_chat_history.append(("assistant", answer))
+        st.session_state.chat_metrics = metrics
+        st.session_state.chat_turn_ms = (time.perf_counter() - t_turn) * 1000
+        st.caption(
+            f"Turno: {st.session_state.chat_turn_ms:,.0f} ms (solo se re-ejecutó el chat) · "
+            f"primer token {metrics['ttft_ms'] or 0:,.0f} ms · total {metrics['total_ms'] or 0:,.0f} ms · "
+            f"{metrics['fragmentos']} fragmentos"
+            + (" · ⚡ respuesta desde caché" if metrics["desde_cache"] else "")
+        )
+
+with TAB2, profile_stage(run_profile, "render.chat"):
+    render_chat(base_context)
 
 # TAB 3 – EXPLORAR ARCHIVOS
-with TAB3:
+
+EXPLORER_PAGE_SIZES = (20, 50, 100, 500)
+EXPLORER_MAX_OPTIONS = 200   # más valores distintos que esto → filtro por texto
+
+def explorer_index(df: pd.DataFrame) -> Tuple[Dict[str, object], Tuple]:
+    """Índice del explorador para ``df`` y su clave en la caché compartida, reutilizado
+    mientras los datos no cambien. Los índices por columna se agregan al usarlos: quien
+    lo usa actualiza el tamaño con ``cache_resize``."""
+    key = ("explorador", frame_fingerprint(df))
+    index, _ = cache_get_or_build(tenant_cache(), key, lambda: build_index(df), size_of=explorer_bytes)
+    return index, key
+
+@st.fragment
+def render_explorer(ds: Dict[str, pd.DataFrame]):
     st.subheader("👀 Ver/filtrar encuestas")
 
-    ds = {
-        "Activos": df_active,
-        "Egresos": df_leaver,
-        "Gestión Humana": df_hr,
-    }
     which = st.selectbox("Selecciona dataset", options=list(ds.keys()))
     df = ds[which]
 
     if len(df) == 0:
         st.warning("La fuente no tiene filas.")
     else:
-        max_preview = min(1000, len(df))
-        default_preview = min(20, max_preview)
-
-        if max_preview == 1:
-            n_preview = 1
-            st.caption("Mostrando 1 fila (no hay más para previsualizar).")
-        else:
-            n_preview = st.slider(
-                "Filas a mostrar (preview)",
-                min_value=1,
-                max_value=max_preview,
-                value=default_preview,
-                step=1,
-                key=f"slider_{which}",
-            )
-
+        index, index_key = explorer_index(df)
         cols_sel = st.multiselect(
             "Columnas a mostrar (opcional)",
             options=list(df.columns),
             default=list(df.columns)[:min(10, len(df.columns))],
             key=f"cols_{which}",
         )
-        view_df = df[cols_sel] if cols_sel else df
-        st.dataframe(view_df.head(n_preview), use_container_width=True)
+
+        predicates, sort = [], []
+        with st.expander("🔍 Filtros y orden"):
+            for col in st.multiselect("Filtrar por", options=list(df.columns), key=f"fcols_{which}"):
+                if column_kind(index, col) == "num":
+                    lo, hi = value_range(index, col)
+                    if lo is None or lo == hi:
+                        st.caption(f"{col}: sin rango para filtrar.")
+                        continue
+                    if isinstance(lo, pd.Timestamp):
+                        lo, hi = lo.to_pydatetime(), hi.to_pydatetime()
+                    sel = st.slider(col, min_value=lo, max_value=hi, value=(lo, hi), key=f"f_{which}_{col}")
+                    if sel != (lo, hi):
+                        predicates.append({"col": col, "op": "range", "min": sel[0], "max": sel[1]})
+                else:
+                    options = distinct_values(index, col)
+                    if len(options) <= EXPLORER_MAX_OPTIONS:
+                        vals = st.multiselect(col, options=options, key=f"f_{which}_{col}")
+                        if vals:
+                            predicates.append({"col": col, "op": "in", "values": vals})
+                    else:
+                        txt = st.text_input(f"{col} (contiene)", key=f"f_{which}_{col}")
+                        if txt.strip():
+                            predicates.append({"col": col, "op": "contains", "value": txt.strip()})
+            for col in st.multiselect("Ordenar por", options=list(df.columns), key=f"scols_{which}"):
+                desc = st.toggle(f"Descendente: {col}", key=f"sdesc_{which}_{col}")
+                sort.append((col, not desc))
+
+        positions = sort_positions(index, filter_positions(index, predicates), sort)
+        total = len(positions)
+
+        c1, c2 = st.columns(2)
+        page_size = c1.selectbox("Filas por página", options=EXPLORER_PAGE_SIZES, key=f"psize_{which}")
+        n_pages = max(1, -(-total // page_size))
+        page_key = f"page_{which}"
+        if st.session_state.get(page_key, 1) > n_pages:
+            st.session_state[page_key] = n_pages
+        page_no = c2.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1, key=page_key)
+        offset = (int(page_no) - 1) * page_size
+
+        page = page_rows(index, positions, offset, page_size, cols_sel or None)
+        st.caption(
+            f"Filas {min(offset + 1, total):,}–{min(offset + page_size, total):,} de {total:,}"
+            + (f" (filtradas de {len(df):,})" if predicates else "")
+        )
+        st.dataframe(page, use_container_width=True)
+        cache_resize(tenant_cache(), index_key, explorer_bytes(index))   # con los índices de columna ya creados
+
+        def export_view() -> pd.DataFrame:
+            view = df.iloc[positions] if (predicates or sort) else df
+            return view[cols_sel] if cols_sel else view
+
+        # El archivo se genera sólo al hacer clic (en otro hilo), con columnas, filtros y orden
+        fmt = st.selectbox(
+            "Formato de descarga",
+            options=list(EXPORT_FORMATS.keys()),
+            format_func=lambda f: EXPORT_FORMATS[f]["label"],
+            key=f"fmt_{which}",
+        )
+        spec = EXPORT_FORMATS[fmt]
         st.download_button(
-            f"⬇️ Descargar {which} (CSV)",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name=f"{slug(which)}.csv",
-            mime="text/csv",
+            f"⬇️ Descargar {which} ({spec['label']}, {total:,} filas)",
+            data=lambda: cached_export(export_view(), fmt, tenant=email_usuario),
+            file_name=f"{slug(which)}.{spec['ext']}",
+            mime=spec["mime"],
+            on_click="ignore",
             key=f"dl_{which}",
         )
 
+with TAB3, profile_stage(run_profile, "render.explorador"):
+    render_explorer({
+        "Activos": df_active,
+        "Egresos": df_leaver,
+        "Gestión Humana": df_hr,
+    })
+
 st.markdown("</div>", unsafe_allow_html=True)
 
+_log_profile()
+if show_profile:
+    with profile_panel.container(), st.expander("⏱️ Perfil por etapa", expanded=True):
+        prof_df = profile_table(run_profile)
+        st.dataframe(prof_df, use_container_width=True, hide_index=True)
+        st.caption(
+            f"Ejecución `{run_profile['id']}` · {time.time() - run_profile['inicio']:,.2f} s de pared · "
+            "memoria = RSS del proceso (delta al terminar y pico durante la etapa)"
+            + (f" · log: `{PROFILE_LOG}`" if PROFILE_LOG else "")
+        )
+
 st.markdown(
     """
     <div class='footer'>
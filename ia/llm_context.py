@@ -0,0 +1,209 @@
+"""Contexto compacto para el chat experto, con presupuesto de tokens (sin Streamlit).
+
+En vez de volcar columnas y mapeos completos (preguntas largas del formulario), arma
+secciones con agregados del diagnóstico usando las claves cortas de ``engine``
+(``carga_laboral``, ``compensacion``…):
+
+- ``drivers``: correlación con intención de salida (con IC si hay bootstrap) y peso KDA.
+- ``motivos``: razones de salida más mencionadas.
+- ``riesgo_areas``: áreas con mayor riesgo y sus palancas más bajas.
+- ``hr``: KPIs, causas percibidas y brechas de prácticas del panel HR.
+- ``segmentos``: drivers más fuertes por área.
+- ``frases``: frases más repetidas en los comentarios (marcando las que no caen en
+  ninguna categoría de motivos).
+
+Cada sección trae sus ítems ya ordenados por relevancia. Primero entra el mínimo de
+cada sección (en orden de prioridad) y luego se reparte el resto del presupuesto por
+turnos, un ítem por sección, hasta que no quepa más.
+"""
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from engine import slug
+
+DEFAULT_CONTEXT_TOKENS = 1500
+# (sección, ítems mínimos) en orden de prioridad
+CONTEXT_SECTIONS = (("resumen", 1), ("drivers", 5), ("motivos", 3), ("riesgo_areas", 3), ("hr", 3), ("segmentos", 0), ("frases", 0))
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """Tokens de ``text`` con tiktoken si está instalado; si no, ~4 caracteres por token."""
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    return (len(text) + 3) // 4
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _num(x, nd: int = 3) -> Optional[float]:
+    return None if x is None or pd.isna(x) else round(float(x), nd)
+
+def _short(col: str, inverse: Dict[str, str]) -> str:
+    """Clave corta de una columna: la de ``engine`` si está mapeada, si no un slug recortado."""
+    if col in inverse:
+        return inverse[col]
+    return slug(col).replace(" ", "_")[:32]
+
+def _inverse(mapping: Dict[str, str]) -> Dict[str, str]:
+    inv: Dict[str, str] = {}
+    for key, col in mapping.items():
+        inv.setdefault(col, key)
+    return inv
+
+# ---- Secciones (ítems ordenados por relevancia) ----
+
+def _summary_items(results: Dict[str, object]) -> List[Dict[str, object]]:
+    item: Dict[str, object] = {"filas": results.get("filas", {})}
+    if results.get("aproximado"):
+        ap = results["aproximado"]
+        item["aproximado"] = {"muestra": ap["n_muestra"], "total": ap["n_total"], "confianza": ap["confianza"]}
+    if results.get("errores"):
+        item["etapas_con_error"] = sorted(results["errores"])
+    return [item]
+
+def _driver_items(results: Dict[str, object]) -> List[Dict[str, object]]:
+    corr = results.get("corr")
+    if not isinstance(corr, pd.DataFrame) or corr.empty:
+        return []
+    kda = results.get("kda")
+    weights = kda["peso_relativo_%"] if isinstance(kda, pd.DataFrame) and "peso_relativo_%" in kda else pd.Series(dtype=float)
+    corr = corr.reindex(corr["correlacion_intencion"].abs().sort_values(ascending=False).index)
+    items = []
+    for driver, row in corr.iterrows():
+        item = {"driver": driver, "r": _num(row["correlacion_intencion"])}
+        if "ic_inferior" in row and pd.notna(row.get("ic_inferior")):
+            item["ic"] = [_num(row["ic_inferior"]), _num(row["ic_superior"])]
+        if "p_valor" in row and pd.notna(row.get("p_valor")):
+            item["p"] = _num(row["p_valor"], 4)
+        if driver in weights.index:
+            item["peso_%"] = _num(weights[driver], 1)
+        items.append(item)
+    return items
+
+def _reason_items(results: Dict[str, object]) -> List[Dict[str, object]]:
+    reasons = results.get("reasons")
+    if not isinstance(reasons, pd.DataFrame) or reasons.empty:
+        return []
+    return [{"motivo": r["categoria"], "menciones": int(r["menciones"]), "%": _num(r["peso_relativo_%"], 1)}
+            for _, r in reasons.iterrows()]
+
+def _risk_items(results: Dict[str, object], weakest: int = 3) -> List[Dict[str, object]]:
+    risk = results.get("risk")
+    m_active = results.get("m_active", {})
+    if not isinstance(risk, pd.DataFrame) or risk.empty or m_active.get("area") not in risk:
+        return []
+    inverse = _inverse(m_active)
+    avg_cols = [c for c in risk.columns if c.endswith("_avg")]
+    items = []
+    for _, r in risk.iterrows():
+        item = {"area": r[m_active["area"]], "n": int(r["n"]), "riesgo_%": _num(r.get("riesgo_%"), 1),
+                "intencion": _num(r.get("intent_media"))}
+        if pd.notna(r.get("riesgo_%_error", np.nan)):
+            item["riesgo_%_error"] = _num(r["riesgo_%_error"], 1)
+        lows = r[avg_cols].dropna().astype(float).nsmallest(weakest)
+        if len(lows):
+            item["palancas_bajas"] = {_short(c[:-len("_avg")], inverse): _num(v, 1) for c, v in lows.items()}
+        items.append(item)
+    return items
+
+def _hr_items(results: Dict[str, object], top: int = 5) -> List[Dict[str, object]]:
+    hr = results.get("hr")
+    if not isinstance(hr, tuple) or len(hr) < 3:
+        return []
+    kpis, causas, pract = hr[0], hr[1], hr[2]
+    items = []
+    if isinstance(kpis, pd.DataFrame) and len(kpis):
+        vals = {r["indicador"]: _num(r["valor"], 2) for _, r in kpis.iterrows() if pd.notna(r["valor"])}
+        if vals:
+            items.append({"kpis": vals})
+    if isinstance(causas, pd.DataFrame) and len(causas):
+        items.append({"causas_%acuerdo": {r["causa"]: _num(r["% acuerdo"], 1) for _, r in causas.head(top).iterrows()}})
+    if isinstance(pract, pd.DataFrame) and len(pract):
+        gaps = pract.sort_values("% sí/efectivo").head(top)
+        items.append({"brechas_practicas_%": {r["práctica"]: _num(r["% sí/efectivo"], 1) for _, r in gaps.iterrows()}})
+    return items
+
+def _segment_items(results: Dict[str, object], top: int = 3) -> List[Dict[str, object]]:
+    seg = results.get("segments")
+    if not isinstance(seg, pd.DataFrame) or seg.empty:
+        return []
+    drivers = seg.drop(columns=["n"], errors="ignore")
+    items = []
+    for area in seg.sort_values("n", ascending=False).index if "n" in seg else seg.index:
+        row = drivers.loc[area].dropna().astype(float)
+        strongest = row.reindex(row.abs().sort_values(ascending=False).index).head(top)
+        if len(strongest):
+            items.append({"area": area, "drivers": {k: _num(v) for k, v in strongest.items()}})
+    return items
+
+def _phrase_items(results: Dict[str, object]) -> List[Dict[str, object]]:
+    phrases = (results.get("phrases") or {}).get("global")
+    if not isinstance(phrases, pd.DataFrame) or phrases.empty:
+        return []
+    return [{"frase": r["frase"], "menciones": int(r["menciones"]), **({"emergente": True} if r["emergente"] else {})}
+            for _, r in phrases.iterrows()]
+
+_BUILDERS = {
+    "resumen": _summary_items,
+    "drivers": _driver_items,
+    "motivos": _reason_items,
+    "riesgo_areas": _risk_items,
+    "hr": _hr_items,
+    "segmentos": _segment_items,
+    "frases": _phrase_items,
+}
+
+def build_llm_context(results: Dict[str, object], budget_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                      sections=CONTEXT_SECTIONS) -> Tuple[Dict[str, object], Dict[str, object]]:
+    """Contexto para el LLM dentro de ``budget_tokens`` (medido sobre su JSON compacto).
+    Devuelve (contexto, reporte con tokens e ítems incluidos/disponibles por sección).
+    """
+    candidates = {name: _BUILDERS[name](results) for name, _ in sections}
+    taken = {name: 0 for name, _ in sections}
+
+    def _build() -> Dict[str, object]:
+        return {name: candidates[name][:taken[name]] for name, _ in sections if taken[name]}
+
+    def _try_add(name: str) -> bool:
+        if taken[name] >= len(candidates[name]):
+            return False
+        taken[name] += 1
+        if count_tokens(_dumps(_build())) > budget_tokens:
+            taken[name] -= 1
+            return False
+        return True
+
+    for name, minimum in sections:
+        for _ in range(minimum):
+            if not _try_add(name):
+                break
+    progress = True
+    while progress:
+        progress = False
+        for name, _ in sections:
+            progress = _try_add(name) or progress
+
+    context = _build()
+    report = {
+        "presupuesto": budget_tokens,
+        "total": count_tokens(_dumps(context)),
+        "tokenizador": "tiktoken" if _encoder() is not None else "aprox. 4 caracteres/token",
+        "secciones": {
+            name: {"tokens": count_tokens(_dumps({name: context[name]})) if name in context else 0,
+                   "items": taken[name], "disponibles": len(candidates[name])}
+            for name, _ in sections
+        },
+    }
+    return context, report
@@ -0,0 +1,105 @@
+"""Perfilado por etapa: tiempo de pared, filas procesadas y memoria (sin Streamlit).
+
+Un perfil es un dict (ver ``new_profile``) al que cada ``stage`` agrega una entrada:
+
+- ``segundos``: tiempo de pared de la etapa.
+- ``filas``: filas procesadas (las que indique quien llama).
+- ``mem_mb``: memoria residente (RSS) al terminar menos la del inicio.
+- ``mem_pico_mb``: RSS máxima durante la etapa menos la del inicio, muestreada por un
+  hilo cada ``SAMPLE_S`` segundos.
+
+La RSS es la del proceso: si varias sesiones calculan a la vez, sus deltas se mezclan.
+``append_jsonl`` agrega el perfil a un archivo JSONL (una línea por etapa) para
+analizarlo fuera de la app.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+SAMPLE_S = 0.005
+_PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_LOG_LOCK = threading.Lock()
+
+def rss_bytes() -> Optional[int]:
+    """Memoria residente actual del proceso; None si no se puede medir."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * _PAGE_BYTES
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+def new_profile(**meta) -> Dict[str, object]:
+    """Perfil vacío de una ejecución; ``meta`` (cliente, parámetros…) se copia a cada línea del log."""
+    return {"id": uuid.uuid4().hex[:12], "inicio": time.time(), "meta": meta,
+            "etapas": [], "lock": threading.Lock()}
+
+@contextmanager
+def stage(profile: Optional[Dict[str, object]], name: str, rows: Optional[int] = None):
+    """Mide el bloque como etapa ``name`` de ``profile`` (sin efecto si ``profile`` es None).
+    Entrega la entrada de la etapa: se puede fijar ``entrada["filas"]`` dentro del bloque."""
+    entry: Dict[str, object] = {"etapa": name, "filas": rows}
+    if profile is None:
+        yield entry
+        return
+    start = rss_bytes()
+    peak = [start or 0]
+    stop = threading.Event()
+
+    def _watch():
+        while not stop.wait(SAMPLE_S):
+            now = rss_bytes() or 0
+            if now > peak[0]:
+                peak[0] = now
+
+    watcher = threading.Thread(target=_watch, daemon=True) if start is not None else None
+    if watcher is not None:
+        watcher.start()
+    t0 = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["segundos"] = round(time.perf_counter() - t0, 4)
+        stop.set()
+        if watcher is not None:
+            watcher.join()
+            end = rss_bytes() or 0
+            entry["mem_mb"] = round((end - start) / 1e6, 1)
+            entry["mem_pico_mb"] = round((max(peak[0], end) - start) / 1e6, 1)
+        with profile["lock"]:
+            profile["etapas"].append(entry)
+
+def profile_rows(profile: Dict[str, object]) -> List[Dict[str, object]]:
+    """Una fila por etapa con el id y la metadata de la ejecución (formato del log)."""
+    with profile["lock"]:
+        stages = list(profile["etapas"])
+    return [{"ejecucion": profile["id"], "ts": round(profile["inicio"], 3), **profile["meta"], **entry}
+            for entry in stages]
+
+def profile_table(profile: Dict[str, object]) -> pd.DataFrame:
+    """Etapas en orden de término; primero las columnas comunes, luego las propias de cada etapa."""
+    cols = ["etapa", "segundos", "filas", "mem_mb", "mem_pico_mb"]
+    with profile["lock"]:
+        df = pd.DataFrame(list(profile["etapas"]))
+    return df.reindex(columns=cols + [c for c in df.columns if c not in cols])
+
+def append_jsonl(path: str, profile: Dict[str, object]) -> int:
+    """Agrega las etapas de ``profile`` a ``path`` (JSONL); devuelve las líneas escritas."""
+    rows = profile_rows(profile)
+    if not rows:
+        return 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in rows)
+    with _LOG_LOCK, open(path, "a", encoding="utf-8") as fh:
+        fh.write(payload)
+    return len(rows)
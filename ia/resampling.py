@@ -0,0 +1,104 @@
+"""Remuestreo bootstrap vectorizado para correlaciones driver–intención.
+
+Vive en un módulo aparte para que los procesos del pool puedan importar las
+funciones (el script de Streamlit se ejecuta como ``__main__``).
+"""
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Dict, Optional
+import numpy as np
+
+BOOTSTRAP_CHUNK = 250          # remuestreos por tarea (fija el stream de semillas)
+BOOTSTRAP_MAX_CELLS = 4_000_000  # tope de celdas de la matriz de pesos por lote
+POOL_MIN_WORK = 20_000_000       # filas × remuestreos a partir de las cuales conviene el pool
+POOL_GRACE_S = 0.5               # espera tras el plazo para recoger los bloques cortados
+
+_SHARED: Dict[str, object] = {}   # matriz de sumandos del proceso del pool (ver ``_init_worker``)
+
+def _design(X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Sumandos [m, x, x², y, y², xy] por fila (n × 6·drivers).
+    Centrar mejora la estabilidad numérica de las sumas (la correlación no cambia).
+    Los NaN se excluyen por pares, igual que ``DataFrame.corr``.
+    """
+    valid = ~np.isnan(X)
+    mask = valid.astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # drivers sin datos
+        Xc = np.where(valid, X - np.nanmean(X, axis=0), 0.0)
+    yc = (y - y.mean())[:, None]
+    Ym = mask * yc
+    return np.hstack([mask, Xc, Xc ** 2, Ym, Ym * yc, Xc * yc])
+
+def _bootstrap_corr_chunk(F: np.ndarray, n_resamples: int, seed: np.random.SeedSequence,
+                          deadline: Optional[float] = None) -> np.ndarray:
+    """Correlaciones bootstrap (remuestreos × drivers) para un bloque.
+    Cada lote de remuestreos se expresa como una matriz de conteos (lote × n) y se reduce
+    con un único producto matricial contra los sumandos ``F``; no hay bucle por driver.
+    Si se pasa ``deadline`` (``time.monotonic``) se corta entre lotes y se devuelven solo
+    los remuestreos terminados.
+    """
+    rng = np.random.default_rng(seed)
+    n, d = F.shape[0], F.shape[1] // 6
+
+    out = np.empty((n_resamples, d))
+    batch = max(1, min(n_resamples, BOOTSTRAP_MAX_CELLS // max(1, n)))
+    for start in range(0, n_resamples, batch):
+        if deadline is not None and time.monotonic() >= deadline:
+            return out[:start]
+        b = min(batch, n_resamples - start)
+        idx = rng.integers(0, n, size=(b, n))
+        idx += (np.arange(b) * n)[:, None]
+        W = np.bincount(idx.ravel(), minlength=b * n).reshape(b, n).astype(float)
+        cnt, sx, sxx, sy, syy, sxy = np.split(W @ F, 6, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = (cnt * sxy - sx * sy) / np.sqrt((cnt * sxx - sx ** 2) * (cnt * syy - sy ** 2))
+        out[start:start + b] = r
+    return out
+
+def _init_worker(X: np.ndarray, y: np.ndarray):
+    # Una sola copia de los datos por proceso, no una por tarea
+    _SHARED["F"] = _design(X, y)
+
+def _pool_chunk(n_resamples: int, seed: np.random.SeedSequence, deadline: Optional[float]) -> np.ndarray:
+    return _bootstrap_corr_chunk(_SHARED["F"], n_resamples, seed, deadline)
+
+def bootstrap_correlations(X: np.ndarray, y: np.ndarray, n_resamples: int = 1000, seed: int = 42,
+                           time_budget_s: Optional[float] = None, n_jobs: int = 1) -> np.ndarray:
+    """Matriz de correlaciones bootstrap (remuestreos × drivers).
+    Los remuestreos se reparten en bloques de ``BOOTSTRAP_CHUNK`` con semillas derivadas de
+    ``seed``, por lo que el resultado no depende de ``n_jobs`` (el pool de procesos solo se
+    usa en encuestas grandes). Si se agota ``time_budget_s`` cada bloque se corta en su
+    próximo lote (también en los procesos del pool) y se devuelven solo los remuestreos
+    terminados (puede ser una matriz vacía).
+    """
+    # time.monotonic es común a todos los procesos de la máquina: el pool respeta el mismo plazo
+    deadline = None if time_budget_s is None else time.monotonic() + time_budget_s
+    sizes = [min(BOOTSTRAP_CHUNK, n_resamples - i) for i in range(0, n_resamples, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    done: Dict[int, np.ndarray] = {}
+
+    if n_jobs > 1 and len(sizes) > 1 and X.shape[0] * n_resamples >= POOL_MIN_WORK:
+        ex = ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes)), initializer=_init_worker, initargs=(X, y))
+        try:
+            futs = {ex.submit(_pool_chunk, sz, sd, deadline): i for i, (sz, sd) in enumerate(zip(sizes, seeds))}
+            # Tras el plazo los bloques en curso terminan su lote y devuelven lo hecho
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic()) + POOL_GRACE_S
+            try:
+                for fut in as_completed(futs, timeout=remaining):
+                    done[futs[fut]] = fut.result()
+            except FuturesTimeout:
+                pass
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+    else:
+        F = _design(X, y)
+        for i, (sz, sd) in enumerate(zip(sizes, seeds)):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            done[i] = _bootstrap_corr_chunk(F, sz, sd, deadline)
+
+    parts = [done[i] for i in sorted(done) if len(done[i])]
+    if not parts:
+        return np.empty((0, X.shape[1]))
+    return np.vstack(parts)
@@ -0,0 +1,162 @@
+"""Índice BM25 local sobre los comentarios de texto libre de las tres encuestas
+(sin Streamlit ni servicios externos).
+
+Los comentarios idénticos se indexan una vez, con sus repeticiones por fuente
+(``encuesta.campo``): un mismo texto puede venir de varios campos o encuestas. Los
+postings se guardan en formato CSR por término con el peso BM25 ya calculado, así una
+consulta es sumar unos pocos arreglos de numpy: milisegundos con 100k comentarios.
+
+Tokenización: minúsculas sin tildes, sin stopwords en español y sin la ``s`` final
+(plural simple), para que "salarios" y "salario" coincidan.
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from engine import COMMENT_KEYS, SPANISH_STOPWORDS, _ACCENTS, _as_plain
+from llm_context import count_tokens
+
+# Campos de texto libre por encuesta (claves de los mapeos de ``engine``)
+COMMENT_FIELDS = {survey: list(keys) for survey, keys in COMMENT_KEYS.items()}
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_COMMENT_CHARS = 300     # los comentarios más largos se recortan al devolverlos
+
+_LETTERS = "a-z0-9áàäâéèëêíìïîóòöôúùüûñ"
+_WORD = re.compile(f"[{_LETTERS}]+")
+_WORD_OR_SEP = re.compile(f"[{_LETTERS}]+|\x01")
+
+def _term(word: str) -> Optional[str]:
+    word = word.translate(_ACCENTS)
+    if len(word) < 2 or word in SPANISH_STOPWORDS:
+        return None
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+def tokenize(text: str) -> List[str]:
+    terms = (_term(w) for w in _WORD.findall(text.lower()))
+    return [t for t in terms if t]
+
+def _tokenize_corpus(texts) -> tuple:
+    """Tokeniza todos los textos de una vez: (id de documento, id de término) por token y
+    el vocabulario. Las reglas de ``_term`` se aplican sólo a las palabras distintas."""
+    joined = "\x01".join(t.replace("\x01", " ") for t in texts).lower()
+    raw_codes, raw_words = pd.factorize(np.array(_WORD_OR_SEP.findall(joined), dtype=object))
+    is_sep = np.isin(raw_codes, np.flatnonzero(raw_words == "\x01"))
+    word_term, vocab = pd.factorize(np.array([_term(w) if w != "\x01" else None for w in raw_words], dtype=object),
+                                    use_na_sentinel=True)
+    token_term = word_term[raw_codes]
+    keep = (token_term >= 0) & ~is_sep
+    doc_ids = np.cumsum(is_sep)[keep]
+    return doc_ids, token_term[keep], vocab
+
+def _collect(frames: Dict[str, pd.DataFrame], mappings: Dict[str, Dict[str, Optional[str]]],
+             fields: Dict[str, List[str]]) -> pd.DataFrame:
+    parts = []
+    for survey, keys in fields.items():
+        df, m = frames.get(survey), mappings.get(survey, {})
+        if df is None:
+            continue
+        for key in keys:
+            col = m.get(key)
+            if not col or col not in df.columns:
+                continue
+            s = _as_plain(df[col]).dropna().astype(str).str.strip()
+            s = s[s.str.len() > 2]
+            parts.append(pd.DataFrame({"texto": s.to_numpy(), "fuente": f"{survey}.{key}"}))
+    if not parts:
+        return pd.DataFrame({"texto": pd.Series(dtype=object), "fuente": pd.Series(dtype=object)})
+    return pd.concat(parts, ignore_index=True)
+
+def build_comment_index(frames: Dict[str, pd.DataFrame], mappings: Dict[str, Dict[str, Optional[str]]],
+                        fields: Dict[str, List[str]] = COMMENT_FIELDS, k1: float = BM25_K1,
+                        b: float = BM25_B) -> Dict[str, object]:
+    """Índice BM25 de los comentarios de ``frames`` (``{"activos": df, ...}``) según ``mappings``."""
+    raw = _collect(frames, mappings, fields)
+    codes, texts = pd.factorize(raw["texto"])
+    counts = np.bincount(codes, minlength=len(texts)) if len(codes) else np.zeros(0, dtype=np.int64)
+    # Repeticiones por (texto, fuente) agrupadas por texto (CSR): fuentes de cada texto
+    src, sources = pd.factorize(raw["fuente"])
+    n_src = max(len(sources), 1)
+    src_pair, src_counts = np.unique(codes.astype(np.int64) * n_src + src, return_counts=True)
+    src_doc, src_codes = np.divmod(src_pair, n_src)
+    src_offsets = np.concatenate([[0], np.cumsum(np.bincount(src_doc, minlength=len(texts)))])
+
+    n_docs = len(texts)
+    doc_ids, term_ids, vocab = _tokenize_corpus(texts)
+    lengths = np.bincount(doc_ids, minlength=n_docs)
+
+    # Frecuencia de cada (documento, término), ordenada por término → postings CSR
+    n_terms = len(vocab)
+    pair, tf = np.unique(term_ids.astype(np.int64) * max(n_docs, 1) + doc_ids, return_counts=True)
+    post_term, post_doc = np.divmod(pair, max(n_docs, 1))
+    doc_freq = np.bincount(post_term, minlength=n_terms)
+    offsets = np.concatenate([[0], np.cumsum(doc_freq)])
+
+    avgdl = lengths.mean() if n_docs and lengths.sum() else 1.0
+    idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = tf + k1 * (1 - b + b * lengths[post_doc] / avgdl)
+    weights = (idf[post_term] * tf * (k1 + 1) / norm).astype(np.float32)
+
+    return {
+        "texts": list(texts),
+        "counts": counts.astype(np.int32),
+        "src_offsets": src_offsets,
+        "src_codes": src_codes.astype(np.int16),
+        "src_counts": src_counts.astype(np.int32),
+        "sources": list(sources),
+        "vocab": {w: i for i, w in enumerate(vocab)},
+        "offsets": offsets,
+        "post_doc": post_doc.astype(np.int32),
+        "weights": weights,
+        "n_docs": n_docs,
+        "n_comments": len(raw),
+    }
+
+def index_bytes(index: Dict[str, object]) -> int:
+    """Bytes aproximados del índice (texto + arreglos + vocabulario)."""
+    arrays = sum(index[k].nbytes for k in ("counts", "src_offsets", "src_codes", "src_counts", "offsets", "post_doc", "weights"))
+    text = sum(len(t) + 49 for t in index["texts"])
+    vocab = sum(len(w) + 49 + 100 for w in index["vocab"])
+    return arrays + text + vocab
+
+def search_comments(index: Dict[str, object], query: str, k: int = 8,
+                    budget_tokens: Optional[int] = None) -> List[Dict[str, object]]:
+    """Hasta ``k`` comentarios más relevantes para ``query`` (mayor BM25; en empate, el más
+    repetido), cortando cuando el JSON de los resultados pasaría de ``budget_tokens``. Cada
+    resultado lleva ``fuentes``: repeticiones por fuente, de mayor a menor."""
+    ids = sorted({index["vocab"][w] for w in tokenize(query) if w in index["vocab"]})
+    if not ids or not index["n_docs"]:
+        return []
+    scores = np.zeros(index["n_docs"], dtype=np.float32)
+    offsets, post_doc, weights = index["offsets"], index["post_doc"], index["weights"]
+    for t in ids:
+        lo, hi = offsets[t], offsets[t + 1]
+        scores[post_doc[lo:hi]] += weights[lo:hi]   # un documento aparece una vez por término
+
+    cand = np.flatnonzero(scores)
+    if len(cand) > 4 * k:
+        cand = cand[np.argpartition(scores[cand], -4 * k)[-4 * k:]]
+    cand = cand[np.lexsort((-index["counts"][cand], -scores[cand]))][:k]
+
+    hits, used = [], 2
+    for d in cand:
+        text = index["texts"][d]
+        lo, hi = index["src_offsets"][d], index["src_offsets"][d + 1]
+        by_source = sorted(zip(index["src_codes"][lo:hi].tolist(), index["src_counts"][lo:hi].tolist()),
+                           key=lambda sc: -sc[1])
+        hit = {
+            "texto": text if len(text) <= MAX_COMMENT_CHARS else text[:MAX_COMMENT_CHARS].rsplit(" ", 1)[0] + "…",
+            "fuentes": {index["sources"][c]: n for c, n in by_source},
+            "veces": int(index["counts"][d]),
+            "score": round(float(scores[d]), 3),
+        }
+        if budget_tokens is not None:
+            cost = count_tokens(json.dumps(hit, ensure_ascii=False, separators=(",", ":"))) + 1
+            if used + cost > budget_tokens:
+                break
+            used += cost
+        hits.append(hit)
+    return hits
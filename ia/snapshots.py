@@ -0,0 +1,178 @@
+"""Snapshots compartidos de tablas en Arrow IPC, mapeados en memoria (sin Streamlit).
+
+Con varios procesos de Streamlit en la misma máquina, cada tabla se descarga y parsea
+una sola vez: el primer proceso la escribe en ``<raíz>/<clave>/<versión>.arrow`` y
+todos la abren con ``pa.memory_map``. Texto (``large_string`` → ``string[pyarrow]``)
+y números quedan respaldados por el archivo mapeado, así que la memoria es la caché
+de páginas del SO compartida; sólo los códigos de las columnas ``category`` se copian.
+Los frames devueltos son de sólo lectura.
+
+- Cambio atómico: la versión vigente la indica el archivo ``CURRENT``, que se
+  reemplaza con ``os.replace`` después de escribir (también atómico) el ``.arrow``.
+- Limpieza por referencias: al abrir una versión el proceso deja un lease
+  ``leases/<versión>.<pid>``; una versión que ya no es la vigente se borra cuando no
+  quedan leases de procesos vivos.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock, dos procesos pueden escribir la misma versión
+    fcntl = None
+
+SNAPSHOT_META_KEY = b"ia_snapshot"
+_STRING_DTYPE = pd.StringDtype("pyarrow")
+
+def _tenant_dir(root: str, key: str) -> str:
+    return os.path.join(root, key)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _to_table(df: pd.DataFrame, meta: Dict[str, object]) -> pa.Table:
+    """Tabla Arrow lista para leerse sin copias: texto en ``large_string`` y floats con NaN
+    como valor (no como nulo), que es lo que ``to_pandas`` puede envolver tal cual."""
+    base = pa.Table.from_pandas(df, preserve_index=False)
+    cols = []
+    for field, col in zip(base.schema, base.columns):
+        if field.type == pa.string():
+            col = col.cast(pa.large_string())
+        elif pa.types.is_floating(field.type):
+            col = pa.chunked_array([pa.array(df[field.name].to_numpy(), from_pandas=False)])
+        cols.append(col)
+    metadata = dict(base.schema.metadata or {})
+    metadata[SNAPSHOT_META_KEY] = json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")
+    return pa.table(cols, names=base.column_names).replace_schema_metadata(metadata)
+
+def write_snapshot(root: str, key: str, df: pd.DataFrame, meta: Optional[Dict[str, object]] = None) -> str:
+    """Escribe ``df`` como nueva versión de ``key`` y la publica. Devuelve la versión."""
+    tdir = _tenant_dir(root, key)
+    os.makedirs(os.path.join(tdir, "leases"), exist_ok=True)
+    version = f"{time.time_ns()}-{os.getpid()}"
+    meta = {**(meta or {}), "creado": time.time(), "version": version}
+    table = _to_table(df, meta)
+
+    path = os.path.join(tdir, f"{version}.arrow")
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+    pointer = os.path.join(tdir, "CURRENT")
+    with open(pointer + f".{os.getpid()}.tmp", "w", encoding="utf-8") as fh:
+        fh.write(version)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(pointer + f".{os.getpid()}.tmp", pointer)
+    cleanup_snapshots(root, key)
+    return version
+
+def current_version(root: str, key: str) -> Optional[str]:
+    try:
+        with open(os.path.join(_tenant_dir(root, key), "CURRENT"), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def open_snapshot(root: str, key: str, max_age_s: Optional[float] = None) -> Optional[Tuple[pd.DataFrame, Dict[str, object]]]:
+    """Abre la versión vigente de ``key`` (mapeada en memoria) o ``None`` si no hay o venció.
+    Devuelve (frame de sólo lectura, metadatos guardados con ``write_snapshot``).
+    """
+    version = current_version(root, key)
+    if version is None:
+        return None
+    tdir = _tenant_dir(root, key)
+    try:
+        source = pa.memory_map(os.path.join(tdir, f"{version}.arrow"), "r")
+    except FileNotFoundError:
+        return None
+    table = pa.ipc.open_file(source).read_all()
+    meta = json.loads((table.schema.metadata or {}).get(SNAPSHOT_META_KEY, b"{}"))
+    if max_age_s is not None and time.time() - meta.get("creado", 0) > max_age_s:
+        return None
+
+    # Lease de esta versión; los de versiones anteriores de este proceso ya no hacen falta
+    pid = os.getpid()
+    leases = os.path.join(tdir, "leases")
+    os.makedirs(leases, exist_ok=True)
+    for name in os.listdir(leases):
+        if name.endswith(f".{pid}") and not name.startswith(version + "."):
+            _remove(os.path.join(leases, name))
+    open(os.path.join(leases, f"{version}.{pid}"), "a").close()
+
+    df = table.to_pandas(split_blocks=True, types_mapper={pa.large_string(): _STRING_DTYPE}.get)
+    return df, meta
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def cleanup_snapshots(root: str, key: str) -> int:
+    """Borra las versiones no vigentes sin leases de procesos vivos. Devuelve cuántas borró."""
+    tdir = _tenant_dir(root, key)
+    current = current_version(root, key)
+    leases = os.path.join(tdir, "leases")
+    holders: Dict[str, int] = {}
+    for name in os.listdir(leases) if os.path.isdir(leases) else []:
+        version, _, pid = name.rpartition(".")
+        if pid.isdigit() and _pid_alive(int(pid)):
+            holders[version] = holders.get(version, 0) + 1
+        else:
+            _remove(os.path.join(leases, name))
+    removed = 0
+    for name in os.listdir(tdir):
+        if not name.endswith(".arrow"):
+            continue
+        version = name[:-len(".arrow")]
+        if version != current and not holders.get(version):
+            _remove(os.path.join(tdir, name))
+            removed += 1
+    return removed
+
+@contextmanager
+def _tenant_lock(root: str, key: str):
+    """Lock de archivo por clave: un solo proceso descarga y escribe a la vez."""
+    os.makedirs(_tenant_dir(root, key), exist_ok=True)
+    with open(os.path.join(_tenant_dir(root, key), ".lock"), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+def load_or_build(root: str, key: str, build, max_age_s: Optional[float] = None) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Snapshot vigente de ``key`` o, si no hay, ``build() -> (df, meta)`` escrito y reabierto.
+    Si la tabla no se puede representar en Arrow (p. ej. columnas con tipos mezclados),
+    devuelve el frame construido sin compartirlo.
+    """
+    snap = open_snapshot(root, key, max_age_s)
+    if snap is not None:
+        return snap
+    with _tenant_lock(root, key):
+        # Otro proceso pudo haberlo escrito mientras esperábamos el lock
+        snap = open_snapshot(root, key, max_age_s)
+        if snap is not None:
+            return snap
+        df, meta = build()
+        try:
+            write_snapshot(root, key, df, meta)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return df, {**meta, "compartido": False}
+    return open_snapshot(root, key)
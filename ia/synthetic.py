@@ -0,0 +1,206 @@
+"""Encuestas sintéticas (activos, egresos y Gestión Humana) para benchmarks y pruebas
+(sin Streamlit).
+
+Los encabezados son exactamente los primeros de ``*_REQUIRED``/``*_OPTIONAL`` en
+``engine``, así ``map_cols`` los reconoce sin fuzzy. Las respuestas salen de un
+compromiso latente por persona (más un efecto por área): los drivers Likert, el eNPS y
+la intención de salida están correlacionados como en una encuesta real, y los
+comentarios mencionan más los temas de los drivers peor evaluados. Todo es vectorizado
+con numpy: 1M de activos en ~10 s.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    ACTIVE_OPTIONAL, ACTIVE_REQUIRED, ACTIVE_TEXT_KEYS, HR_OPTIONAL, HR_REQUIRED,
+    LEAVER_OPTIONAL, LEAVER_REQUIRED, LEAVER_TEXT_KEYS,
+)
+
+LIKERT = ["Totalmente en desacuerdo", "En desacuerdo", "Ni de acuerdo ni en desacuerdo", "De acuerdo", "Totalmente de acuerdo"]
+AREAS = ["Ventas", "Operaciones", "TI", "Finanzas", "RRHH", "Logística", "Servicio al cliente", "Marketing"]
+AREA_WEIGHTS = [0.22, 0.25, 0.12, 0.08, 0.05, 0.12, 0.11, 0.05]
+ROLES = ["Operario", "Analista", "Asesor", "Coordinador", "Jefe", "Gerente"]
+ROLE_WEIGHTS = [0.3, 0.25, 0.2, 0.12, 0.1, 0.03]
+TENURES = ["Menos de 6 meses", "6 meses a 1 año", "1 a 3 años", "3 a 5 años", "Más de 5 años"]
+MISSING_RATE = 0.03
+
+# Frases de comentario por tema (los temas de ``KEYWORDS_BUCKETS``)
+THEME_PHRASES = {
+    "compensacion": ["el salario no es competitivo", "mejor sueldo", "un bono por resultados", "pago justo frente al mercado"],
+    "beneficios": ["más beneficios para la familia", "auxilio de transporte", "mejores prestaciones"],
+    "liderazgo": ["mi jefe no da feedback", "mejor trato de los líderes", "más reconocimiento del jefe"],
+    "carrera": ["falta de crecimiento", "un plan de carrera claro", "oportunidades de desarrollo y ascenso"],
+    "carga": ["mucha carga laboral y estrés", "demasiadas horas extra", "turnos muy pesados"],
+    "flexibilidad": ["más flexibilidad de horario", "teletrabajo algunos días", "modalidad híbrida"],
+    "ambiente": ["buen ambiente de equipo", "el clima laboral", "más respeto entre compañeros"],
+    "comunicacion": ["mejor comunicación interna", "más transparencia de la dirección"],
+    "herramientas": ["herramientas y software obsoletos", "faltan recursos para trabajar"],
+}
+# Driver de activos que empuja cada tema cuando está mal evaluado
+THEME_DRIVERS = {
+    "compensacion": "compensacion", "beneficios": "beneficios_adecuados", "liderazgo": "jefe_respeto",
+    "carrera": "crecimiento", "carga": "carga_laboral", "flexibilidad": "desconexion",
+    "ambiente": "respeto_equipo", "comunicacion": "comunicacion", "herramientas": "herramientas",
+}
+LEAVER_REASONS = [
+    "Mejor oferta salarial", "Falta de crecimiento profesional", "Mala relación con el jefe",
+    "Sobrecarga laboral", "Horario poco flexible", "Motivos personales", "Reubicación familiar",
+    "Ambiente laboral", "Estudios",
+]
+LEAVER_REASON_WEIGHTS = [0.26, 0.18, 0.14, 0.12, 0.08, 0.08, 0.05, 0.06, 0.03]
+HARD_PROFILES = ["Desarrolladores", "Conductores", "Técnicos de mantenimiento", "Asesores comerciales", "Enfermeras", "Analistas de datos"]
+HR_ACTIONS = ["Revisión salarial", "Escuela de líderes", "Plan de carrera", "Teletrabajo parcial", "Programa de reconocimiento", "Bienestar y salud mental"]
+# Respuestas de sí/no y acuerdo tal como llegan de formularios distintos
+HR_YES_NO = ["Sí", "No", "Si", "De acuerdo", "En desacuerdo", "Totalmente de acuerdo", "Totalmente en desacuerdo",
+             "Ni de acuerdo ni en desacuerdo", "No aplica", "1", "0"]
+
+def _header(spec: Dict[str, list], key: str) -> str:
+    return spec[key][0]
+
+def _with_missing(values: np.ndarray, rng: np.random.Generator, rate: float = MISSING_RATE) -> np.ndarray:
+    out = values.astype(object)
+    out[rng.random(len(out)) < rate] = None
+    return out
+
+def _likert(score: np.ndarray, rng: np.random.Generator, noise: float = 0.9) -> np.ndarray:
+    """Respuesta Likert 1-5 en texto a partir de un puntaje continuo centrado en 0."""
+    level = np.clip(np.rint(3.2 + score + rng.normal(scale=noise, size=len(score))), 1, 5).astype(np.int8)
+    return _with_missing(np.asarray(LIKERT, dtype=object)[level - 1], rng)
+
+def _timestamps(n: int, rng: np.random.Generator, start: str = "2024-01-01", days: int = 365) -> np.ndarray:
+    secs = np.sort(rng.integers(0, days * 86400, n))
+    return (pd.Timestamp(start) + pd.to_timedelta(secs, unit="s")).strftime("%d/%m/%Y %H:%M:%S").to_numpy()
+
+def _comments(n: int, rng: np.random.Generator, weights: Optional[np.ndarray] = None,
+              empty_rate: float = 0.25) -> np.ndarray:
+    """Comentarios de 1-2 frases; ``weights`` (n × temas) sesga el tema de cada persona."""
+    themes = list(THEME_PHRASES)
+    if weights is None:
+        first = rng.integers(0, len(themes), n)
+    else:
+        cum = np.cumsum(weights / weights.sum(axis=1, keepdims=True), axis=1)
+        first = np.minimum((cum < rng.random((n, 1))).sum(axis=1), len(themes) - 1)
+    second = rng.integers(0, len(themes), n)
+    pool = np.array([p for t in themes for p in THEME_PHRASES[t]], dtype=object)
+    start = np.cumsum([0] + [len(THEME_PHRASES[t]) for t in themes])
+    size = np.diff(start)
+
+    def _pick(theme_idx: np.ndarray, phrases: np.ndarray = pool) -> np.ndarray:
+        return phrases[start[theme_idx] + rng.integers(0, 1 << 30, len(theme_idx)) % size[theme_idx]]
+
+    text = _pick(first, np.array([p[0].upper() + p[1:] for p in pool], dtype=object))
+    two = rng.random(n) < 0.4
+    text[two] = text[two] + np.where(rng.random(int(two.sum())) < 0.5, " y ", ", también ") + _pick(second[two])
+    text[rng.random(n) < empty_rate] = None
+    return text
+
+def make_active(n: int, seed: int = 0) -> pd.DataFrame:
+    """Encuesta de planta activa con ``n`` respuestas."""
+    rng = np.random.default_rng(seed)
+    area_idx = rng.choice(len(AREAS), n, p=AREA_WEIGHTS)
+    area_effect = rng.normal(scale=0.5, size=len(AREAS))
+    engagement = rng.normal(size=n) + area_effect[area_idx]
+
+    cols: Dict[str, object] = {
+        _header(ACTIVE_REQUIRED, "id"): _timestamps(n, rng),
+        _header(ACTIVE_REQUIRED, "area"): _with_missing(np.asarray(AREAS, dtype=object)[area_idx], rng, 0.01),
+        _header(ACTIVE_REQUIRED, "rol"): rng.choice(np.asarray(ROLES, dtype=object), n, p=ROLE_WEIGHTS),
+        _header(ACTIVE_REQUIRED, "intencion_salida"): _likert(-0.9 * engagement, rng),
+    }
+    scores: Dict[str, np.ndarray] = {}
+    for key in ACTIVE_OPTIONAL:
+        h = _header(ACTIVE_OPTIONAL, key)
+        if h in cols or key in ACTIVE_TEXT_KEYS:
+            continue
+        if key == "intencion_salida_aux":
+            p_yes = 1 / (1 + np.exp(1.0 + 1.5 * engagement))
+            cols[h] = _with_missing(np.where(rng.random(n) < p_yes, "Sí", "No"), rng)
+        elif key == "preferencia_quedar":
+            cols[h] = _likert(0.8 * engagement, rng)
+        elif key == "antiguedad":
+            cols[h] = _with_missing(rng.choice(np.asarray(TENURES, dtype=object), n, p=[0.15, 0.15, 0.3, 0.2, 0.2]), rng)
+        elif key == "satisfaccion_general":
+            nps = np.clip(np.rint(7.2 + 1.8 * engagement + rng.normal(scale=1.2, size=n)), 0, 10).astype(np.int8)
+            cols[h] = _with_missing(nps.astype(str), rng)
+        else:
+            # Cada driver carga distinto en el compromiso: unos pesan más en la intención que otros
+            scores[key] = rng.uniform(0.2, 0.9) * engagement + rng.normal(scale=0.6, size=n)
+            cols[h] = _likert(scores[key], rng)
+
+    themes = list(THEME_PHRASES)
+    weights = np.column_stack([np.exp(-scores[THEME_DRIVERS[t]]) if THEME_DRIVERS[t] in scores else np.ones(n)
+                               for t in themes])
+    for key in ACTIVE_TEXT_KEYS:
+        cols[_header(ACTIVE_OPTIONAL, key)] = _comments(n, rng, weights, empty_rate=0.2 if key != "comentario_adicional" else 0.6)
+    return pd.DataFrame(cols)
+
+def make_leaver(n: int, seed: int = 0) -> pd.DataFrame:
+    """Encuesta de egreso con ``n`` respuestas."""
+    rng = np.random.default_rng(seed + 1)
+    cols: Dict[str, object] = {
+        _header(LEAVER_REQUIRED, "motivo_salida"): _with_missing(
+            rng.choice(np.asarray(LEAVER_REASONS, dtype=object), n, p=LEAVER_REASON_WEIGHTS), rng, 0.01),
+        _header(LEAVER_OPTIONAL, "area"): _with_missing(rng.choice(np.asarray(AREAS, dtype=object), n, p=AREA_WEIGHTS), rng),
+        _header(LEAVER_OPTIONAL, "rol"): rng.choice(np.asarray(ROLES, dtype=object), n, p=ROLE_WEIGHTS),
+        _header(LEAVER_OPTIONAL, "antiguedad_meses"): _with_missing(
+            np.char.add(np.clip(rng.gamma(1.5, 14, n), 1, 240).astype(int).astype(str), " meses"), rng),
+        _header(LEAVER_OPTIONAL, "nps"): _with_missing(
+            np.clip(np.rint(rng.normal(5.0, 2.6, n)), 0, 10).astype(np.int8).astype(str), rng),
+    }
+    for key in LEAVER_TEXT_KEYS:
+        cols[_header(LEAVER_OPTIONAL, key)] = _comments(n, rng, empty_rate=0.3)
+    return pd.DataFrame(cols)
+
+def make_hr(n: int, seed: int = 0) -> pd.DataFrame:
+    """Encuesta de Gestión Humana con ``n`` respuestas (una por empresa en un consolidado)."""
+    rng = np.random.default_rng(seed + 2)
+    headcount = np.rint(rng.lognormal(5.5, 1.0, n)).astype(int) + 10
+
+    def _number(values: np.ndarray, decimals: int = 0) -> np.ndarray:
+        text = np.round(values, decimals).astype(str) if decimals else values.astype(int).astype(str)
+        comma = rng.random(n) < 0.3     # "12,5" como en formularios en español
+        text = np.where(comma, np.char.replace(text.astype(str), ".", ","), text)
+        return _with_missing(text, rng)
+
+    cols: Dict[str, object] = {_header(HR_REQUIRED, "marca"): _timestamps(n, rng)}
+    for key in HR_OPTIONAL:
+        h = _header(HR_OPTIONAL, key)
+        if key == "headcount":
+            cols[h] = _number(headcount)
+        elif key == "rotacion_6m":
+            cols[h] = _number(rng.gamma(2.0, 6.0, n), 1)
+        elif key == "hr_headcount":
+            cols[h] = _number(np.maximum(1, headcount * rng.uniform(0.01, 0.04, n)))
+        elif key == "vacantes_mes":
+            cols[h] = _number(np.maximum(0, headcount * rng.uniform(0.0, 0.05, n)))
+        elif key == "perfiles_dificiles":
+            cols[h] = _with_missing(rng.choice(np.asarray(HARD_PROFILES, dtype=object), n), rng, 0.1)
+        elif key in ("acciones_6m", "factores_desajuste"):
+            picks = rng.choice(np.asarray(HR_ACTIONS, dtype=object), (n, 2))
+            cols[h] = _with_missing(picks[:, 0] + ", " + picks[:, 1], rng, 0.1)
+        elif key == "percepcion_rotacion":
+            cols[h] = _with_missing(rng.choice(np.asarray(["Alta", "Normal para el sector", "Baja"], dtype=object), n), rng)
+        else:
+            # Cada práctica tiene su propia tasa de adopción por empresa
+            p_yes = rng.uniform(0.2, 0.8)
+            yes = rng.random(n) < p_yes
+            style = rng.integers(0, 4, n)
+            answer = np.where(yes, np.take(["Sí", "Si", "De acuerdo", "Totalmente de acuerdo"], style),
+                              np.take(["No", "En desacuerdo", "Totalmente en desacuerdo", "0"], style)).astype(object)
+            odd = rng.random(n) < 0.05
+            answer[odd] = rng.choice(np.asarray(HR_YES_NO, dtype=object), int(odd.sum()))
+            cols[h] = _with_missing(answer, rng)
+    return pd.DataFrame(cols)
+
+def make_surveys(n: int, seed: int = 0, leaver_ratio: float = 0.15,
+                 hr_rows: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """Las tres encuestas de un cliente con ``n`` activos: ``{"activos", "egresos", "hr"}``.
+    Por defecto hay un egreso cada ~7 activos y una respuesta de HR cada 100 (consolidado)."""
+    hr_rows = max(1, n // 100) if hr_rows is None else hr_rows
+    return {
+        "activos": make_active(n, seed),
+        "egresos": make_leaver(max(1, int(n * leaver_ratio)), seed),
+        "hr": make_hr(hr_rows, seed),
+    }
@@ -0,0 +1,189 @@
+"""Caché compartida entre sesiones con presupuesto global de memoria (sin Streamlit).
+
+Guarda tablas cargadas y resultados de analítica de todos los clientes bajo un único
+límite de bytes. Al pasarse del límite desaloja por LRU (menos usado recientemente) o
+LFU (menos usado; empates por antigüedad de uso). Las claves no llevan el cliente:
+dos clientes con la misma planilla comparten la entrada, y cada entrada recuerda qué
+clientes la usan. Si varias sesiones piden la misma clave a la vez, se calcula una vez.
+Las entradas que crecen después de guardarse (índices perezosos, resultados que se
+refinan) actualizan su tamaño con ``cache_resize``.
+
+La caché es un dict (ver ``new_cache``) protegido por su propio lock.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_POLICIES = ("lru", "lfu")
+
+def new_cache(budget_bytes: int, policy: str = "lru", ttl_s: Optional[float] = None) -> Dict[str, object]:
+    if policy not in CACHE_POLICIES:
+        raise ValueError(f"Política de caché no soportada: {policy}")
+    return {
+        "lock": threading.Lock(),
+        "items": OrderedDict(),   # clave -> entrada; el orden es el de uso (LRU al principio)
+        "building": {},           # clave -> threading.Event de un cálculo en curso
+        "budget": int(budget_bytes),
+        "policy": policy,
+        "ttl_s": ttl_s,
+        "resident": 0,
+        "stats": {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "rejected": 0},
+    }
+
+def estimate_bytes(obj, _seen: Optional[set] = None) -> int:
+    """Tamaño aproximado en memoria de frames, arreglos, bytes y contenedores anidados."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_bytes(v, seen) for v in obj)
+    return sys.getsizeof(obj)
+
+def _expired(cache: Dict[str, object], entry: Dict[str, object], now: float) -> bool:
+    ttl = cache["ttl_s"] if entry["ttl_s"] is None else entry["ttl_s"]
+    return ttl is not None and now - entry["created"] > ttl
+
+def _drop(cache: Dict[str, object], key: Hashable):
+    entry = cache["items"].pop(key)
+    cache["resident"] -= entry["nbytes"]
+
+def _victim(cache: Dict[str, object], keep: Optional[Hashable] = None) -> Hashable:
+    candidates = (k for k in cache["items"] if k != keep)
+    if cache["policy"] == "lfu":
+        # min() recorre en orden de uso: en empate de frecuencia gana el menos reciente
+        return min(candidates, key=lambda k: cache["items"][k]["uses"])
+    return next(candidates)
+
+def cache_get(cache: Dict[str, object], key: Hashable, tenant: Optional[str] = None):
+    """Valor de ``key`` o ``None`` si no está (o venció). Cuenta hit/miss."""
+    now = time.time()
+    with cache["lock"]:
+        entry = cache["items"].get(key)
+        if entry is not None and _expired(cache, entry, now):
+            _drop(cache, key)
+            cache["stats"]["expired"] += 1
+            entry = None
+        if entry is None:
+            cache["stats"]["misses"] += 1
+            return None
+        cache["items"].move_to_end(key)
+        entry["uses"] += 1
+        entry["last_used"] = now
+        if tenant:
+            entry["tenants"].add(tenant)
+        cache["stats"]["hits"] += 1
+        return entry["value"]
+
+def cache_peek(cache: Dict[str, object], key: Hashable):
+    """Valor de ``key`` sin contar hit/miss ni cambiar el orden de uso (para sondeos)."""
+    with cache["lock"]:
+        entry = cache["items"].get(key)
+        if entry is None or _expired(cache, entry, time.time()):
+            return None
+        return entry["value"]
+
+def cache_discard(cache: Dict[str, object], key: Hashable):
+    """Quita ``key`` si está."""
+    with cache["lock"]:
+        if key in cache["items"]:
+            _drop(cache, key)
+
+def cache_resize(cache: Dict[str, object], key: Hashable, nbytes: int) -> bool:
+    """Nuevo tamaño de una entrada ya guardada, desalojando otras si hace falta. Devuelve
+    False si la entrada ya no está o si sola no cabe en el presupuesto (se quita)."""
+    with cache["lock"]:
+        entry = cache["items"].get(key)
+        if entry is None:
+            return False
+        cache["resident"] += int(nbytes) - entry["nbytes"]
+        entry["nbytes"] = int(nbytes)
+        if entry["nbytes"] > cache["budget"]:
+            _drop(cache, key)
+            cache["stats"]["rejected"] += 1
+            return False
+        while cache["resident"] > cache["budget"]:
+            _drop(cache, _victim(cache, keep=key))
+            cache["stats"]["evictions"] += 1
+        return True
+
+def cache_put(cache: Dict[str, object], key: Hashable, value, nbytes: Optional[int] = None,
+              tenant: Optional[str] = None, ttl_s: Optional[float] = None) -> bool:
+    """Guarda ``value`` desalojando lo necesario. Devuelve False si no cabe en el presupuesto."""
+    nbytes = estimate_bytes(value) if nbytes is None else int(nbytes)
+    now = time.time()
+    with cache["lock"]:
+        tenants = set()
+        if key in cache["items"]:
+            tenants = cache["items"][key]["tenants"]
+            _drop(cache, key)
+        if nbytes > cache["budget"]:
+            cache["stats"]["rejected"] += 1
+            return False
+        while cache["items"] and cache["resident"] + nbytes > cache["budget"]:
+            _drop(cache, _victim(cache))
+            cache["stats"]["evictions"] += 1
+        cache["items"][key] = {
+            "value": value, "nbytes": nbytes, "created": now, "last_used": now, "uses": 1,
+            "ttl_s": ttl_s, "tenants": tenants | ({tenant} if tenant else set()),
+        }
+        cache["resident"] += nbytes
+        return True
+
+def cache_get_or_build(cache: Dict[str, object], key: Hashable, build: Callable[[], object],
+                       tenant: Optional[str] = None, size_of: Callable[[object], int] = estimate_bytes,
+                       ttl_s: Optional[float] = None) -> Tuple[object, bool]:
+    """Valor memorizado de ``key`` o ``build()`` (una sola vez aunque lo pidan varias
+    sesiones a la vez). Devuelve (valor, hit)."""
+    while True:
+        value = cache_get(cache, key, tenant)
+        if value is not None:
+            return value, True
+        with cache["lock"]:
+            event = cache["building"].get(key)
+            owner = event is None
+            if owner:
+                event = cache["building"][key] = threading.Event()
+        if owner:
+            break
+        event.wait()  # otro hilo lo está calculando; al terminar se reintenta el get
+    try:
+        value = build()
+        cache_put(cache, key, value, nbytes=size_of(value), tenant=tenant, ttl_s=ttl_s)
+        return value, False
+    finally:
+        with cache["lock"]:
+            cache["building"].pop(key, None)
+        event.set()
+
+def cache_stats(cache: Dict[str, object]) -> Dict[str, object]:
+    """Contadores y ocupación: hits, misses, desalojos, bytes residentes, entradas, clientes."""
+    with cache["lock"]:
+        stats = dict(cache["stats"])
+        lookups = stats["hits"] + stats["misses"]
+        tenants = set().union(*(e["tenants"] for e in cache["items"].values())) if cache["items"] else set()
+        stats.update({
+            "hit_rate": stats["hits"] / lookups if lookups else None,
+            "resident_bytes": cache["resident"],
+            "budget_bytes": cache["budget"],
+            "entries": len(cache["items"]),
+            "shared_entries": sum(len(e["tenants"]) > 1 for e in cache["items"].values()),
+            "tenants": len(tenants),
+            "policy": cache["policy"],
+        })
+    return stats
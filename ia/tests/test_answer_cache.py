@@ -0,0 +1,114 @@
+"""Caché de respuestas del chat con ``FakeLLM``: hit/miss, TTL, invalidación por huella."""
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from answer_cache import answer_cache_stats, open_answer_cache, sync_scope
+from chat import LLM_DISABLED_MSG, FakeLLM, build_llm_answer
+
+CONTEXT = {"resumen": {"activos": 120}, "drivers": ["compensacion"]}
+
+class FakeLLMCounter:
+    """``FakeLLM`` sin demoras que puede fallar a pedido."""
+
+    def __init__(self):
+        self.inner = FakeLLM(delay_s=0, token_delay_s=0)
+        self.fail = False
+
+    @property
+    def calls(self):
+        return self.inner.calls
+
+    def invoke(self, messages):
+        if self.fail:
+            raise RuntimeError("sin conexión")
+        return self.inner.invoke(messages)
+
+class AnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "respuestas.sqlite")
+        self.cache = open_answer_cache(self.path, ttl_s=3600)
+        self.llm = FakeLLMCounter()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ask(self, question="¿Qué hacemos con la rotación?", context=CONTEXT, cache=None, fingerprint="datos-1"):
+        return build_llm_answer(self.llm, context, question, cache=cache or self.cache,
+                                scope="a@b.com", fingerprint=fingerprint)
+
+    def test_miss_then_hit(self):
+        first, cached = self.ask()
+        self.assertFalse(cached)
+        second, cached = self.ask()
+        self.assertTrue(cached)
+        self.assertEqual(first, second)
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(answer_cache_stats(self.cache)["hits"], 1)
+
+    def test_question_is_normalized(self):
+        self.ask("¿Qué hacemos con la rotación?")
+        _, cached = self.ask("que hacemos con la ROTACION")
+        self.assertTrue(cached)
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_other_context_is_a_miss(self):
+        self.ask()
+        _, cached = self.ask(context={**CONTEXT, "drivers": ["jefes"]})
+        self.assertFalse(cached)
+        self.assertEqual(self.llm.calls, 2)
+
+    def test_expired_answer_is_a_miss(self):
+        cache = open_answer_cache(self.path, ttl_s=0.05)
+        self.ask(cache=cache)
+        time.sleep(0.1)
+        _, cached = self.ask(cache=cache)
+        self.assertFalse(cached)
+        self.assertEqual(self.llm.calls, 2)
+
+    def test_new_data_fingerprint_purges_scope(self):
+        self.ask()
+        self.ask("¿Y el liderazgo?")
+        _, cached = self.ask(fingerprint="datos-2")
+        self.assertFalse(cached)
+        self.assertEqual(answer_cache_stats(self.cache)["entradas"], 1)   # sólo la nueva
+
+    def test_sync_scope_only_writes_when_fingerprint_changes(self):
+        self.ask()
+        self.assertEqual(sync_scope(self.cache, "a@b.com", "datos-1"), 0)
+        self.assertEqual(self.cache["huellas"]["a@b.com"], "datos-1")
+        self.assertEqual(sync_scope(self.cache, "a@b.com", "datos-2"), 1)
+        self.assertEqual(sync_scope(self.cache, "a@b.com", "datos-2"), 0)
+
+    def test_disabled_llm_and_errors_are_not_cached(self):
+        answer, cached = build_llm_answer(None, CONTEXT, "hola", cache=self.cache)
+        self.assertEqual((answer, cached), (LLM_DISABLED_MSG, False))
+        self.llm.fail = True
+        answer, _ = self.ask()
+        self.assertIn("Error al consultar el modelo", answer)
+        self.assertEqual(answer_cache_stats(self.cache)["entradas"], 0)
+
+    def test_connections_are_closed(self):
+        opened = []
+        real_connect = sqlite3.connect
+
+        def _track(*args, **kwargs):
+            opened.append(real_connect(*args, **kwargs))
+            return opened[-1]
+
+        with mock.patch("answer_cache.sqlite3.connect", side_effect=_track):
+            self.ask()
+            self.ask()
+            sync_scope(self.cache, "a@b.com", "datos-2")
+            answer_cache_stats(self.cache)
+        self.assertGreater(len(opened), 0)
+        for conn in opened:
+            with self.assertRaises(sqlite3.ProgrammingError):   # conexión cerrada
+                conn.execute("SELECT 1")
+
+if __name__ == "__main__":
+    unittest.main()
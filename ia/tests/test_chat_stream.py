@@ -0,0 +1,104 @@
+"""Chat en streaming con ``FakeLLM``: timeouts, cancelación, métricas y caché."""
+import os
+import tempfile
+import threading
+import unittest
+
+from answer_cache import answer_key, get_answer, open_answer_cache
+from chat import CHAT_INSTRUCTIONS, LLM_DISABLED_MSG, SYSTEM_PROMPT, FakeLLM, new_stream_metrics, stream_llm_answer
+
+CONTEXT = {"resumen": {"activos": 120}}
+QUESTION = "¿Dónde está el mayor riesgo?"
+
+class BrokenLLM(FakeLLM):
+    """Entrega un fragmento y luego falla."""
+
+    def stream(self, messages):
+        yield next(super().stream(messages))
+        raise RuntimeError("se cortó la conexión")
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = open_answer_cache(os.path.join(self.tmp.name, "respuestas.sqlite"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_stream(self, llm, cancel=None, first_token_timeout_s=5.0, timeout_s=10.0):
+        metrics = new_stream_metrics()
+        chunks = list(stream_llm_answer(llm, CONTEXT, QUESTION, metrics, cancel=cancel, cache=self.cache,
+                                        first_token_timeout_s=first_token_timeout_s, timeout_s=timeout_s))
+        return chunks, metrics
+
+    def cached(self):
+        return get_answer(self.cache, answer_key(SYSTEM_PROMPT, CHAT_INSTRUCTIONS, CONTEXT, QUESTION))
+
+    def test_complete_answer_is_streamed_and_cached(self):
+        llm = FakeLLM(delay_s=0.05, token_delay_s=0)
+        chunks, m = self.run_stream(llm)
+        self.assertEqual(m["estado"], "ok")
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), m["texto"])
+        self.assertIn(QUESTION, m["texto"])
+        self.assertEqual(m["fragmentos"], len(chunks))
+        self.assertGreaterEqual(m["ttft_ms"], 50)
+        self.assertGreaterEqual(m["total_ms"], m["ttft_ms"])
+        self.assertFalse(m["desde_cache"])
+        self.assertEqual(self.cached(), m["texto"])
+
+        chunks, m = self.run_stream(llm)
+        self.assertEqual((m["estado"], m["desde_cache"], llm.calls), ("cache", True, 1))
+        self.assertEqual(chunks, [self.cached()])
+
+    def test_slow_first_token_times_out(self):
+        chunks, m = self.run_stream(FakeLLM(delay_s=1.0), first_token_timeout_s=0.1)
+        self.assertEqual((m["estado"], chunks, m["texto"]), ("timeout", [], ""))
+        self.assertIsNone(m["ttft_ms"])
+        self.assertIn("0.1 s", m["error"])
+        self.assertLess(m["total_ms"], 900)
+        self.assertIsNone(self.cached())
+
+    def test_stalled_stream_hits_total_timeout(self):
+        chunks, m = self.run_stream(FakeLLM(delay_s=0, token_delay_s=0.5), timeout_s=0.3)
+        self.assertEqual(m["estado"], "timeout")
+        self.assertEqual(len(chunks), 1)            # llegó el primer token y luego nada
+        self.assertIsNotNone(m["ttft_ms"])
+        self.assertLess(m["total_ms"], 800)
+        self.assertIsNone(self.cached())            # las respuestas parciales no se guardan
+
+    def test_cancel_event_stops_the_stream(self):
+        cancel = threading.Event()
+        metrics = new_stream_metrics()
+        gen = stream_llm_answer(FakeLLM(delay_s=0, token_delay_s=0.2), CONTEXT, QUESTION, metrics,
+                                cancel=cancel, cache=self.cache)
+        first = next(gen)
+        cancel.set()
+        rest = list(gen)
+        self.assertEqual(metrics["estado"], "cancelada")
+        self.assertEqual(metrics["texto"], first + "".join(rest))
+        self.assertLess(len(rest), 2)
+        self.assertIsNone(self.cached())
+
+    def test_closing_the_generator_counts_as_cancelled(self):
+        metrics = new_stream_metrics()
+        gen = stream_llm_answer(FakeLLM(delay_s=0, token_delay_s=0.2), CONTEXT, QUESTION, metrics, cache=self.cache)
+        next(gen)
+        gen.close()                                 # p. ej. un rerun de Streamlit
+        self.assertEqual(metrics["estado"], "cancelada")
+        self.assertIsNotNone(metrics["total_ms"])
+        self.assertIsNone(self.cached())
+
+    def test_stream_error_is_reported_and_not_cached(self):
+        chunks, m = self.run_stream(BrokenLLM(delay_s=0))
+        self.assertEqual(m["estado"], "error")
+        self.assertIn("se cortó la conexión", m["error"])
+        self.assertIn("Error al consultar el modelo", chunks[-1])
+        self.assertIsNone(self.cached())
+
+    def test_disabled_without_llm(self):
+        chunks, m = self.run_stream(None)
+        self.assertEqual((chunks, m["estado"]), ([LLM_DISABLED_MSG], "deshabilitado"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""``compact_frame`` no cambia resultados: pipeline, exportaciones y casos puntuales."""
+import io
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    ACTIVE_OPTIONAL, ACTIVE_REQUIRED, LEAVER_OPTIONAL, LEAVER_REQUIRED, _as_plain, area_risk, compact_frame,
+    map_cols, prepare_reason_texts, run_pipeline,
+)
+from exports import export_bytes
+from synthetic import make_surveys
+
+def assert_same(test: unittest.TestCase, a, b, path: str = "res"):
+    """Igualdad estricta (tipos incluidos) de resultados anidados; NaN igual a NaN."""
+    if isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a, b, obj=path)
+    elif isinstance(a, pd.Series):
+        pd.testing.assert_series_equal(a, b, obj=path)
+    elif isinstance(a, np.ndarray):
+        np.testing.assert_array_equal(a, b, err_msg=path)
+    elif isinstance(a, dict):
+        test.assertEqual(list(a), list(b), path)
+        for k in a:
+            assert_same(test, a[k], b[k], f"{path}[{k!r}]")
+    elif isinstance(a, (list, tuple)):
+        test.assertEqual((type(a), len(a)), (type(b), len(b)), path)
+        for i, (x, y) in enumerate(zip(a, b)):
+            assert_same(test, x, y, f"{path}[{i}]")
+    elif isinstance(a, float) and np.isnan(a):
+        test.assertTrue(isinstance(b, float) and np.isnan(b), path)
+    else:
+        test.assertEqual(a, b, path)
+
+class CompactTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        frames = make_surveys(3000, seed=3)
+        a = frames["activos"]
+        rng = np.random.default_rng(0)
+        # Columnas que ejercitan todas las conversiones: enteros, floats enteros con nulos
+        # y texto libre largo (arrow)
+        a["legajo"] = np.arange(len(a), dtype=np.int64)
+        a["horas"] = np.where(rng.random(len(a)) < 0.1, np.nan, rng.integers(0, 48, len(a)).astype(float))
+        a["nota libre"] = [None if i % 7 == 0 else f"comentario extenso número {i} " + "x" * 90 for i in range(len(a))]
+        a[ACTIVE_OPTIONAL["comentario_adicional"][0]] = a["nota libre"]   # texto consolidado con Arrow
+        # Como llegan de la lectura: nulos NaN, no None
+        cls.raw = tuple(pd.read_csv(io.StringIO(d.to_csv(index=False))) for d in (a, frames["egresos"], frames["hr"]))
+        cls.compact = tuple(compact_frame(d)[0] for d in cls.raw)
+        cls.arrow = tuple(compact_frame(d, arrow_text=True)[0] for d in cls.raw)
+
+    def test_frames_are_compacted(self):
+        dtypes = self.arrow[0].dtypes
+        self.assertIsInstance(dtypes[ACTIVE_REQUIRED["area"][0]], pd.CategoricalDtype)
+        self.assertEqual((dtypes["legajo"], dtypes["horas"]), (np.int16, np.float32))
+        self.assertTrue(self.raw[0]["horas"].isna().any())
+        self.assertEqual(str(dtypes["nota libre"]), "string")
+        self.assertEqual(str(dtypes[ACTIVE_OPTIONAL["comentario_adicional"][0]]), "string")
+
+    def test_pipeline_is_identical(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            base = run_pipeline(*self.raw, bootstrap=30)
+            for frames in (self.compact, self.arrow):
+                assert_same(self, base, run_pipeline(*frames, bootstrap=30))
+
+    def test_exports_are_identical(self):
+        for fmt in ("csv", "csv.gz"):
+            for frames in (self.compact, self.arrow):
+                for raw, small in zip(self.raw, frames):
+                    self.assertEqual(export_bytes(raw, fmt), export_bytes(small, fmt), fmt)
+        back = pd.read_excel(io.BytesIO(export_bytes(self.arrow[0].head(300), "xlsx")))
+        pd.testing.assert_frame_equal(back, pd.read_excel(io.BytesIO(export_bytes(self.raw[0].head(300), "xlsx"))))
+
+    def test_text_concatenation_keeps_nan(self):
+        a, l = self.raw[0], self.raw[1]
+        m_a, m_l = map_cols(a, ACTIVE_REQUIRED, ACTIVE_OPTIONAL), map_cols(l, LEAVER_REQUIRED, LEAVER_OPTIONAL)
+        base = prepare_reason_texts(a, l, m_a, m_l)
+        for frames in (self.compact, self.arrow):
+            out = prepare_reason_texts(frames[0], frames[1], m_a, m_l)
+            for df_base, df_out, col in ((base[0], out[0], base[2]["razones_texto"]), (base[1], out[1], base[3]["comentarios"])):
+                pd.testing.assert_series_equal(df_base[col], df_out[col])
+                self.assertTrue(df_out[col].str.contains("nan").any())   # los nulos se siguen viendo como 'nan'
+
+    def test_grouped_keys_stay_object(self):
+        m_a = map_cols(self.raw[0], ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
+        base = area_risk(self.raw[0], m_a)
+        out = area_risk(self.compact[0], m_a)
+        self.assertEqual(out[m_a["area"]].dtype, object)
+        pd.testing.assert_frame_equal(base, out)
+
+    def test_as_plain(self):
+        s = pd.Series(["a", np.nan, "b", "a"], dtype=object)
+        for small in (s.astype("category"), s.astype("string[pyarrow]")):
+            plain = _as_plain(small)
+            self.assertEqual(plain.dtype, object)
+            self.assertTrue(np.isnan(plain[1]))
+            pd.testing.assert_series_equal(plain, s)
+        self.assertIs(_as_plain(s), s)
+
+if __name__ == "__main__":
+    unittest.main()
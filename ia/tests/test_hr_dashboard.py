@@ -0,0 +1,98 @@
+"""Panel de HR vectorizado: valores fijos y paridad con el cálculo fila a fila anterior."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from engine import HR_OPTIONAL, HR_REQUIRED, compact_frame, hr_dashboard, map_cols
+from synthetic import make_hr
+
+def col(key: str) -> str:
+    return {**HR_REQUIRED, **HR_OPTIONAL}[key][0]
+
+def rowwise_bool(s: pd.Series) -> pd.Series:
+    """``to_bool`` tal como era antes de vectorizar (fila a fila)."""
+    x = s.astype(str).str.strip().str.lower()
+    yes_like = x.isin(["sí", "si", "yes", "true"]) | x.str.contains(r"de acuerdo|aplica|cumple|si\b|sí\b", na=False)
+    no_like = x.isin(["no", "false"]) | x.str.contains(r"no aplica|no cumple|en desacuerdo", na=False)
+    out = pd.Series(np.nan, index=x.index, dtype="float")
+    out[yes_like] = 1.0
+    out[no_like] = 0.0
+    return out.fillna(pd.to_numeric(x.str.replace(",", ".", regex=False), errors="coerce").apply(
+        lambda v: np.nan if pd.isna(v) else (1.0 if v >= 1 else 0.0)))
+
+def rowwise_mean_number(s: pd.Series) -> float:
+    return pd.to_numeric(s.astype(str).str.replace(",", ".", regex=False), errors="coerce").dropna().mean()
+
+CAUSES = [("causa_compensacion", "Compensación"), ("causa_jefes", "Jefes/Liderazgo"), ("causa_sobrecarga", "Sobrecarga"),
+          ("causa_proyeccion", "Falta de proyección"), ("causa_modalidad", "Modalidad trabajo")]
+PRACTICES = [
+    ("indicadores_rotacion", "Indicadores de rotación"), ("medimos_tiempo_cobertura", "Medimos tiempo de cobertura"),
+    ("medimos_costo_reemplazo", "Medimos costo de reemplazo"), ("plan_retencion", "Plan de retención"),
+    ("movilidad_interna", "Movilidad interna"), ("revision_salarial_anual", "Revisión salarial anual"),
+    ("flexibilidad_laboral", "Flexibilidad laboral"), ("encuestas_clima", "Encuestas de clima"),
+    ("usa_analitica", "Analítica de rotación"), ("sponsorship_alta_direccion", "Sponsorship Alta Dirección"),
+    ("eff_ajuste_salarios", "Efectivo: ajuste salarios"), ("eff_liderazgo", "Efectivo: liderazgo"),
+    ("eff_bienestar", "Efectivo: bienestar/SM"), ("eff_reconocimiento", "Efectivo: reconocimiento"),
+    ("eff_capacitacion", "Efectivo: capacitación/carrera"),
+]
+
+def rowwise_dashboard(df: pd.DataFrame, m):
+    """KPIs, causas y prácticas como los calculaba ``hr_dashboard`` columna a columna."""
+    hc, rot, hr_hc, vac = (rowwise_mean_number(df[m[k]]) for k in ("headcount", "rotacion_6m", "hr_headcount", "vacantes_mes"))
+    kpis = [hc, rot, hr_hc, vac, hr_hc / hc * 100]
+    tables = []
+    for keys, label_col, value_col in ((CAUSES, "causa", "% acuerdo"), (PRACTICES, "práctica", "% sí/efectivo")):
+        rows = [{label_col: label, value_col: round(rowwise_bool(df[m[k]]).mean() * 100, 1)}
+                for k, label in keys if m.get(k) in df.columns]
+        tables.append(pd.DataFrame(rows).sort_values(value_col, ascending=False))
+    return kpis, tables[0], tables[1]
+
+class HrDashboardTest(unittest.TestCase):
+    def test_fixed_values(self):
+        df = pd.DataFrame({
+            col("headcount"): ["200", "180,5", "", "no sé"],
+            col("rotacion_6m"): ["12", "8", np.nan, "x"],
+            col("hr_headcount"): ["5", "5", "", None],
+            col("vacantes_mes"): [None, "", None, np.nan],
+            col("causa_compensacion"): ["Totalmente de acuerdo", "En desacuerdo", "", "Tal vez"],
+            col("causa_jefes"): ["De acuerdo", "De acuerdo", "Ni de acuerdo ni en desacuerdo", None],
+            col("plan_retencion"): ["Sí", "No", "No aplica", "1"],
+            col("usa_analitica"): ["si", "0", "2", np.nan],
+            col("perfiles_dificiles"): ["Ingenieros", None, "Vendedores", np.nan],
+            col("acciones_6m"): [None, "Subir salarios", None, None],
+        })
+        kpis, causas, pract, text = hr_dashboard(df, map_cols(df, HR_REQUIRED, HR_OPTIONAL))
+        self.assertEqual(kpis["indicador"].tolist(),
+                         ["Headcount", "Rotación 6m (%)", "Headcount HR", "Vacantes/mes", "% HR sobre total"])
+        np.testing.assert_allclose(kpis["valor"].to_numpy(), [190.25, 10.0, 5.0, np.nan, 5 / 190.25 * 100])
+        self.assertEqual(causas.to_dict("list"), {"causa": ["Jefes/Liderazgo", "Compensación"], "% acuerdo": [66.7, 50.0]})
+        self.assertEqual(pract.to_dict("list"), {"práctica": ["Analítica de rotación", "Plan de retención"],
+                                                 "% sí/efectivo": [66.7, 50.0]})
+        self.assertEqual(text, "Perfiles difíciles: Ingenieros; Vendedores | Acciones 6m sugeridas: Subir salarios")
+
+    def test_matches_rowwise_logic(self):
+        df = make_hr(400, seed=7)
+        rng = np.random.default_rng(1)
+        for c in df.columns:   # vacíos y respuestas que no se reconocen en todas las columnas
+            r = rng.random(len(df))
+            df.loc[r < 0.1, c] = np.nan
+            df.loc[(r >= 0.1) & (r < 0.13), c] = ""
+            df.loc[(r >= 0.13) & (r < 0.16), c] = "Tal vez"
+        m = map_cols(df, HR_REQUIRED, HR_OPTIONAL)
+        kpis_want, causas_want, pract_want = rowwise_dashboard(df, m)
+        self.assertEqual((len(causas_want), len(pract_want)), (5, 15))
+        for frame in (df, compact_frame(df)[0]):
+            kpis, causas, pract, _ = hr_dashboard(frame, m)
+            np.testing.assert_allclose(kpis["valor"].to_numpy(), kpis_want)
+            pd.testing.assert_frame_equal(causas, causas_want)
+            pd.testing.assert_frame_equal(pract, pract_want)
+
+    def test_no_mapped_columns(self):
+        kpis, causas, pract, text = hr_dashboard(pd.DataFrame({"otra": [1, 2]}), {})
+        self.assertTrue(kpis["valor"].isna().all())
+        self.assertTrue(causas.empty and pract.empty)
+        self.assertEqual(text, "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Análisis de drivers: correlación por pares, pesos relativos de Johnson y ridge/Pratt."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from engine import _ridge_pratt, key_driver_analysis, pairwise_corr_matrix
+
+def ols_r2(X: np.ndarray, y: np.ndarray) -> float:
+    A = np.column_stack([np.ones(len(X)), X])
+    beta, *_ = np.linalg.lstsq(A, y, rcond=None)
+    resid = y - A @ beta
+    return 1 - resid @ resid / ((y - y.mean()) @ (y - y.mean()))
+
+class KdaTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        n = 600
+        base = rng.normal(size=(n, 3))
+        self.drivers = pd.DataFrame({
+            "jefe_respeto": base[:, 0],
+            "jefe_confia": base[:, 0] * 0.9 + rng.normal(scale=0.3, size=n),   # colineal con el anterior
+            "compensacion": base[:, 1],
+            "carga": base[:, 2],
+        })
+        self.intent = pd.Series(-0.6 * base[:, 0] - 0.3 * base[:, 1] + rng.normal(scale=0.8, size=n))
+
+    def kda(self, drivers=None, intent=None, **kwargs):
+        return key_driver_analysis(pd.DataFrame(), {}, drivers=self.drivers if drivers is None else drivers,
+                                   intent=self.intent if intent is None else intent, **kwargs)
+
+    def test_pairwise_corr_matches_pandas(self):
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame(rng.normal(size=(300, 5)), columns=list("abcde"))
+        df["b"] += df["a"]
+        df = df.mask(rng.random(df.shape) < 0.25)
+        df.loc[:297, "d"] = np.nan      # 'd' con sólo dos valores: pares con menos de 2 → NaN
+        df["e"] = 4.0                   # constante: sin varianza
+        got = pairwise_corr_matrix(df.to_numpy())
+        want = df.corr().to_numpy()
+        np.testing.assert_allclose(got, want, atol=1e-12)
+        np.testing.assert_array_equal(np.isnan(got), np.isnan(want))
+
+    def test_relative_weights_sum_to_r2(self):
+        out = self.kda()
+        r2 = ols_r2(self.drivers.to_numpy(), self.intent.to_numpy())
+        self.assertAlmostEqual(out.attrs["r2"], r2, places=10)
+        self.assertAlmostEqual(out["peso_bruto"].sum(), r2, places=10)
+        self.assertAlmostEqual(out["peso_relativo_%"].sum(), 100.0, places=10)
+        self.assertTrue((out["peso_bruto"] >= 0).all())
+        self.assertEqual(out.index[-1], "carga")       # sin efecto sobre la intención
+        pd.testing.assert_series_equal(out["correlacion_intencion"],
+                                       self.drivers.corrwith(self.intent)[out.index].rename("correlacion_intencion"),
+                                       check_names=False)
+
+    def test_collinear_drivers_share_weight(self):
+        out = self.kda()
+        # La correlación simple casi no distingue a los dos jefes; los pesos los reparten
+        w = out["peso_bruto"]
+        self.assertLess(abs(w["jefe_respeto"] - w["jefe_confia"]), w["jefe_respeto"])
+        self.assertGreater(w["jefe_respeto"] + w["jefe_confia"], w["compensacion"])
+
+    def test_ridge_pratt(self):
+        out = self.kda(method="ridge", ridge_alpha=0.0)
+        self.assertEqual(out.attrs["method"], "ridge")
+        # Sin penalización, la medida de Pratt también suma el R² de OLS
+        self.assertAlmostEqual(out.attrs["r2"], ols_r2(self.drivers.to_numpy(), self.intent.to_numpy()), places=10)
+        R = self.drivers.corr().to_numpy()
+        rxy = self.drivers.corrwith(self.intent).to_numpy()
+        self.assertLess(_ridge_pratt(R, rxy, 1.0).sum(), _ridge_pratt(R, rxy, 0.0).sum())
+
+    def test_missing_values_are_pairwise(self):
+        rng = np.random.default_rng(5)
+        drivers = self.drivers.mask(rng.random(self.drivers.shape) < 0.2)
+        out = self.kda(drivers=drivers)
+        want = drivers.corrwith(self.intent)[out.index]
+        np.testing.assert_allclose(out["correlacion_intencion"].to_numpy(), want.to_numpy(), atol=1e-12)
+        self.assertAlmostEqual(out["peso_bruto"].sum(), out.attrs["r2"])
+
+    def test_driver_without_variance_is_dropped(self):
+        drivers = self.drivers.assign(constante=1.0)
+        self.assertNotIn("constante", self.kda(drivers=drivers).index)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            self.kda(method="shapley")
+
+if __name__ == "__main__":
+    unittest.main()
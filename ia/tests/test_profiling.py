@@ -0,0 +1,26 @@
+"""Perfilado por etapa: sin perfil no se mide nada ni se lanza el hilo de memoria."""
+import unittest
+from unittest import mock
+
+from profiling import new_profile, profile_table, stage
+
+class StageTest(unittest.TestCase):
+    def test_without_profile_is_a_no_op(self):
+        with mock.patch("profiling.threading.Thread") as thread:
+            with stage(None, "carga", rows=10) as entry:
+                entry["desde_cache"] = True
+        thread.assert_not_called()
+        self.assertNotIn("segundos", entry)
+
+    def test_profile_records_time_and_memory(self):
+        profile = new_profile(cliente="a@b.com")
+        with stage(profile, "carga", rows=10) as entry:
+            entry["filas"] = 12
+        df = profile_table(profile)
+        self.assertEqual(df["etapa"].tolist(), ["carga"])
+        self.assertEqual(df["filas"].tolist(), [12])
+        self.assertGreaterEqual(df["segundos"].iloc[0], 0)
+        self.assertIn("mem_pico_mb", df.columns)
+
+if __name__ == "__main__":
+    unittest.main()
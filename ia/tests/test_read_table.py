@@ -0,0 +1,87 @@
+"""Lector en streaming: ``compact_frame(read_table(p))`` igual a ``compact_frame(pd.read_csv(p))``."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from engine import _normalize_columns, _read_xlsx_streaming, compact_frame, read_table
+from exports import export_bytes
+from synthetic import make_active
+
+CASES = {
+    "comillas_y_saltos": 'id,comentario,area\n1,"dos\nlíneas",Ventas\n2,"con ""comillas"", y coma",TI\n3,simple,Ventas\n',
+    "variantes_na": "a,b,c\n1,NA,x\n2,N/A,\n3,null,#N/A\n4,nan,-\n5,,NULL\n6,3.5,x\n",
+    "booleanos_con_nulos": "flag,otro\nTrue,1\nFalse,\n,3\nTrue,4\n",
+    "encabezados_duplicados": "area,area,area,  nota  final\nVentas,1,x,2\nTI,2,y,3\n",
+    "enteros_y_floats": "entero,con_nulo,decimal,mixto\n1,1,1.5,1\n2,,2.25,dos\n3,3,,3\n",
+    "solo_encabezado": "a,b,c\n",
+}
+
+class ReadTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, data) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as fh:
+            fh.write(data.encode("utf-8") if isinstance(data, str) else data)
+        return path
+
+    def assert_like_read_csv(self, path: str):
+        got, _ = compact_frame(read_table(path))
+        want, _ = compact_frame(_normalize_columns(pd.read_csv(path)))
+        pd.testing.assert_frame_equal(got, want)
+
+    def test_edge_cases(self):
+        for name, text in CASES.items():
+            with self.subTest(name):
+                self.assert_like_read_csv(self.write(f"{name}.csv", text))
+
+    def test_empty_file_raises_like_read_csv(self):
+        path = self.write("vacio.csv", "")
+        with self.assertRaises(pd.errors.EmptyDataError):
+            pd.read_csv(path)
+        with self.assertRaises(pd.errors.EmptyDataError):
+            read_table(path)
+
+    def test_file_url_and_categories(self):
+        path = self.write("encuesta.csv", make_active(500, seed=2).to_csv(index=False))
+        df = read_table("file://" + path)
+        self.assertTrue(any(isinstance(t, pd.CategoricalDtype) for t in df.dtypes))
+        self.assert_like_read_csv(path)
+
+    def test_many_blocks(self):
+        # Bloques chicos: los diccionarios se unifican entre bloques y el texto libre se
+        # decide con el primero
+        df = make_active(3000, seed=4)
+        df["nota"] = [f"texto libre {i},\n\"citado\" en dos líneas" if i % 5 else None for i in range(len(df))]
+        df["valor"] = np.where(np.arange(len(df)) % 11 == 0, np.nan, np.arange(len(df)) / 4)
+        path = self.write("bloques.csv", df.to_csv(index=False))
+        with mock.patch("engine.CSV_BLOCK_BYTES", 16 << 10):
+            self.assert_like_read_csv(path)
+            nota = read_table(path)["nota"]
+        self.assertEqual(nota.dtype, object)
+        self.assertTrue(np.isnan(nota[0]))   # NaN como pd.read_csv, no None
+
+    def test_xlsx_round_trip(self):
+        # Se conservan los tipos de las celdas (pd.read_excel además convertiría el texto
+        # numérico, como '7', a número)
+        df = make_active(300, seed=5)
+        df["horas"] = np.where(np.arange(len(df)) % 7 == 0, np.nan, np.arange(len(df)) % 40)
+        df["legajo"] = np.arange(len(df))
+        path = self.write("encuesta.xlsx", export_bytes(df, "xlsx"))
+        table = read_table(path)
+        got, _ = compact_frame(table)
+        want, _ = compact_frame(_normalize_columns(df.copy()))
+        pd.testing.assert_frame_equal(got, want)
+        with open(path, "rb") as fh:   # por bloques chicos da lo mismo
+            pd.testing.assert_frame_equal(_normalize_columns(_read_xlsx_streaming(fh, chunk_rows=64)), table)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Índice de comentarios: un texto repetido en varias fuentes conserva todas sus fuentes."""
+import unittest
+
+import pandas as pd
+
+from retrieval import build_comment_index, search_comments
+
+FIELDS = {"activos": ["comentarios"], "egresos": ["motivo_salida", "comentarios"]}
+
+class CommentIndexTest(unittest.TestCase):
+    def setUp(self):
+        repeated = "El salario no alcanza y nadie lo revisa"
+        frames = {
+            "activos": pd.DataFrame({"obs": [repeated, "Buen ambiente con el equipo", None]}),
+            "egresos": pd.DataFrame({
+                "motivo": [repeated, repeated, "Me ofrecieron mejor salario afuera"],
+                "extra": ["  " + repeated + " ", "ok", "Falta de liderazgo"],
+            }),
+        }
+        mappings = {"activos": {"comentarios": "obs"},
+                    "egresos": {"motivo_salida": "motivo", "comentarios": "extra"}}
+        self.repeated = repeated
+        self.index = build_comment_index(frames, mappings, fields=FIELDS)
+
+    def test_repeated_text_keeps_every_source(self):
+        hits = {h["texto"]: h for h in search_comments(self.index, "salarios")}
+        hit = hits[self.repeated]
+        self.assertEqual(hit["veces"], 4)
+        self.assertEqual(hit["fuentes"], {"egresos.motivo_salida": 2, "activos.comentarios": 1,
+                                          "egresos.comentarios": 1})
+        self.assertEqual(next(iter(hit["fuentes"])), "egresos.motivo_salida")  # la más repetida primero
+        self.assertEqual(hits["Me ofrecieron mejor salario afuera"]["fuentes"], {"egresos.motivo_salida": 1})
+
+    def test_source_counts_add_up_to_repetitions(self):
+        self.assertEqual(self.index["n_docs"], 4)  # "ok" es demasiado corto
+        self.assertEqual(int(self.index["src_counts"].sum()), self.index["n_comments"])
+        for d in range(self.index["n_docs"]):
+            lo, hi = self.index["src_offsets"][d], self.index["src_offsets"][d + 1]
+            self.assertEqual(int(self.index["src_counts"][lo:hi].sum()), int(self.index["counts"][d]))
+
+    def test_empty_frames(self):
+        index = build_comment_index({}, {}, fields=FIELDS)
+        self.assertEqual(index["n_docs"], 0)
+        self.assertEqual(search_comments(index, "salario"), [])
+
+if __name__ == "__main__":
+    unittest.main()
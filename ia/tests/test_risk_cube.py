@@ -0,0 +1,67 @@
+"""Cubo de riesgo: la vista por área coincide con ``area_risk`` y el camino incremental
+(``update_risk_cube``/``update_trends``, el que usa la app) con recalcular desde cero."""
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    ACTIVE_OPTIONAL, ACTIVE_REQUIRED, area_risk, build_risk_cube, build_trends, compact_frame, cube_risk, cube_trend,
+    map_cols, run_pipeline, update_risk_cube, update_trends,
+)
+from synthetic import make_surveys
+
+def assert_frames_close(a: pd.DataFrame, b: pd.DataFrame):
+    pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_exact=False, rtol=1e-9)
+
+class RiskCubeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.frames = make_surveys(2400, seed=6)
+        cls.df = cls.frames["activos"]
+        cls.m = map_cols(cls.df, ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
+        cls.df.loc[cls.df.index[::97], cls.m["area"]] = np.nan     # respuestas sin área
+        cls.old, cls.new = cls.df.iloc[:1700], cls.df.iloc[1700:]
+
+    def test_area_view_equals_area_risk(self):
+        for df in (self.df, compact_frame(self.df)[0]):
+            want = area_risk(df, self.m)
+            got = cube_risk(build_risk_cube(df, self.m), by=("area",))
+            self.assertEqual(list(got.columns), list(want.columns))
+            assert_frames_close(got, want)
+
+    def test_update_equals_rebuild(self):
+        full = build_risk_cube(self.df, self.m)
+        inc = update_risk_cube(build_risk_cube(self.old, self.m), self.new, self.m)
+        pd.testing.assert_frame_equal(inc["cells"].reindex(full["cells"].index), full["cells"], check_exact=False, rtol=1e-12)
+        self.assertEqual(len(inc["cells"]), len(full["cells"]))
+        self.assertEqual(inc["maxima"], full["maxima"])
+        for by in (("area",), ("rol", "antiguedad"), ("area", "periodo")):
+            with self.subTest(by=by):
+                assert_frames_close(cube_risk(inc, by=by, min_responses=5), cube_risk(full, by=by, min_responses=5))
+        self.assertIs(update_risk_cube(full, self.df.iloc[:0], self.m), full)
+
+    def test_update_trends_equals_rebuild(self):
+        full = build_trends(self.df, self.m)
+        inc = update_trends(build_trends(self.old, self.m), self.new, self.m)
+        self.assertEqual((inc["rows"], inc["added"], inc["has_time"]), (len(self.df), len(self.new), True))
+        for freq in full["cubes"]:
+            with self.subTest(freq=freq):
+                assert_frames_close(cube_trend(inc["cubes"][freq], by=("area",), window=2),
+                                    cube_trend(full["cubes"][freq], by=("area",), window=2))
+
+    def test_pipeline_with_trends_base(self):
+        # Lo que hace la app cuando el formulario sólo agregó filas al final
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            base = run_pipeline(self.old, self.frames["egresos"], self.frames["hr"])
+            inc = run_pipeline(self.df, self.frames["egresos"], self.frames["hr"],
+                               trends_base=(base["trends"], len(self.old)))
+            full = run_pipeline(self.df, self.frames["egresos"], self.frames["hr"])
+        self.assertEqual(inc["trends"]["added"], len(self.new))
+        assert_frames_close(inc["risk"], full["risk"])
+        assert_frames_close(inc["risk"], area_risk(self.df, self.m))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Correlaciones por segmento en una pasada = ``correlate_with_intent`` sobre cada segmento."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    ACTIVE_OPTIONAL, ACTIVE_REQUIRED, compact_frame, correlate_by_segment, correlate_with_intent, driver_matrix,
+    map_cols,
+)
+from synthetic import make_active
+
+MIN_RESPONSES = 30
+
+class SegmentTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        df = make_active(2500, seed=9)
+        cls.m = map_cols(df, ACTIVE_REQUIRED, ACTIVE_OPTIONAL)
+        area, comp = cls.m["area"], cls.m["compensacion"]
+        df.loc[df.index[:12], area] = "Sede chica"               # segmento bajo el umbral
+        ventas = df.index[df[area] == "Ventas"]
+        df.loc[ventas[25:], comp] = np.nan                       # celda bajo el umbral en un segmento que sí entra
+        cls.df = df
+
+    def per_slice(self, df: pd.DataFrame, keys) -> dict:
+        """Resultado esperado por segmento: ``correlate_with_intent`` y pares completos por driver."""
+        out = {}
+        for seg, part in df.groupby(keys, sort=True):
+            if len(part) < MIN_RESPONSES:
+                continue
+            corr = correlate_with_intent(part, self.m)["correlacion_intencion"]
+            pairs = driver_matrix(part, self.m).notna().sum()
+            out[seg] = (len(part), corr.where(pairs[corr.index] >= MIN_RESPONSES))
+        return out
+
+    def check(self, got: pd.DataFrame, want: dict):
+        self.assertEqual(list(got.index), list(want))
+        for seg, (n, corr) in want.items():
+            row = got.loc[seg]
+            self.assertEqual(row["n"], n)
+            np.testing.assert_allclose(row[corr.index].to_numpy(dtype=float), corr.to_numpy(), atol=1e-10,
+                                       err_msg=str(seg))
+
+    def test_matches_each_area_slice(self):
+        got = correlate_by_segment(self.df, self.m, by=("area",), min_responses=MIN_RESPONSES)
+        want = self.per_slice(self.df, self.m["area"])
+        self.assertNotIn("Sede chica", got.index)
+        self.assertTrue(np.isnan(got.loc["Ventas", "compensacion"]))
+        self.assertTrue(np.isfinite(got.loc["TI", "compensacion"]))
+        self.check(got, want)
+
+    def test_two_keys(self):
+        got = correlate_by_segment(self.df, self.m, by=("area", "rol"), min_responses=MIN_RESPONSES)
+        want = self.per_slice(self.df, [self.m["area"], self.m["rol"]])
+        self.assertGreater(len(want), 0)
+        self.check(got, want)
+
+    def test_compacted_frame(self):
+        compact = compact_frame(self.df)[0]
+        pd.testing.assert_frame_equal(correlate_by_segment(compact, self.m, min_responses=MIN_RESPONSES),
+                                      correlate_by_segment(self.df, self.m, min_responses=MIN_RESPONSES))
+
+    def test_missing_segment_column(self):
+        self.assertTrue(correlate_by_segment(self.df, {**self.m, "area": None}).empty)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Caché compartida: presupuesto en bytes, entradas que crecen, sondeo y baja."""
+import unittest
+
+from tenant_cache import cache_discard, cache_get, cache_peek, cache_put, cache_resize, cache_stats, new_cache
+
+class TenantCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = new_cache(100)
+        for k in ("a", "b", "c"):
+            cache_put(self.cache, k, k.upper(), nbytes=30)
+
+    def test_put_evicts_least_recently_used(self):
+        cache_get(self.cache, "a")
+        cache_put(self.cache, "d", "D", nbytes=30)
+        self.assertIsNone(cache_peek(self.cache, "b"))
+        self.assertEqual(cache_peek(self.cache, "a"), "A")
+        self.assertEqual(cache_stats(self.cache)["resident_bytes"], 90)
+
+    def test_resize_evicts_others_but_keeps_the_entry(self):
+        self.assertTrue(cache_resize(self.cache, "a", 60))   # "a" es la más antigua
+        self.assertEqual(cache_peek(self.cache, "a"), "A")
+        self.assertIsNone(cache_peek(self.cache, "b"))
+        stats = cache_stats(self.cache)
+        self.assertEqual((stats["resident_bytes"], stats["evictions"]), (90, 1))
+
+    def test_resize_beyond_budget_drops_the_entry(self):
+        self.assertFalse(cache_resize(self.cache, "a", 101))
+        self.assertIsNone(cache_peek(self.cache, "a"))
+        self.assertEqual(cache_stats(self.cache)["resident_bytes"], 60)
+        self.assertFalse(cache_resize(self.cache, "zz", 1))
+
+    def test_peek_does_not_count_or_touch(self):
+        cache_peek(self.cache, "a")
+        cache_peek(self.cache, "zz")
+        stats = cache_stats(self.cache)
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 0))
+        cache_put(self.cache, "d", "D", nbytes=30)
+        self.assertIsNone(cache_peek(self.cache, "a"))       # el sondeo no la hizo reciente
+
+    def test_discard(self):
+        cache_discard(self.cache, "b")
+        cache_discard(self.cache, "zz")
+        self.assertIsNone(cache_peek(self.cache, "b"))
+        self.assertEqual(cache_stats(self.cache)["resident_bytes"], 60)
+
+if __name__ == "__main__":
+    unittest.main()